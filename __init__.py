@@ -9,12 +9,26 @@ __author__ = "mapreduce_framework Framework Team"
 
 from .core.mapreduce import MapReduce
 from .core.distributed import DistributedMapReduce
+from .core.pipeline import Pipeline
+from .core.tasks import batch_reducer
+from .core.vectorized import batch_mapper
+from .core.stats import JobStats, increment_counter
+from .storage.input_format import FileInput
+from .storage.output_sink import OutputSink, read_output
 from .examples.word_count import word_count_mapper, word_count_reducer
 from .examples.inverted_index import inverted_index_mapper, inverted_index_reducer
 
 __all__ = [
     'MapReduce',
     'DistributedMapReduce',
+    'Pipeline',
+    'batch_reducer',
+    'batch_mapper',
+    'JobStats',
+    'increment_counter',
+    'FileInput',
+    'OutputSink',
+    'read_output',
     'word_count_mapper',
     'word_count_reducer',
     'inverted_index_mapper',
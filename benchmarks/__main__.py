@@ -0,0 +1,84 @@
+"""
+基准测试命令行入口
+
+在项目根目录运行:
+    python -m benchmarks --scale small --output bench.json
+    python -m benchmarks --scale medium --baseline bench.json --threshold 0.1
+    python -m benchmarks --datasets skewed --schedules static dynamic --workers 4
+    python -m benchmarks --intermediate-memory
+    python -m benchmarks --codecs pickle pickle5 records+zlib
+
+与基线对比发现吞吐量回退时以退出码1结束。
+"""
+
+import argparse
+import sys
+
+from core.scheduler import SCHEDULE_DYNAMIC, SCHEDULES
+from benchmarks.datasets import DATASETS, SCALES
+from benchmarks.harness import (ENGINE_MAPREDUCE, ENGINE_DISTRIBUTED, STORAGE_MODES, run_suite,
+                                save_report, load_report, compare_reports, format_result,
+                                measure_intermediate_memory, measure_codecs, format_codec_result,
+                                BENCHMARK_CODECS)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="MapReduce基准测试")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--engines", nargs="+", choices=[ENGINE_MAPREDUCE, ENGINE_DISTRIBUTED],
+                        default=[ENGINE_MAPREDUCE, ENGINE_DISTRIBUTED])
+    parser.add_argument("--storage", nargs="+", choices=list(STORAGE_MODES), default=list(STORAGE_MODES))
+    parser.add_argument("--executors", nargs="+", choices=["thread", "process"], default=["thread"])
+    parser.add_argument("--schedules", nargs="+", choices=list(SCHEDULES), default=[SCHEDULE_DYNAMIC],
+                        help="map任务调度方式，同时指定两种可对比动态调度和静态切分")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="不测量内存峰值")
+    parser.add_argument("--output", help="结果JSON文件路径")
+    parser.add_argument("--baseline", help="基线JSON文件路径")
+    parser.add_argument("--threshold", type=float, default=0.1, help="吞吐量下降超过该比例视为回退")
+    parser.add_argument("--intermediate-memory", action="store_true",
+                        help="只对比中间结果两种表示的每键值对内存占用")
+    parser.add_argument("--codecs", nargs="*", metavar="CODEC",
+                        help=f"只运行编解码器微基准，不指定时对比 {' '.join(BENCHMARK_CODECS)}")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.intermediate_memory:
+        for dataset in args.datasets:
+            result = measure_intermediate_memory(dataset, args.scale)
+            print(f"{dataset:<15} {result['pairs']:>10,} 个键值对, "
+                  f"list {result['list_bytes_per_pair']:.1f} 字节/对, "
+                  f"columnar {result['columnar_bytes_per_pair']:.1f} 字节/对")
+        return 0
+    if args.codecs is not None:
+        for dataset in args.datasets:
+            for result in measure_codecs(dataset, args.scale, args.codecs or BENCHMARK_CODECS, args.repeats):
+                print(format_codec_result(result), flush=True)
+        return 0
+
+    report = run_suite(args.datasets, args.engines, args.storage, args.workers, args.executors,
+                       schedules=args.schedules, scale=args.scale, repeats=args.repeats, warmup=args.warmup,
+                       measure_memory=not args.no_memory,
+                       progress=lambda result: print(format_result(result), flush=True))
+    if args.output:
+        save_report(report, args.output)
+        print(f"结果已保存到: {args.output}")
+
+    if not args.baseline:
+        return 0
+    comparisons = compare_reports(report, load_report(args.baseline), args.threshold)
+    regressions = [c for c in comparisons if c["regression"]]
+    print(f"\n与基线对比: {len(comparisons)} 个组合, {len(regressions)} 个回退")
+    for comparison in comparisons:
+        flag = "回退" if comparison["regression"] else "    "
+        print(f"  {flag} {comparison['case']:<45} {comparison['change']:+.1%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+基准测试数据集生成
+
+所有数据集都由固定的随机种子生成，同样的参数每次得到完全相同的数据，
+便于在不同版本之间对比结果。每条记录是一个文档字符串，可直接用于词频统计。
+"""
+
+import random
+from itertools import accumulate
+from typing import Callable, Dict, List
+
+
+def _vocabulary(size: int) -> List[str]:
+    return [f"w{i}" for i in range(size)]
+
+
+def zipf_documents(num_docs: int = 5000, words_per_doc: int = 50, vocab_size: int = 10000,
+                   exponent: float = 1.1, seed: int = 42) -> List[str]:
+    """词频服从Zipf分布的文档，接近真实文本的词频特征"""
+    rng = random.Random(seed)
+    vocab = _vocabulary(vocab_size)
+    cum_weights = list(accumulate(1.0 / (rank ** exponent) for rank in range(1, vocab_size + 1)))
+    return [" ".join(rng.choices(vocab, cum_weights=cum_weights, k=words_per_doc))
+            for _ in range(num_docs)]
+
+
+def skewed_documents(num_docs: int = 5000, words_per_doc: int = 50, vocab_size: int = 10000,
+                     hot_keys: int = 3, hot_fraction: float = 0.5, seed: int = 42) -> List[str]:
+    """少数热点key占据hot_fraction比例的数据，其余key均匀分布"""
+    rng = random.Random(seed)
+    vocab = _vocabulary(vocab_size)
+    hot = vocab[:hot_keys]
+    docs = []
+    for _ in range(num_docs):
+        words = [rng.choice(hot) if rng.random() < hot_fraction else rng.choice(vocab)
+                 for _ in range(words_per_doc)]
+        docs.append(" ".join(words))
+    return docs
+
+
+def large_documents(num_docs: int = 50, words_per_doc: int = 20000, vocab_size: int = 50000,
+                    seed: int = 42) -> List[str]:
+    """少量大文档，单条记录的map开销大"""
+    rng = random.Random(seed)
+    vocab = _vocabulary(vocab_size)
+    return [" ".join(rng.choices(vocab, k=words_per_doc)) for _ in range(num_docs)]
+
+
+def small_records(num_records: int = 200000, vocab_size: int = 1000, seed: int = 42) -> List[str]:
+    """大量单词记录，调度和分块开销占主导"""
+    rng = random.Random(seed)
+    vocab = _vocabulary(vocab_size)
+    return [rng.choice(vocab) for _ in range(num_records)]
+
+
+DATASETS: Dict[str, Callable[..., List[str]]] = {
+    "zipf": zipf_documents,
+    "skewed": skewed_documents,
+    "large_docs": large_documents,
+    "small_records": small_records,
+}
+
+# 各规模下数据集的参数，small用于快速冒烟测试
+SCALES: Dict[str, Dict[str, dict]] = {
+    "small": {
+        "zipf": {"num_docs": 1000, "words_per_doc": 50, "vocab_size": 5000},
+        "skewed": {"num_docs": 1000, "words_per_doc": 50, "vocab_size": 5000},
+        "large_docs": {"num_docs": 10, "words_per_doc": 5000, "vocab_size": 10000},
+        "small_records": {"num_records": 20000},
+    },
+    "medium": {
+        "zipf": {"num_docs": 10000, "words_per_doc": 100},
+        "skewed": {"num_docs": 10000, "words_per_doc": 100},
+        "large_docs": {"num_docs": 50, "words_per_doc": 20000},
+        "small_records": {"num_records": 200000},
+    },
+    "large": {
+        "zipf": {"num_docs": 100000, "words_per_doc": 100, "vocab_size": 100000},
+        "skewed": {"num_docs": 100000, "words_per_doc": 100, "vocab_size": 100000},
+        "large_docs": {"num_docs": 200, "words_per_doc": 50000, "vocab_size": 200000},
+        "small_records": {"num_records": 2000000, "vocab_size": 10000},
+    },
+}
+
+
+def make_dataset(name: str, scale: str = "small", **overrides) -> List[str]:
+    """按名称和规模生成数据集，overrides覆盖该规模的默认参数"""
+    if name not in DATASETS:
+        raise ValueError(f"未知的数据集: {name}，可选: {list(DATASETS)}")
+    if scale not in SCALES:
+        raise ValueError(f"未知的数据规模: {scale}，可选: {list(SCALES)}")
+    params = dict(SCALES[scale][name], **overrides)
+    return DATASETS[name](**params)
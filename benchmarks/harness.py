@@ -0,0 +1,326 @@
+"""
+基准测试执行器
+
+对 数据集 x 引擎 x 存储模式 x 执行器 x 调度方式 x worker数 的组合逐一运行词频统计作业：
+先预热，再重复计时取中位数，另外单独运行一次用tracemalloc测量Python堆内存峰值
+（计时运行不开启tracemalloc，避免影响耗时）。结果保存为JSON，可以与基线对比找出性能回退。
+"""
+
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from core.mapreduce import MapReduce
+from core.distributed import DistributedMapReduce
+from core.scheduler import SCHEDULE_DYNAMIC
+from core.columnar import ColumnarBuffer
+from core.tasks import iter_map_output
+from storage.data_serializer import get_codec
+from storage.spill_format import DEFAULT_FRAME_RECORDS
+from utils.chunking import iter_chunks
+from examples.word_count import word_count_mapper, word_count_reducer
+from benchmarks.datasets import make_dataset
+
+
+ENGINE_MAPREDUCE = "mapreduce"
+ENGINE_DISTRIBUTED = "distributed"
+STORAGE_MODES = ("memory", "disk", "sort")
+# sort存储模式使用的排序缓冲区（MB）
+SORT_BUFFER_MB = 8
+REPORT_VERSION = 1
+
+
+class BenchmarkCase:
+    """一个基准测试组合"""
+
+    def __init__(self, dataset: str, engine: str, storage: str, workers: int, executor_type: str,
+                 schedule: str = SCHEDULE_DYNAMIC):
+        self.dataset = dataset
+        self.engine = engine
+        self.storage = storage
+        self.workers = workers
+        self.executor_type = executor_type
+        self.schedule = schedule
+
+    @property
+    def case_id(self) -> str:
+        return (f"{self.dataset}/{self.engine}/{self.storage}/{self.executor_type}"
+                f"/w{self.workers}/{self.schedule}")
+
+    def create_runner(self, temp_dir: str) -> Callable[[List[str]], Dict[Any, Any]]:
+        """创建引擎并返回执行一次作业的函数（引擎构造不计入耗时）"""
+        if self.engine == ENGINE_DISTRIBUTED:
+            engine = DistributedMapReduce(num_mappers=self.workers, num_reducers=self.workers,
+                                          schedule=self.schedule)
+            return lambda data: engine.simulate_distributed_execution(data, word_count_mapper,
+                                                                      word_count_reducer)
+        engine = MapReduce(num_workers=self.workers, temp_dir=temp_dir, executor_type=self.executor_type,
+                           use_disk_storage=self.storage == "disk",
+                           sort_buffer_mb=SORT_BUFFER_MB if self.storage == "sort" else None,
+                           schedule=self.schedule)
+        return lambda data: engine.run(data, word_count_mapper, word_count_reducer)
+
+
+def build_cases(datasets: Sequence[str], engines: Sequence[str], storage_modes: Sequence[str],
+                workers: Sequence[int], executor_types: Sequence[str],
+                schedules: Sequence[str] = (SCHEDULE_DYNAMIC,)) -> List[BenchmarkCase]:
+    """展开所有组合；分布式引擎在单进程内模拟执行，只测内存模式"""
+    cases = []
+    for dataset in datasets:
+        for engine in engines:
+            for schedule in schedules:
+                if engine == ENGINE_DISTRIBUTED:
+                    cases.extend(BenchmarkCase(dataset, engine, "memory", w, "simulate", schedule) for w in workers)
+                    continue
+                for storage in storage_modes:
+                    for executor_type in executor_types:
+                        cases.extend(BenchmarkCase(dataset, engine, storage, w, executor_type, schedule)
+                                     for w in workers)
+    return cases
+
+
+def _measure_peak_memory(run: Callable[[List[str]], Any], data: List[str]) -> float:
+    """单独运行一次并返回tracemalloc记录的Python堆内存峰值（MB，不含子进程）"""
+    tracemalloc.start()
+    try:
+        run(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def run_case(case: BenchmarkCase, data: List[str], input_bytes: int, repeats: int = 3, warmup: int = 1,
+             measure_memory: bool = True, temp_dir: str = "./temp_benchmark") -> Dict[str, Any]:
+    """运行一个组合，返回可写入JSON的结果"""
+    run = case.create_runner(temp_dir)
+    for _ in range(warmup):
+        run(data)
+
+    timings = []
+    num_keys = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = run(data)
+        timings.append(time.perf_counter() - start)
+        num_keys = len(results)
+
+    median = statistics.median(timings)
+    return {
+        "case": case.case_id,
+        "dataset": case.dataset,
+        "engine": case.engine,
+        "storage": case.storage,
+        "executor": case.executor_type,
+        "schedule": case.schedule,
+        "workers": case.workers,
+        "records": len(data),
+        "input_bytes": input_bytes,
+        "output_keys": num_keys,
+        "seconds": {"median": median, "min": min(timings), "max": max(timings), "runs": timings},
+        "records_per_sec": len(data) / median if median > 0 else 0.0,
+        "mb_per_sec": input_bytes / 1024 / 1024 / median if median > 0 else 0.0,
+        "peak_memory_mb": _measure_peak_memory(run, data) if measure_memory else None,
+    }
+
+
+def run_suite(datasets: Sequence[str], engines: Sequence[str] = (ENGINE_MAPREDUCE, ENGINE_DISTRIBUTED),
+              storage_modes: Sequence[str] = STORAGE_MODES, workers: Sequence[int] = (1, 2, 4),
+              executor_types: Sequence[str] = ("thread",), schedules: Sequence[str] = (SCHEDULE_DYNAMIC,),
+              scale: str = "small", repeats: int = 3,
+              warmup: int = 1, measure_memory: bool = True, temp_dir: str = "./temp_benchmark",
+              progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    运行整套基准测试
+
+    Args:
+        datasets: 数据集名称，见 benchmarks.datasets.DATASETS
+        engines: "mapreduce" 和/或 "distributed"
+        storage_modes: MapReduce引擎的存储模式，"memory"/"disk"/"sort"
+        workers: 要扫描的worker数
+        executor_types: MapReduce引擎的执行器类型
+        schedules: map任务调度方式，"dynamic"和/或"static"，见 core.scheduler
+        scale: 数据规模，见 benchmarks.datasets.SCALES
+        repeats: 每个组合计时的次数，取中位数
+        warmup: 计时前的预热次数
+        measure_memory: 是否额外运行一次测量内存峰值
+        temp_dir: 磁盘模式的临时目录，结束后删除
+        progress: 每完成一个组合调用一次，参数为该组合的结果
+
+    Returns:
+        报告字典，包含环境信息、配置和每个组合的结果
+    """
+    cases = build_cases(datasets, engines, storage_modes, workers, executor_types, schedules)
+    report = {
+        "version": REPORT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "datasets": list(datasets), "engines": list(engines), "storage_modes": list(storage_modes),
+            "workers": list(workers), "executor_types": list(executor_types), "schedules": list(schedules),
+            "scale": scale,
+            "repeats": repeats, "warmup": warmup,
+        },
+        "results": [],
+    }
+
+    # 框架在每个阶段都输出INFO日志，基准测试期间关闭以免影响计时
+    logging.disable(logging.INFO)
+    try:
+        for dataset in datasets:
+            data = make_dataset(dataset, scale)
+            input_bytes = sum(len(record.encode("utf-8")) for record in data)
+            for case in (c for c in cases if c.dataset == dataset):
+                result = run_case(case, data, input_bytes, repeats, warmup, measure_memory, temp_dir)
+                report["results"].append(result)
+                if progress is not None:
+                    progress(result)
+    finally:
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return report
+
+
+def _retained_bytes(build: Callable[[], Any]) -> int:
+    """构建对象并返回构建完成后仍被占用的Python堆内存（字节）"""
+    tracemalloc.start()
+    try:
+        obj = build()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del obj
+    return current
+
+
+def measure_intermediate_memory(dataset: str, scale: str = "small") -> Dict[str, Any]:
+    """
+    对比两种中间结果表示保存一个数据集全部map输出时每个键值对占用的内存
+
+    list为原来的 [(key, value), ...]，columnar为 ColumnarBuffer；
+    计入mapper新建的key/value对象，不计入输入数据本身。
+    """
+    data = make_dataset(dataset, scale)
+    num_pairs = sum(1 for _ in iter_map_output(word_count_mapper, data))
+    list_bytes = _retained_bytes(lambda: list(iter_map_output(word_count_mapper, data)))
+    columnar_bytes = _retained_bytes(lambda: ColumnarBuffer(iter_map_output(word_count_mapper, data)))
+    return {
+        "dataset": dataset,
+        "pairs": num_pairs,
+        "list_bytes_per_pair": list_bytes / num_pairs if num_pairs else 0.0,
+        "columnar_bytes_per_pair": columnar_bytes / num_pairs if num_pairs else 0.0,
+    }
+
+
+# 编解码器基准默认对比的编解码器
+BENCHMARK_CODECS = ("pickle", "pickle5", "marshal", "records", "pickle+zlib", "records+zlib", "pickle+lzma")
+
+
+def _best_seconds(fn: Callable[[], Any], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def measure_codecs(dataset: str, scale: str = "small", codecs: Sequence[str] = BENCHMARK_CODECS,
+                   repeats: int = 3) -> List[Dict[str, Any]]:
+    """
+    对比各编解码器编码/解码一个数据集全部map输出的速度和大小
+
+    两种负载：spill为按溢写帧大小切分的 [(key, value), ...] 列表（溢写文件），
+    shuffle为整个 ColumnarBuffer（集群传输；只支持内置类型的编解码器编码其键值对列表）。
+    每项取repeats次中的最短耗时。
+    """
+    data = make_dataset(dataset, scale)
+    pairs = list(iter_map_output(word_count_mapper, data))
+    frames = list(iter_chunks(pairs, DEFAULT_FRAME_RECORDS))
+    buffer = ColumnarBuffer(pairs)
+    results = []
+    for name in codecs:
+        codec = get_codec(name)
+        shuffle_payload = buffer if codec.supports_objects else pairs
+        for payload_name, payloads in (("spill", frames), ("shuffle", [shuffle_payload])):
+            encoded = [codec.encode(payload) for payload in payloads]
+            encode_seconds = _best_seconds(lambda: [codec.encode(payload) for payload in payloads], repeats)
+            decode_seconds = _best_seconds(lambda: [codec.decode(payload) for payload in encoded], repeats)
+            num_bytes = sum(map(len, encoded))
+            results.append({
+                "dataset": dataset,
+                "codec": name,
+                "payload": payload_name,
+                "pairs": len(pairs),
+                "bytes": num_bytes,
+                "bytes_per_pair": num_bytes / len(pairs) if pairs else 0.0,
+                "encode_seconds": encode_seconds,
+                "decode_seconds": decode_seconds,
+            })
+    return results
+
+
+def format_codec_result(result: Dict[str, Any]) -> str:
+    pairs = result["pairs"]
+    encode_rate = pairs / result["encode_seconds"] / 1e6 if result["encode_seconds"] > 0 else 0.0
+    decode_rate = pairs / result["decode_seconds"] / 1e6 if result["decode_seconds"] > 0 else 0.0
+    return (f"{result['dataset']:<15} {result['payload']:<8} {result['codec']:<14} "
+            f"{result['bytes_per_pair']:>6.2f} 字节/对  编码 {encode_rate:>6.2f} M对/秒  "
+            f"解码 {decode_rate:>6.2f} M对/秒")
+
+
+def save_report(report: Dict[str, Any], path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any],
+                    threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    与基线报告对比吞吐量
+
+    Args:
+        current: 本次报告
+        baseline: 基线报告
+        threshold: 吞吐量下降超过该比例视为回退
+
+    Returns:
+        每个两边都有的组合一项，包含吞吐量变化比例和是否回退
+    """
+    baseline_results = {result["case"]: result for result in baseline.get("results", [])}
+    comparisons = []
+    for result in current["results"]:
+        base = baseline_results.get(result["case"])
+        if base is None or not base["records_per_sec"]:
+            continue
+        change = result["records_per_sec"] / base["records_per_sec"] - 1.0
+        comparisons.append({
+            "case": result["case"],
+            "baseline_records_per_sec": base["records_per_sec"],
+            "records_per_sec": result["records_per_sec"],
+            "change": change,
+            "regression": change < -threshold,
+        })
+    return comparisons
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    memory = result["peak_memory_mb"]
+    memory_text = f", 内存峰值 {memory:.1f}MB" if memory is not None else ""
+    return (f"{result['case']:<45} {result['seconds']['median']:.3f}秒, "
+            f"{result['records_per_sec']:,.0f} 条/秒, {result['mb_per_sec']:.2f} MB/秒{memory_text}")
@@ -0,0 +1,53 @@
+"""benchmarks.harness 的测试"""
+
+from benchmarks.datasets import make_dataset
+from benchmarks.harness import BenchmarkCase, build_cases, compare_reports, run_suite
+from core.scheduler import SCHEDULE_DYNAMIC, SCHEDULE_STATIC
+
+
+def make_result(case_id: str, records_per_sec: float):
+    return {"case": case_id, "records_per_sec": records_per_sec}
+
+
+def test_datasets_are_reproducible():
+    assert make_dataset("zipf", "small", num_docs=20) == make_dataset("zipf", "small", num_docs=20)
+    assert len(make_dataset("small_records", "small", num_records=50)) == 50
+
+
+def test_build_cases_only_sweeps_memory_for_distributed():
+    cases = build_cases(["zipf"], ["mapreduce", "distributed"], ["memory", "disk"], [1, 2], ["thread"])
+    assert len(cases) == 2 * 2 + 2
+    assert {case.storage for case in cases if case.engine == "distributed"} == {"memory"}
+    assert len({case.case_id for case in cases}) == len(cases)
+
+
+def test_compare_reports_flags_regressions():
+    baseline = {"results": [make_result("a", 100.0), make_result("b", 100.0), make_result("gone", 100.0)]}
+    current = {"results": [make_result("a", 85.0), make_result("b", 95.0), make_result("new", 1.0)]}
+    comparisons = compare_reports(current, baseline, threshold=0.1)
+    assert [(c["case"], c["regression"]) for c in comparisons] == [("a", True), ("b", False)]
+
+
+def test_run_suite_smoke(tmp_path):
+    temp_dir = str(tmp_path / "bench")
+    report = run_suite(["small_records"], storage_modes=["memory", "disk"], workers=[2], scale="small",
+                       repeats=1, warmup=0, measure_memory=False, temp_dir=temp_dir)
+    results = report["results"]
+    assert [result["engine"] for result in results] == ["mapreduce", "mapreduce", "distributed"]
+    assert len({result["output_keys"] for result in results}) == 1
+    assert all(result["records_per_sec"] > 0 for result in results)
+    assert not (tmp_path / "bench").exists()
+
+
+def test_case_ids_include_schedule():
+    static = BenchmarkCase("zipf", "distributed", "memory", 2, "simulate", SCHEDULE_STATIC)
+    dynamic = BenchmarkCase("zipf", "distributed", "memory", 2, "simulate", SCHEDULE_DYNAMIC)
+    assert static.case_id == "zipf/distributed/memory/simulate/w2/static"
+    assert dynamic.case_id == "zipf/distributed/memory/simulate/w2/dynamic"
+
+    cases = build_cases(["zipf"], ["distributed"], ["memory"], [2], ["thread"], [SCHEDULE_DYNAMIC, SCHEDULE_STATIC])
+    assert [case.case_id for case in cases] == [dynamic.case_id, static.case_id]
+    # 两种调度方式的结果分别与基线中相同调度方式的组合对比
+    baseline = {"results": [make_result(static.case_id, 100.0)]}
+    current = {"results": [make_result(dynamic.case_id, 50.0), make_result(static.case_id, 95.0)]}
+    assert [c["case"] for c in compare_reports(current, baseline)] == [static.case_id]
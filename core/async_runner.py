@@ -0,0 +1,134 @@
+"""
+async def mapper/reducer支持
+
+I/O密集的mapper（读取文件、请求服务）如果用同步函数实现，并发度受限于worker数。
+async def 定义的mapper/reducer被包装为 AsyncFunction：
+    - 每个进程有一个在后台线程中运行的事件循环，同一并发上限的所有任务共用；
+    - map任务把数据块中的所有记录一次性提交到事件循环，由信号量限制同时运行的协程数，
+      因此在途的I/O操作数由并发上限决定，而不是worker数；
+    - 包装后的对象也是普通的同步可调用对象，分区、Combiner、缓存和Shuffle流程与同步路径完全相同。
+
+mapper可以是返回键值对列表的 async def，也可以是逐个 yield 键值对的异步生成器。
+"""
+
+import asyncio
+import inspect
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+# 默认同时运行的协程数上限
+DEFAULT_ASYNC_CONCURRENCY = 100
+
+
+def is_async_callable(func: Any) -> bool:
+    """是否为 async def 函数、异步生成器函数或 __call__ 为async的对象"""
+    if inspect.iscoroutinefunction(func) or inspect.isasyncgenfunction(func):
+        return True
+    call = getattr(func, "__call__", None)
+    return (call is not None and not inspect.isfunction(func) and not inspect.ismethod(func)
+            and (inspect.iscoroutinefunction(call) or inspect.isasyncgenfunction(call)))
+
+
+async def _invoke(func: Callable, args: Sequence[Any]) -> Any:
+    """调用异步函数；异步生成器的输出收集为列表"""
+    result = func(*args)
+    if inspect.isasyncgen(result):
+        return [item async for item in result]
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+class EventLoopThread:
+    """在后台线程中运行的事件循环，信号量限制同时运行的协程数"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        # Python 3.10起信号量在首次使用时才绑定事件循环
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._thread = threading.Thread(target=self._run, name=f"mapreduce-async-{concurrency}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _limited(self, func: Callable, args: Sequence[Any]) -> Tuple[Optional[Exception], Any]:
+        async with self._semaphore:
+            try:
+                return None, await _invoke(func, args)
+            except Exception as e:
+                return e, None
+
+    async def _gather(self, func: Callable, args_list: List[Sequence[Any]]) -> List[Tuple[Optional[Exception], Any]]:
+        return await asyncio.gather(*(self._limited(func, args) for args in args_list))
+
+    def run_many(self, func: Callable, args_list: List[Sequence[Any]]) -> List[Tuple[Optional[Exception], Any]]:
+        """
+        并发执行 func(*args)，阻塞直到全部完成
+
+        协程在提交线程的上下文副本中运行，increment_counter 计入调用方所在的任务。
+
+        Returns:
+            与args_list一一对应的 (异常或None, 结果)
+        """
+        if not args_list:
+            return []
+        future = asyncio.run_coroutine_threadsafe(self._gather(func, args_list), self.loop)
+        return future.result()
+
+
+_loops: Dict[int, EventLoopThread] = {}
+_loops_lock = threading.Lock()
+
+
+def get_event_loop_thread(concurrency: int) -> EventLoopThread:
+    """
+    获取本进程中指定并发上限的事件循环线程，不存在时创建
+
+    fork出的子进程不继承父进程的线程，按进程号判断后重新创建。
+    """
+    with _loops_lock:
+        loop_thread = _loops.get(concurrency)
+        if loop_thread is None or loop_thread.pid != os.getpid():
+            loop_thread = _loops[concurrency] = EventLoopThread(concurrency)
+        return loop_thread
+
+
+class AsyncFunction:
+    """
+    把async mapper/reducer包装为同步可调用对象
+
+    只保存原函数和并发上限，原函数可以pickle时包装对象也可以pickle，
+    进程池的每个子进程使用自己的事件循环。
+    """
+
+    def __init__(self, func: Callable, concurrency: int = DEFAULT_ASYNC_CONCURRENCY):
+        self.func = func
+        self.concurrency = concurrency
+        self.__qualname__ = getattr(func, "__qualname__", type(func).__qualname__)
+
+    def __call__(self, *args: Any) -> Any:
+        error, result = self.call_many([args])[0]
+        if error is not None:
+            raise error
+        return result
+
+    def call_many(self, args_list: List[Sequence[Any]]) -> List[Tuple[Optional[Exception], Any]]:
+        """并发调用，返回与args_list一一对应的 (异常或None, 结果)"""
+        return get_event_loop_thread(self.concurrency).run_many(self.func, args_list)
+
+
+def is_async_function(func: Any) -> bool:
+    return isinstance(func, AsyncFunction)
+
+
+def wrap_async(func: Any, concurrency: int) -> Any:
+    """async函数包装为AsyncFunction，其余对象原样返回"""
+    if func is None or isinstance(func, (str, AsyncFunction)) or not is_async_callable(func):
+        return func
+    return AsyncFunction(func, concurrency)
@@ -0,0 +1,413 @@
+"""
+本地多进程集群
+
+在一台机器上运行一个协调者（当前进程）、N个Mapper进程和M个Reducer进程：
+    - 协调者通过管道把输入分片发送给Mapper（空闲的Mapper主动领取下一个分片），
+      并收集各节点的统计和最终结果；
+    - 每个Reducer监听一个localhost TCP端口；
+    - Mapper完成map后把每个Reducer的分区数据用配置的编解码器（见 storage.data_serializer）
+      序列化，通过socket推送给对应Reducer，并记录每次传输的字节数和耗时。
+"""
+
+import heapq
+import multiprocessing
+import socket
+import struct
+import time
+import traceback
+from collections import Counter, defaultdict
+from multiprocessing.connection import wait
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from utils.logger import get_logger
+from utils.chunking import has_length, iter_chunks
+from storage.data_serializer import Codec, get_codec
+from core.partitioner import Partitioner
+from core.columnar import ColumnarBuffer
+from core.tasks import iter_map_output, partition_pairs, reduce_batch_task, DEFAULT_REDUCE_BATCH_SIZE
+from core.stats import JobStats, PhaseStats, TaskMetrics, counter_scope
+from core.tracing import span, trace_scope
+from core.skew import DEFAULT_TOP_KEYS, merge_split_results, hold_split_keys, commit_split_output
+
+
+# 传输帧头: mapper编号, reducer编号, 负载长度
+TRANSFER_HEADER = struct.Struct("<IIQ")
+LOCALHOST = "127.0.0.1"
+
+
+class TransferRecord:
+    """一次Mapper到Reducer的数据传输"""
+
+    def __init__(self, mapper_id: int, reducer_id: int, num_pairs: int, num_bytes: int,
+                 serialize_seconds: float, transfer_seconds: float):
+        self.mapper_id = mapper_id
+        self.reducer_id = reducer_id
+        self.num_pairs = num_pairs
+        self.num_bytes = num_bytes
+        self.serialize_seconds = serialize_seconds
+        self.transfer_seconds = transfer_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+    def __repr__(self) -> str:
+        return (f"TransferRecord(mapper={self.mapper_id}, reducer={self.reducer_id}, "
+                f"bytes={self.num_bytes}, transfer={self.transfer_seconds:.4f}s)")
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytearray:
+    """从socket读取恰好size字节，直接返回接收缓冲区（不再拷贝）"""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = conn.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("连接在传输完成前关闭")
+        received += n
+    return buf
+
+
+def _mapper_node(mapper_id: int, mapper: Callable, combiner, partitioner: Partitioner,
+                 reducer_ports: List[int], conn, codec: Codec, trace: bool = False) -> None:
+    """Mapper进程：向协调者拉取分片、执行map、按Reducer分区后通过socket推送"""
+    try:
+        with trace_scope(trace) as spans:
+            buckets = [ColumnarBuffer() for _ in reducer_ports]
+            records_in = 0
+            records_out = 0
+            seconds = 0.0
+            cpu_start = time.process_time()
+            with counter_scope() as counters:
+                # 空闲时向协调者领取下一个分片，并反馈上一个分片的耗时
+                finished = None
+                while True:
+                    conn.send(("ready", finished))
+                    task = conn.recv()
+                    if task is None:
+                        break
+                    shard_id, shard = task
+                    start = time.perf_counter()
+                    with span("map", "task", mapper_id=mapper_id, shard=shard_id) as map_span:
+                        if not has_length(shard):
+                            # 文件输入切分在Mapper进程内读取
+                            shard = list(shard)
+                        records_in += len(shard)
+                        pairs = iter_map_output(mapper, shard)
+                        if combiner is not None:
+                            pairs = combiner.combine(pairs)
+                        shard_out = 0
+                        for reducer_id, buffer in partition_pairs(partitioner, pairs).items():
+                            buckets[reducer_id].extend(buffer)
+                            shard_out += len(buffer)
+                        records_out += shard_out
+                        map_span.set(records_in=len(shard), records_out=shard_out)
+                    shard_seconds = time.perf_counter() - start
+                    seconds += shard_seconds
+                    finished = (shard_id, shard_seconds)
+
+            # Shuffle：向每个Reducer推送一次，空分区也发送空帧，Reducer据此判断接收完毕
+            transfers = []
+            for reducer_id, port in enumerate(reducer_ports):
+                with span("transfer", "shuffle", mapper_id=mapper_id, reducer_id=reducer_id) as transfer_span:
+                    start = time.perf_counter()
+                    bucket = buckets[reducer_id]
+                    # pickle5的带外缓冲区作为单独的段直接写入socket，不拼接
+                    parts = codec.encode_parts(bucket if codec.supports_objects else list(bucket))
+                    payload_len = sum(memoryview(part).nbytes for part in parts)
+                    serialize_seconds = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    with socket.create_connection((LOCALHOST, port)) as sock:
+                        sock.sendall(TRANSFER_HEADER.pack(mapper_id, reducer_id, payload_len))
+                        for part in parts:
+                            sock.sendall(part)
+                        # 等待Reducer确认，使计时包含完整的传输过程
+                        _recv_exact(sock, 1)
+                    transfer_seconds = time.perf_counter() - start
+                    transfer_span.set(records=len(bucket), bytes=TRANSFER_HEADER.size + payload_len)
+
+                transfers.append(TransferRecord(mapper_id, reducer_id, len(bucket),
+                                                TRANSFER_HEADER.size + payload_len,
+                                                serialize_seconds, transfer_seconds))
+                buckets[reducer_id] = ColumnarBuffer()
+        conn.send(("ok", {"records_in": records_in, "records_out": records_out, "transfers": transfers,
+                          "seconds": seconds, "cpu_seconds": time.process_time() - cpu_start,
+                          "counters": counters, "spans": spans}))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def _reducer_node(reducer_id: int, reducer: Callable, num_mappers: int, sorted_output: bool,
+                  conn, codec: Codec, tracked_keys: Iterable[Any] = (), output=None,
+                  trace: bool = False) -> None:
+    """
+    Reducer进程：监听端口，接收所有Mapper推送的数据，分组归约后把结果发回协调者
+
+    指定output（OutputSink）时结果直接写入本节点的分片文件，只把分片摘要和
+    被拆分key（tracked_keys）的部分结果发回协调者。
+
+    同时返回value数最多的若干个key，以及tracked_keys（被拆分的热点key）在本节点的value数，
+    供协调者生成数据倾斜报告。
+    """
+    try:
+        with trace_scope(trace) as spans:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+                server.bind((LOCALHOST, 0))
+                server.listen(num_mappers)
+                conn.send(("port", server.getsockname()[1]))
+
+                received = ColumnarBuffer()
+                bytes_received = 0
+                for _ in range(num_mappers):
+                    client, _ = server.accept()
+                    with span("receive", "shuffle", reducer_id=reducer_id) as receive_span:
+                        with client:
+                            mapper_id, _, payload_len = TRANSFER_HEADER.unpack(
+                                _recv_exact(client, TRANSFER_HEADER.size))
+                            payload = _recv_exact(client, payload_len)
+                            client.sendall(b"\x01")
+                        bytes_received += TRANSFER_HEADER.size + payload_len
+                        received.extend(codec.decode(payload))
+                        receive_span.set(mapper_id=mapper_id, bytes=TRANSFER_HEADER.size + payload_len)
+
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            num_values = len(received)
+            with span("group", "shuffle", reducer_id=reducer_id, records_in=num_values):
+                grouped_data = received.groups(sorted_output)
+            del received
+            keys = list(grouped_data)
+            results = []
+            shard = None
+            with counter_scope() as counters, span("reduce", "task", reducer_id=reducer_id,
+                                                   keys=len(keys)) as reduce_span:
+                reduced = (result for batch_id, batch_keys in enumerate(iter_chunks(keys, DEFAULT_REDUCE_BATCH_SIZE))
+                           for result in reduce_batch_task(reducer, batch_id,
+                                                           [(key, grouped_data[key]) for key in batch_keys]))
+                if output is None:
+                    results.extend(reduced)
+                else:
+                    shard = output.write_shard(reducer_id, hold_split_keys(reduced, tracked_keys, results))
+                reduce_span.set(records_out=len(results) if shard is None else shard["records"])
+            top_keys = heapq.nlargest(DEFAULT_TOP_KEYS, ((key, len(values)) for key, values in grouped_data.items()),
+                                      key=itemgetter(1))
+            tracked_counts = {key: len(grouped_data[key]) for key in tracked_keys if key in grouped_data}
+        conn.send(("ok", {"keys": len(grouped_data), "values": num_values, "bytes_received": bytes_received,
+                          "results": results, "shard": shard, "seconds": time.perf_counter() - start,
+                          "cpu_seconds": time.process_time() - cpu_start, "counters": counters,
+                          "top_keys": top_keys, "tracked_counts": tracked_counts, "spans": spans}))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class LocalCluster:
+    """单机多进程MapReduce集群"""
+
+    def __init__(self, num_mappers: int, num_reducers: int, partitioner: Partitioner,
+                 codec: Union[None, str, Codec] = None, trace: bool = False):
+        """
+        Args:
+            num_mappers: Mapper进程数
+            num_reducers: Reducer进程数
+            partitioner: 分区器，分区数应等于num_reducers
+            codec: Shuffle传输使用的编解码器，见 storage.data_serializer.get_codec，默认pickle
+            trace: 是否在各节点进程中记录span，随节点统计返回后并入 stats.trace
+        """
+        self.num_mappers = num_mappers
+        self.num_reducers = num_reducers
+        self.partitioner = partitioner
+        self.codec = get_codec(codec)
+        self.trace = trace
+        self.logger = get_logger("DistributedMapReduce")
+        # 使用fork启动子进程，闭包形式的mapper/reducer无需pickle
+        self._context = multiprocessing.get_context("fork")
+        self.transfers: List[TransferRecord] = []
+        # 最近一次execute的作业统计
+        self.stats = JobStats(trace=trace)
+        # 各Reducer上value数最多的key（合并后），以及被拆分的key在各Reducer上的value数
+        self.key_counts: Dict[Any, int] = Counter()
+        self.split_counts: Dict[Any, Dict[int, int]] = {}
+
+    @staticmethod
+    def _receive(conn, node: str) -> Any:
+        status, payload = conn.recv()
+        if status == "error":
+            raise RuntimeError(f"{node} 执行失败:\n{payload}")
+        return payload
+
+    def execute(self, shards: Iterable[List[Any]], mapper: Callable, reducer: Callable,
+                combiner=None, split_keys: Iterable[Any] = (),
+                merge: Optional[Callable[[Any, List[Any]], Any]] = None, output=None,
+                observe_shard: Optional[Callable[[int, float], None]] = None) -> Any:
+        """
+        在本地集群上执行作业
+
+        Args:
+            shards: 输入分片迭代器，空闲的Mapper每次领取一个分片
+            mapper: Map函数
+            reducer: Reduce函数
+            combiner: 可选的map端预聚合器
+            split_keys: 被分区器拆分到多个Reducer的key，各Reducer的部分结果用merge合并
+            merge: merge(key, partial_results) -> 最终结果，默认使用reducer
+            output: 可选的 OutputSink，各Reducer把结果写入自己的分片文件
+            observe_shard: 每个分片处理完成后以 (分片编号, 耗时) 调用，用于自适应切分之后的分片
+
+        Returns:
+            最终结果；指定output时返回 OutputManifest
+        """
+        processes = []
+        self.stats = stats = JobStats(trace=self.trace)
+        self.key_counts = Counter()
+        self.split_counts = defaultdict(dict)
+        split_keys = list(split_keys)
+        with stats.tracing():
+            try:
+                # 1. 启动Reducer节点，获取监听端口
+                reducer_conns = []
+                for reducer_id in range(self.num_reducers):
+                    parent_conn, child_conn = self._context.Pipe()
+                    process = self._context.Process(
+                        target=_reducer_node,
+                        args=(reducer_id, reducer, self.num_mappers, self.partitioner.sorted_output, child_conn,
+                              self.codec, split_keys, output, self.trace),
+                        daemon=True)
+                    process.start()
+                    child_conn.close()
+                    processes.append(process)
+                    reducer_conns.append(parent_conn)
+                reducer_ports = [self._receive(conn, f"Reducer {i + 1}") for i, conn in enumerate(reducer_conns)]
+                self.logger.info(f"Reducer节点已启动，端口: {reducer_ports}")
+
+                # 2. 启动Mapper节点
+                mapper_conns = []
+                for mapper_id in range(self.num_mappers):
+                    parent_conn, child_conn = self._context.Pipe()
+                    process = self._context.Process(
+                        target=_mapper_node,
+                        args=(mapper_id, mapper, combiner, self.partitioner, reducer_ports, child_conn, self.codec,
+                              self.trace),
+                        daemon=True)
+                    process.start()
+                    child_conn.close()
+                    processes.append(process)
+                    mapper_conns.append(parent_conn)
+
+                # 3. 按Mapper的领取请求分发输入分片，分片取完后发送结束标记
+                map_phase = stats.phase("map")
+                map_phase.start()
+                num_shards = self._dispatch_shards(mapper_conns, shards, observe_shard)
+                self.logger.info(f"已分发 {num_shards} 个分片到 {self.num_mappers} 个Mapper")
+
+                # 4. 收集Mapper统计
+                self.transfers = []
+                for mapper_id, conn in enumerate(mapper_conns):
+                    node_stats = self._receive(conn, f"Mapper {mapper_id + 1}")
+                    self.transfers.extend(node_stats["transfers"])
+                    self._record_node(map_phase, mapper_id, node_stats["records_in"], node_stats["records_out"],
+                                      node_stats)
+                    self.logger.info(f"Mapper {mapper_id + 1} 处理 {node_stats['records_in']} 条数据")
+                map_phase.stop()
+
+                # 5. 按Reducer编号顺序收集结果
+                reducer_outputs = []
+                shards = []
+                with stats.timed_phase("reduce") as reduce_phase:
+                    for reducer_id, conn in enumerate(reducer_conns):
+                        node_stats = self._receive(conn, f"Reducer {reducer_id + 1}")
+                        reducer_outputs.append(node_stats["results"])
+                        if node_stats["shard"] is not None:
+                            shards.append(node_stats["shard"])
+                        for key, count in node_stats["top_keys"]:
+                            self.key_counts[key] += count
+                        for key, count in node_stats["tracked_counts"].items():
+                            self.split_counts[key][reducer_id] = count
+                        records_out = len(node_stats["results"])
+                        if node_stats["shard"] is not None:
+                            records_out = node_stats["shard"]["records"]
+                        self._record_node(reduce_phase, reducer_id, node_stats["values"], records_out, node_stats)
+                        stats.partition_keys[reducer_id] = node_stats["keys"]
+                        stats.partition_values[reducer_id] = node_stats["values"]
+                        self.logger.info(f"Reducer {reducer_id + 1} 接收 {node_stats['bytes_received']} 字节, "
+                                         f"处理 {node_stats['keys']} 个key")
+
+                with stats.timed_phase("merge"):
+                    if output is None:
+                        final_results = merge_split_results(reducer_outputs, split_keys, merge or reducer)
+                    else:
+                        final_results = commit_split_output(output, shards, reducer_outputs, split_keys,
+                                                            merge or reducer)
+
+                stats.intermediate_pairs = sum(stats.partition_values.values())
+                stats.intermediate_bytes = sum(t.num_bytes for t in self.transfers)
+                self._log_transfer_summary()
+                return final_results
+            except BaseException:
+                # 节点失败时其余节点可能仍在等待连接或数据，直接终止而不是等到join超时
+                for process in processes:
+                    process.terminate()
+                raise
+            finally:
+                for process in processes:
+                    process.join(timeout=5)
+                    if process.is_alive():
+                        process.terminate()
+
+    @staticmethod
+    def _dispatch_shards(mapper_conns: List[Any], shards: Iterable[List[Any]],
+                         observe_shard: Optional[Callable[[int, float], None]] = None) -> int:
+        """
+        按Mapper的领取请求分发分片
+
+        Mapper空闲时发送 ("ready", 上一个分片的 (编号, 耗时))，协调者回复 (分片编号, 分片)，
+        分片取完后回复None。处理得快的Mapper领取更多分片，负载随实际处理速度平衡。
+
+        Returns:
+            分发的分片数
+        """
+        shards = iter(shards)
+        waiting = {conn: mapper_id for mapper_id, conn in enumerate(mapper_conns)}
+        num_shards = 0
+        while waiting:
+            for conn in wait(list(waiting)):
+                status, finished = conn.recv()
+                if status == "error":
+                    raise RuntimeError(f"Mapper {waiting[conn] + 1} 执行失败:\n{finished}")
+                if finished is not None and observe_shard is not None:
+                    observe_shard(*finished)
+                shard = next(shards, None)
+                if shard is None:
+                    conn.send(None)
+                    del waiting[conn]
+                else:
+                    conn.send((num_shards, shard))
+                    num_shards += 1
+        return num_shards
+
+    def _record_node(self, phase: PhaseStats, node_id: int, records_in: int, records_out: int,
+                     node_stats: Dict[str, Any]):
+        """把节点返回的耗时和计数器记录到作业统计"""
+        phase.tasks.append(TaskMetrics(node_id, node_stats["seconds"], node_stats["cpu_seconds"],
+                                       records_in=records_in, records_out=records_out))
+        self.stats.counters.merge(node_stats["counters"])
+        if self.stats.trace is not None and node_stats["spans"]:
+            self.stats.trace.extend(node_stats["spans"])
+
+    def _log_transfer_summary(self):
+        total_bytes = sum(t.num_bytes for t in self.transfers)
+        total_seconds = sum(t.transfer_seconds for t in self.transfers)
+        throughput = total_bytes / total_seconds / 1024 / 1024 if total_seconds > 0 else 0.0
+        self.logger.info(f"Shuffle传输完成: {len(self.transfers)} 次传输, {total_bytes} 字节, "
+                         f"累计耗时 {total_seconds:.4f}秒, 吞吐 {throughput:.2f} MB/s")
+
+    def transfer_matrix(self) -> List[List[int]]:
+        """Mapper x Reducer 的传输字节矩阵"""
+        matrix = [[0] * self.num_reducers for _ in range(self.num_mappers)]
+        for transfer in self.transfers:
+            matrix[transfer.mapper_id][transfer.reducer_id] += transfer.num_bytes
+        return matrix
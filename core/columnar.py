@@ -0,0 +1,234 @@
+"""
+紧凑的列式中间结果缓冲区
+
+map输出原本以 [(key, value), ...] 的形式保存，每个键值对需要一个元组（56字节）、
+列表中的一个指针（8字节），以及重复的key和value对象。ColumnarBuffer 把键值对拆成两列：
+    - key列做字典编码：每个不同的key只保存一次，列中存放4字节的整数编号；
+    - value全部是int（64位以内）或全部是float时使用 array 定长存储（每个8字节），
+      出现其它类型时退化为普通列表（object列），value类型保持不变；
+    - 按key分组直接在编号上进行，不需要再次对key求哈希。
+缓冲区可以像键值对列表一样迭代，pickle时只序列化key字典和两列数据；pickle协议5下定长列作为
+PickleBuffer导出，使用带外缓冲区（"pickle5" 编解码器）时不拷贝进pickle流。
+"""
+
+import pickle
+from array import array
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.shuffle import key_order
+
+
+# key编号列的类型：4字节有符号整数，单个缓冲区最多 2^31 个不同的key
+KEY_ID_TYPECODE = "i"
+INT_TYPECODE = "q"
+FLOAT_TYPECODE = "d"
+
+
+def _value_typecode(values: List[Any]) -> Optional[str]:
+    """value全部是int或全部是float时返回对应的array类型，否则返回None（bool不算int）"""
+    types = set(map(type, values))
+    if types == {int}:
+        return INT_TYPECODE
+    if types == {float}:
+        return FLOAT_TYPECODE
+    return None
+
+
+class ColumnarBuffer:
+    """字典编码key + 定长value列的键值对缓冲区"""
+
+    __slots__ = ("keys", "key_ids", "values", "_ids")
+
+    def __init__(self, pairs: Optional[Iterable[Tuple[Any, Any]]] = None):
+        # 编号 -> key，编号按key首次出现的顺序分配
+        self.keys: List[Any] = []
+        self.key_ids = array(KEY_ID_TYPECODE)
+        # array（int/float列）或list（object列）
+        self.values: Union[array, List[Any]] = array(INT_TYPECODE)
+        # key -> 编号，反序列化后按需重建
+        self._ids: Optional[Dict[Any, int]] = {}
+        if pairs is not None:
+            self.extend(pairs)
+
+    def __len__(self) -> int:
+        return len(self.key_ids)
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        return zip(map(self.keys.__getitem__, self.key_ids), self.values)
+
+    def __getstate__(self):
+        return self.keys, self.key_ids, self.values
+
+    def __reduce_ex__(self, protocol):
+        if protocol < 5:
+            return super().__reduce_ex__(protocol)
+        values = self.values
+        if isinstance(values, array):
+            values = (values.typecode, pickle.PickleBuffer(values))
+        return _rebuild_buffer, (self.keys, pickle.PickleBuffer(self.key_ids), values)
+
+    def __setstate__(self, state):
+        self.keys, self.key_ids, self.values = state
+        self._ids = None
+
+    @property
+    def num_keys(self) -> int:
+        return len(self.keys)
+
+    @property
+    def is_typed(self) -> bool:
+        """value列是否为定长存储"""
+        return isinstance(self.values, array)
+
+    def _key_index(self) -> Dict[Any, int]:
+        if self._ids is None:
+            self._ids = {key: key_id for key_id, key in enumerate(self.keys)}
+        return self._ids
+
+    def _intern(self, key: Any) -> int:
+        ids = self._key_index()
+        key_id = ids.get(key)
+        if key_id is None:
+            key_id = ids[key] = len(self.keys)
+            self.keys.append(key)
+        return key_id
+
+    def append(self, key: Any, value: Any):
+        self.extend(((key, value),))
+
+    def extend(self, pairs: Union["ColumnarBuffer", Iterable[Tuple[Any, Any]]]):
+        """追加键值对；参数是另一个缓冲区时按列合并"""
+        if isinstance(pairs, ColumnarBuffer):
+            self._extend_buffer(pairs)
+            return
+        if not isinstance(pairs, list):
+            pairs = list(pairs)
+        ids = self._key_index()
+        setdefault = ids.setdefault
+        num_keys = len(ids)
+        # 新key的编号为插入前的字典大小，dict保持插入顺序，新key按编号顺序追加到keys
+        self.key_ids.extend([setdefault(key, len(ids)) for key, _ in pairs])
+        if len(ids) > num_keys:
+            self.keys.extend(islice(ids, num_keys, None))
+        self._extend_values([value for _, value in pairs])
+
+    def _extend_buffer(self, other: "ColumnarBuffer"):
+        remap = [self._intern(key) for key in other.keys]
+        if remap == list(range(len(remap))):
+            self.key_ids.extend(other.key_ids)
+        else:
+            self.key_ids.extend(map(remap.__getitem__, other.key_ids))
+        if isinstance(other.values, array) and self._accepts(other.values.typecode):
+            if len(self.values) == 0:
+                self.values = array(other.values.typecode, other.values)
+            else:
+                self.values.extend(other.values)
+        else:
+            self._to_object_column()
+            self.values.extend(other.values)
+
+    def _accepts(self, typecode: str) -> bool:
+        """定长value列能否追加该类型的值（空列可以切换类型）"""
+        return isinstance(self.values, array) and (len(self.values) == 0 or self.values.typecode == typecode)
+
+    def _extend_values(self, values: List[Any]):
+        if not values:
+            return
+        if isinstance(self.values, array):
+            typecode = _value_typecode(values)
+            if typecode is not None and self._accepts(typecode):
+                try:
+                    column = array(typecode, values)
+                except OverflowError:
+                    # 超出64位的整数只能放进object列
+                    pass
+                else:
+                    if len(self.values) == 0:
+                        self.values = column
+                    else:
+                        self.values.extend(column)
+                    return
+            self._to_object_column()
+        self.values.extend(values)
+
+    def _to_object_column(self):
+        if isinstance(self.values, array):
+            self.values = self.values.tolist()
+
+    @classmethod
+    def from_columns(cls, keys: List[Any], key_ids: List[int], values: List[Any]) -> "ColumnarBuffer":
+        """由已编码的列构建缓冲区，keys中不能有重复的key"""
+        buffer = cls()
+        buffer.keys = keys
+        buffer.key_ids = array(KEY_ID_TYPECODE, key_ids)
+        buffer._ids = None
+        buffer._extend_values(values)
+        return buffer
+
+    def groups(self, sorted_output: bool = False) -> Dict[Any, List]:
+        """
+        按key编号分组
+
+        Args:
+            sorted_output: 是否按key排序，否则按key首次出现的顺序
+
+        Returns:
+            {key: [values]}，每个key的value保持追加顺序
+        """
+        buckets = [[] for _ in self.keys]
+        for key_id, value in zip(self.key_ids, self.values):
+            buckets[key_id].append(value)
+        if sorted_output:
+            order = sorted(range(len(self.keys)), key=lambda key_id: key_order(self.keys[key_id]))
+            return {self.keys[key_id]: buckets[key_id] for key_id in order}
+        return dict(zip(self.keys, buckets))
+
+
+def _array_from(typecode: str, data) -> array:
+    column = array(typecode)
+    column.frombytes(data)
+    return column
+
+
+def _rebuild_buffer(keys: List[Any], key_ids, values) -> ColumnarBuffer:
+    """pickle协议5的反序列化：由导出的列缓冲区重建（定长列为 (typecode, 缓冲区)）"""
+    buffer = ColumnarBuffer.__new__(ColumnarBuffer)
+    buffer.keys = keys
+    buffer.key_ids = _array_from(KEY_ID_TYPECODE, key_ids)
+    buffer.values = _array_from(*values) if isinstance(values, tuple) else values
+    buffer._ids = None
+    return buffer
+
+
+def partition_buffers(partitioner, pairs: Iterable[Tuple[Any, Any]]) -> Dict[int, ColumnarBuffer]:
+    """
+    把键值对按分区编码为ColumnarBuffer
+
+    分区器的 per_key 为True时使用：每个不同的key只计算一次分区，
+    同时分配它在所属分区中的编号，一次遍历完成分区和字典编码。
+
+    Returns:
+        {分区编号: ColumnarBuffer}，只包含非空分区
+    """
+    num_partitions = partitioner.num_partitions
+    get_partition = partitioner.get_partition
+    # key -> (分区编号, 分区内key编号)
+    index: Dict[Any, Tuple[int, int]] = {}
+    lookup = index.get
+    partition_keys = [[] for _ in range(num_partitions)]
+    partition_ids = [[] for _ in range(num_partitions)]
+    partition_values = [[] for _ in range(num_partitions)]
+    for key, value in pairs:
+        entry = lookup(key)
+        if entry is None:
+            partition_id = get_partition(key)
+            keys = partition_keys[partition_id]
+            entry = index[key] = (partition_id, len(keys))
+            keys.append(key)
+        partition_id, key_id = entry
+        partition_ids[partition_id].append(key_id)
+        partition_values[partition_id].append(value)
+    return {partition_id: ColumnarBuffer.from_columns(keys, partition_ids[partition_id],
+                                                      partition_values[partition_id])
+            for partition_id, keys in enumerate(partition_keys) if keys}
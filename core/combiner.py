@@ -0,0 +1,238 @@
+"""
+Map端Combiner
+
+在每个map数据块内部按key预聚合value，减少进入分区/磁盘和Shuffle阶段的中间数据量。
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+
+class Combiner:
+    """
+    Combiner基类
+
+    子类需要实现 create/add 方法，按需覆盖 finish：
+        create(value)      -> 由第一个value创建累加器
+        add(acc, value)    -> 把一个value并入累加器，返回新累加器
+        finish(key, acc)   -> 把累加器转换为发往Reduce阶段的value
+
+    combine() 以有界内存运行：缓冲区中的不同key数量达到max_keys时，
+    先把已聚合的结果输出，再继续处理后续数据。
+
+    weighted为True的子类覆盖 create_weighted/add_weighted，不需要重复weight次就能并入
+    “同一个value出现weight次”；mapper记忆化时重复记录的输出只产生一次，
+    由 combine_weighted 按出现次数聚合（见 core.memoize）。
+    """
+
+    # 是否支持按权重聚合
+    weighted = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+
+    def create(self, value: Any) -> Any:
+        raise NotImplementedError
+
+    def add(self, acc: Any, value: Any) -> Any:
+        raise NotImplementedError
+
+    def finish(self, key: Any, acc: Any) -> Any:
+        return acc
+
+    def combine(self, pairs: Iterator[Tuple[Any, Any]]) -> Iterator[Tuple[Any, Any]]:
+        """
+        对键值对流进行预聚合
+
+        Args:
+            pairs: mapper产生的(key, value)流
+
+        Yields:
+            聚合后的(key, value)
+        """
+        buffer: Dict[Any, Any] = {}
+        for key, value in pairs:
+            if key in buffer:
+                buffer[key] = self.add(buffer[key], value)
+            else:
+                if len(buffer) >= self.max_keys:
+                    yield from self._flush(buffer)
+                buffer[key] = self.create(value)
+        yield from self._flush(buffer)
+
+    def create_weighted(self, value: Any, weight: int) -> Any:
+        """由weight个相同的value创建累加器"""
+        return self.add_weighted(self.create(value), value, weight - 1)
+
+    def add_weighted(self, acc: Any, value: Any, weight: int) -> Any:
+        """把weight个相同的value并入累加器，默认逐个add"""
+        for _ in range(weight):
+            acc = self.add(acc, value)
+        return acc
+
+    def combine_weighted(self, outputs: Iterable[Tuple[Iterable[Tuple[Any, Any]], int]]) -> Iterator[Tuple[Any, Any]]:
+        """
+        对带权重的mapper输出进行预聚合
+
+        Args:
+            outputs: (一条记录产生的键值对, 该记录的出现次数) 流
+
+        Yields:
+            聚合后的(key, value)，与把每条记录的输出重复对应次数后调用combine()等价
+        """
+        buffer: Dict[Any, Any] = {}
+        for pairs, weight in outputs:
+            for key, value in pairs:
+                if key in buffer:
+                    buffer[key] = self.add_weighted(buffer[key], value, weight)
+                else:
+                    if len(buffer) >= self.max_keys:
+                        yield from self._flush(buffer)
+                    buffer[key] = self.create_weighted(value, weight)
+        yield from self._flush(buffer)
+
+    def _flush(self, buffer: Dict[Any, Any]) -> Iterator[Tuple[Any, Any]]:
+        """输出缓冲区中的聚合结果并清空"""
+        for key, acc in buffer.items():
+            yield key, self.finish(key, acc)
+        buffer.clear()
+
+
+class SumCombiner(Combiner):
+    """求和Combiner，适用于词频统计等 reducer=sum(values) 的作业"""
+
+    weighted = True
+
+    def create(self, value: Any) -> Any:
+        return value
+
+    def add(self, acc: Any, value: Any) -> Any:
+        return acc + value
+
+    def create_weighted(self, value: Any, weight: int) -> Any:
+        return value * weight if weight > 1 else value
+
+    def add_weighted(self, acc: Any, value: Any, weight: int) -> Any:
+        return acc + value * weight
+
+
+class CountCombiner(Combiner):
+    """
+    计数Combiner，把每个key的value个数作为输出
+
+    Reduce阶段收到的是部分计数，reducer应使用 sum(values) 而不是 len(values)。
+    """
+
+    weighted = True
+
+    def create(self, value: Any) -> int:
+        return 1
+
+    def add(self, acc: int, value: Any) -> int:
+        return acc + 1
+
+    def create_weighted(self, value: Any, weight: int) -> int:
+        return weight
+
+    def add_weighted(self, acc: int, value: Any, weight: int) -> int:
+        return acc + weight
+
+
+class MeanCombiner(Combiner):
+    """
+    平均值Combiner，value为 (值, 计数) 元组
+
+    按分量累加，输出仍是 (总和, 总计数)，与demo中average_reducer的输入格式一致。
+    """
+
+    weighted = True
+
+    def create(self, value: Tuple[Any, int]) -> List:
+        total, count = value
+        return [total, count]
+
+    def add(self, acc: List, value: Tuple[Any, int]) -> List:
+        total, count = value
+        acc[0] += total
+        acc[1] += count
+        return acc
+
+    def create_weighted(self, value: Tuple[Any, int], weight: int) -> List:
+        total, count = value
+        return [total * weight, count * weight]
+
+    def add_weighted(self, acc: List, value: Tuple[Any, int], weight: int) -> List:
+        total, count = value
+        acc[0] += total * weight
+        acc[1] += count * weight
+        return acc
+
+    def finish(self, key: Any, acc: List) -> Tuple[Any, int]:
+        return acc[0], acc[1]
+
+
+class FunctionCombiner(Combiner):
+    """
+    函数Combiner，用 Hadoop 风格的 func(key, values) -> value 进行预聚合
+
+    每个key的value列表超过max_values时先折叠为一个值，保证内存有界。
+    func必须满足结合律，且输出能再次作为它的输入。
+    """
+
+    def __init__(self, func: Callable[[Any, List], Any], max_keys: int = 100000,
+                 max_values: int = 1024):
+        super().__init__(max_keys)
+        self.func = func
+        self.max_values = max_values
+
+    def create(self, value: Any) -> List:
+        return [value]
+
+    def add(self, acc: List, value: Any) -> List:
+        acc.append(value)
+        return acc
+
+    def combine(self, pairs: Iterator[Tuple[Any, Any]]) -> Iterator[Tuple[Any, Any]]:
+        buffer: Dict[Any, List] = {}
+        for key, value in pairs:
+            values = buffer.get(key)
+            if values is None:
+                if len(buffer) >= self.max_keys:
+                    yield from self._flush(buffer)
+                buffer[key] = [value]
+            else:
+                values.append(value)
+                if len(values) >= self.max_values:
+                    buffer[key] = [self.func(key, values)]
+        yield from self._flush(buffer)
+
+    def finish(self, key: Any, acc: List) -> Any:
+        return self.func(key, acc)
+
+
+BUILTIN_COMBINERS = {
+    "sum": SumCombiner,
+    "count": CountCombiner,
+    "mean": MeanCombiner,
+}
+
+
+def resolve_combiner(combiner: Union[None, str, Combiner, Callable]) -> Union[None, Combiner]:
+    """
+    把combiner参数统一转换为Combiner实例
+
+    Args:
+        combiner: None、内置名称("sum"/"count"/"mean")、Combiner实例或
+            func(key, values) -> value 函数
+
+    Returns:
+        Combiner实例，未指定时返回None
+    """
+    if combiner is None or isinstance(combiner, Combiner):
+        return combiner
+    if isinstance(combiner, str):
+        if combiner not in BUILTIN_COMBINERS:
+            raise ValueError(f"未知的combiner: {combiner}，可选: {list(BUILTIN_COMBINERS)}")
+        return BUILTIN_COMBINERS[combiner]()
+    if callable(combiner):
+        return FunctionCombiner(combiner)
+    raise TypeError(f"不支持的combiner类型: {type(combiner)}")
@@ -1,74 +1,329 @@
-from collections import defaultdict
-from typing import Callable, List, Any, Dict
+from collections import Counter, defaultdict
+from functools import partial
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, Any, Dict, Optional, Tuple, Union
 import time
 
 from utils.logger import get_logger
-from core.partitioner import Partitioner
+from storage.data_serializer import get_codec
+from storage.output_sink import OutputSink, resolve_output_sink
+from utils.chunking import has_length
+from core.partitioner import create_partitioner
+from core.combiner import resolve_combiner
+from core.shuffle import key_order
+from core.columnar import ColumnarBuffer
+from core.tasks import partition_pairs
+from core.cluster import LocalCluster
+from core.executor import EXECUTOR_THREAD, open_executor, iter_in_order
+from core.speculative import submit_speculative
+from core.stats import JobStats, PhaseStats, instrumented_task
+from core.scheduler import (SCHEDULE_DYNAMIC, DEFAULT_TARGET_TASK_SECONDS, AdaptiveChunker, iter_scheduled_chunks,
+                            resolve_schedule)
+from core.skew import (SkewReport, HotKeySplitter, detect_hot_keys, merge_split_results, hold_split_keys,
+                        commit_split_output)
+
+
+MODE_SIMULATE = "simulate"
+MODE_CLUSTER = "cluster"
 
 
 class DistributedMapReduce:
-    """分布式版本的MapReduce（模拟）"""
+    """分布式版本的MapReduce（单进程模拟或本地多进程集群）"""
 
-    def __init__(self, num_mappers: int = 3, num_reducers: int = 2):
+    def __init__(self, num_mappers: int = 3, num_reducers: int = 2, partitioner=None,
+                 mode: str = MODE_SIMULATE, speculative: bool = False,
+                 speculative_slow_factor: float = 2.0, hot_key_threshold: Optional[float] = None,
+                 codec: Optional[str] = None, trace: bool = False,
+                 schedule: str = SCHEDULE_DYNAMIC, target_task_seconds: float = DEFAULT_TARGET_TASK_SECONDS):
+        """
+        Args:
+            num_mappers: Mapper节点数
+            num_reducers: Reducer节点数
+            partitioner: 分区策略，见 core.partitioner.create_partitioner；
+                "range"时用第一个分片的map输出key拟合分界点
+            mode: "simulate"在单个进程内依次模拟各节点；"cluster"启动本地多进程集群，
+                Mapper通过localhost socket把数据推送给Reducer，见 core.cluster
+            speculative: simulate模式下并发运行各节点，并为慢节点启动备份（推测执行）
+            speculative_slow_factor: 运行时间超过已完成节点中位数的多少倍视为慢节点
+            hot_key_threshold: 启用热点key拆分时，采样中占比超过该值的key视为热点，
+                默认 0.5 / num_reducers，见 core.skew.detect_hot_keys
+            codec: cluster模式下Mapper到Reducer的Shuffle传输使用的编解码器，
+                如 "pickle5"、"records+zlib"，见 storage.data_serializer.get_codec
+            trace: 是否记录各节点和关键步骤的span（cluster模式下由各节点进程记录后随统计返回），
+                见 core.tracing
+            schedule: 输入分片方式，"dynamic"（默认）按已完成分片的耗时自适应地切成许多小分片，
+                cluster模式下由空闲Mapper向协调者拉取；"static"切成 num_mappers 份，见 core.scheduler。
+                动态调度下分片数和Mapper编号随测得的耗时变化，各Mapper的统计不再固定为
+                num_mappers 份；需要可复现的分片、编号和统计时使用 "static"
+            target_task_seconds: 动态调度时每个分片的目标处理耗时（秒）
+        """
+        if mode not in (MODE_SIMULATE, MODE_CLUSTER):
+            raise ValueError(f"未知的执行模式: {mode}")
+        self.mode = mode
+        self.speculative = speculative
+        self.speculative_slow_factor = speculative_slow_factor
+        self.hot_key_threshold = hot_key_threshold
+        self.codec = get_codec(codec)
+        self.trace = trace
+        self.schedule = resolve_schedule(schedule)
+        self.target_task_seconds = target_task_seconds
+        self._chunker: Optional[AdaptiveChunker] = None
         self.num_mappers = num_mappers
         self.num_reducers = num_reducers
-        self.partitioner = Partitioner(num_reducers)
+        self.partitioner = create_partitioner(partitioner, num_reducers)
         self.logger = get_logger("DistributedMapReduce")
         self.mapper_results = []
         self.reducer_results = {}
+        # cluster模式下每次Shuffle传输的字节数和耗时
+        self.transfer_stats = []
+        # 最近一次作业的统计和数据倾斜报告
+        self.job_stats = JobStats(trace=trace)
+        self.skew_report: Optional[SkewReport] = None
+
+    def simulate_distributed_execution(self, data: Iterable[Any], mapper: Callable, reducer: Callable,
+                                       combiner=None, return_stats: bool = False,
+                                       split_hot_keys: bool = False,
+                                       hot_key_merge: Optional[Callable[[Any, List[Any]], Any]] = None,
+                                       output: Union[None, str, OutputSink] = None) -> Any:
+        """
+        分布式执行（按mode在单进程内模拟或在本地多进程集群上运行）
+
+        Args:
+            data: 输入数据，list或任意可迭代对象（迭代器、生成器）
+            mapper: Map函数
+            reducer: Reduce函数
+            combiner: 可选的map端预聚合器，在每个Mapper节点内按key预聚合，
+                见 core.combiner.resolve_combiner
+            return_stats: 为True时返回 (results, JobStats)；统计也可以从 self.job_stats 读取
+            split_hot_keys: 是否把采样检测到的热点key分散到多个Reducer，完成后再合并各部分结果；
+                要求reducer的结果可以再次合并
+            hot_key_merge: 合并热点key部分结果的函数 merge(key, partial_results)，
+                默认用reducer本身（适用于求和、计数、取最大值等）
+            output: 输出目录或 OutputSink；指定后每个Reducer节点把结果流式写入自己的分片文件，
+                被拆分的热点key合并后写入一个额外的分片，返回 OutputManifest
 
-    def simulate_distributed_execution(self, data: List[Any], mapper: Callable, reducer: Callable) -> Dict[Any, Any]:
-        """模拟分布式执行"""
-        self.logger.info(f"开始分布式MapReduce模拟: Mappers={self.num_mappers}, Reducers={self.num_reducers}")
+        Returns:
+            {key: 归约结果}，或 OutputManifest
+        """
+        mode_name = "模拟" if self.mode == MODE_SIMULATE else "本地集群"
+        self.logger.info(f"开始分布式MapReduce{mode_name}: Mappers={self.num_mappers}, Reducers={self.num_reducers}")
         start_time = time.time()
+        self.job_stats = JobStats(trace=self.trace)
+        combiner = resolve_combiner(combiner)
+        output = resolve_output_sink(output)
+        if output is not None:
+            output.prepare()
+
+        with self.job_stats.tracing():
+            # 模拟数据分片（惰性切分，边读取边处理）
+            data_shards = self._split_data(data, self.num_mappers)
+
+            data_shards, hot_keys = self._prepare_partitioner(data_shards, mapper, split_hot_keys)
+            partitioner = HotKeySplitter(self.partitioner, hot_keys) if hot_keys else self.partitioner
+            merge = hot_key_merge or reducer
+
+            if self.mode == MODE_CLUSTER:
+                final_results = self._execute_cluster(data_shards, mapper, reducer, combiner,
+                                                      partitioner, hot_keys, merge, output)
+                return self._finish(final_results, start_time, return_stats)
+
+            # Map阶段（在不同节点上并行执行）
+            self.logger.info("开始Map阶段...")
+            with self.job_stats.timed_phase("map") as phase:
+                self.mapper_results = list(self._run_nodes(partial(self._map_shard, mapper, combiner, partitioner),
+                                                           data_shards, self.num_mappers, phase,
+                                                           count_out=lambda result: sum(map(len, result.values()))))
+            self.logger.info(f"数据分片完成: {len(self.mapper_results)} 个分片")
+
+            # Shuffle阶段（网络传输）
+            self.logger.info("开始Shuffle阶段...")
+            with self.job_stats.timed_phase("shuffle"):
+                shuffled_data = self._shuffle_data()
+            stats = self.job_stats
+            for reducer_id, group_data in shuffled_data.items():
+                stats.partition_keys[reducer_id] = len(group_data)
+                stats.partition_values[reducer_id] = sum(len(values) for values in group_data.values())
+            stats.intermediate_pairs = sum(stats.partition_values.values())
+            key_counts = Counter()
+            split_counts = defaultdict(dict)
+            for reducer_id, group_data in shuffled_data.items():
+                for key, values in group_data.items():
+                    key_counts[key] += len(values)
+                    if key in hot_keys:
+                        split_counts[key][reducer_id] = len(values)
+            self._report_skew(key_counts, split_counts, hot_keys)
+
+            # Reduce阶段（在不同节点上并行执行）
+            self.logger.info("开始Reduce阶段...")
+            reducer_inputs = [(reducer_id, shuffled_data[reducer_id]) for reducer_id in sorted(shuffled_data)]
+            with stats.timed_phase("reduce") as phase:
+                if output is None:
+                    reducer_outputs = list(self._run_nodes(partial(self._reduce_node, reducer), reducer_inputs,
+                                                           self.num_reducers, phase, count_out=len))
+                else:
+                    reducer_outputs = list(self._run_nodes(
+                        partial(self._reduce_node_to_shard, reducer, output, list(hot_keys)), reducer_inputs,
+                        self.num_reducers, phase, count_out=lambda result: result[0]["records"],
+                        fence_kwarg="fence"))
+            for task in phase.tasks:
+                task.records_in = stats.partition_values.get(reducer_inputs[task.task_id][0], 0)
+
+            # 合并被拆分的热点key
+            with stats.timed_phase("merge"):
+                if output is None:
+                    final_results = merge_split_results(reducer_outputs, hot_keys, merge)
+                else:
+                    final_results = commit_split_output(output, (shard for shard, _ in reducer_outputs),
+                                                        (held for _, held in reducer_outputs), hot_keys, merge)
+
+            return self._finish(final_results, start_time, return_stats)
+
+    def _prepare_partitioner(self, data_shards: Iterator[List[Any]], mapper: Callable,
+                             split_hot_keys: bool) -> Tuple[Iterator[List[Any]], Dict[Any, int]]:
+        """
+        用第一个分片的map输出key拟合范围分区器并检测热点key
+
+        Returns:
+            (可继续使用的分片迭代器, {热点key: 拆分份数})
+        """
+        if split_hot_keys and self.partitioner.sorted_output:
+            self.logger.warning("有序分区不支持热点key拆分，已忽略split_hot_keys")
+            split_hot_keys = False
+        if not (self.partitioner.requires_sample or split_hot_keys):
+            return data_shards, {}
+
+        first_shard = next(data_shards, [])
+        sample_keys = [key for item in first_shard for key, _ in mapper(item)]
+        if self.partitioner.requires_sample:
+            self.partitioner.fit(sample_keys)
+        hot_keys = {}
+        if split_hot_keys:
+            hot_keys = detect_hot_keys(sample_keys, self.num_reducers, self.hot_key_threshold)
+            self.logger.info(f"采样 {len(sample_keys)} 个键值对，检测到 {len(hot_keys)} 个热点key: "
+                             f"{list(hot_keys)[:10]}")
+        return chain([first_shard], data_shards), hot_keys
 
-        # 模拟数据分片
-        data_shards = self._split_data(data, self.num_mappers)
-        self.logger.info(f"数据分片完成: {len(data_shards)} 个分片")
-
-        # Map阶段（在不同节点上并行执行）
-        self.logger.info("开始Map阶段...")
-        for i, shard in enumerate(data_shards):
-            self.logger.info(f"Mapper {i + 1} 处理 {len(shard)} 条数据")
-            intermediate = []
-            for item in shard:
-                for key, value in mapper(item):
-                    # 根据key选择reducer
-                    reducer_id = self.partitioner.get_reducer_for_key(key)
-                    intermediate.append((reducer_id, key, value))
-            self.mapper_results.append(intermediate)
-            self.logger.info(f"Mapper {i + 1} 生成 {len(intermediate)} 个中间结果")
-
-        # Shuffle阶段（网络传输）
-        self.logger.info("开始Shuffle阶段...")
-        shuffled_data = self._shuffle_data()
-
-        # Reduce阶段（在不同节点上并行执行）
-        self.logger.info("开始Reduce阶段...")
-        final_results = {}
-        for reducer_id, group_data in shuffled_data.items():
-            self.logger.info(f"Reducer {reducer_id + 1} 处理 {len(group_data)} 个key")
-            results = {}
-            for key, values in group_data.items():
-                results[key] = reducer(key, values)
-            final_results.update(results)
-            self.logger.info(f"Reducer {reducer_id + 1} 生成 {len(results)} 个最终结果")
+    def _report_skew(self, key_counts: Dict[Any, int], split_counts: Dict[Any, Dict[int, int]],
+                     hot_keys: Dict[Any, int]):
+        """根据Shuffle后的统计生成数据倾斜报告"""
+        self.skew_report = SkewReport.from_counts(self.partitioner, self.job_stats.partition_values,
+                                                  key_counts, split_counts, hot_keys)
+        self.logger.info(f"数据倾斜报告: {self.skew_report.summary()}")
 
+    def _finish(self, final_results: Dict[Any, Any], start_time: float, return_stats: bool):
         end_time = time.time()
+        self.job_stats.total_seconds = end_time - start_time
         self.logger.info(f"分布式MapReduce完成，耗时: {end_time - start_time:.2f}秒")
+        if return_stats:
+            return final_results, self.job_stats
         return final_results
 
-    def _split_data(self, data: List[Any], num_shards: int) -> List[List[Any]]:
-        """数据分片"""
-        shard_size = max(1, len(data) // num_shards)
-        return [data[i:i + shard_size] for i in range(0, len(data), shard_size)]
+    def _run_nodes(self, fn: Callable, inputs: Iterable[Any], num_nodes: int, phase: PhaseStats,
+                   count_out: Optional[Callable[[Any], int]] = None,
+                   fence_kwarg: Optional[str] = None) -> Iterator[Any]:
+        """
+        运行一组节点任务，按输入顺序返回结果
 
-    def _shuffle_data(self) -> Dict[int, Dict[Any, List]]:
-        """Shuffle数据到对应的Reducer"""
-        shuffled = defaultdict(lambda: defaultdict(list))
+        默认依次执行；启用推测执行时用线程池并发执行，并为慢节点启动备份，
+        fence_kwarg不为None时各副本收到自己的 AttemptFence（见 core.speculative）。
+        每个节点的耗时和计数器记录到phase中。
+        """
+        fn = partial(instrumented_task, fn, trace=self.trace, span_name=phase.name)
+        counters, trace = self.job_stats.counters, self.job_stats.trace
+        if not self.speculative:
+            results = ((node_id, fn(node_id, node_input)) for node_id, node_input in enumerate(inputs))
+            for _, result in phase.collect(results, count_out, counters, trace):
+                yield result
+            return
 
-        for mapper_result in self.mapper_results:
-            for reducer_id, key, value in mapper_result:
-                shuffled[reducer_id][key].append(value)
+        with open_executor(EXECUTOR_THREAD, num_nodes, wait_on_exit=False) as executor:
+            results = submit_speculative(executor, fn, inputs, num_nodes,
+                                         slow_factor=self.speculative_slow_factor, fence_kwarg=fence_kwarg)
+            yield from iter_in_order(phase.collect(results, count_out, counters, trace))
+
+    def _map_shard(self, mapper: Callable, combiner, partitioner, shard_id: int,
+                   shard: List[Any]) -> Dict[int, ColumnarBuffer]:
+        """Mapper节点：处理一个分片，返回 {reducer_id: 发往该Reducer的键值对}"""
+        if not has_length(shard):
+            # 文件输入切分在节点内读取
+            shard = list(shard)
+        self.logger.info(f"Mapper {shard_id + 1} 处理 {len(shard)} 条数据")
+        pairs = (pair for item in shard for pair in mapper(item))
+        if combiner is not None:
+            pairs = combiner.combine(pairs)
+        # 根据key选择reducer
+        intermediate = partition_pairs(partitioner, pairs)
+        self.logger.info(f"Mapper {shard_id + 1} 生成 {sum(map(len, intermediate.values()))} 个中间结果")
+        return intermediate
+
+    def _reduce_node(self, reducer: Callable, node_id: int,
+                     reducer_input: Tuple[int, Dict[Any, List]]) -> Dict[Any, Any]:
+        """Reducer节点：归约分配给它的所有key"""
+        reducer_id, group_data = reducer_input
+        self.logger.info(f"Reducer {reducer_id + 1} 处理 {len(group_data)} 个key")
+        results = dict(self._iter_reduce(reducer, group_data))
+        self.logger.info(f"Reducer {reducer_id + 1} 生成 {len(results)} 个最终结果")
+        return results
+
+    def _reduce_node_to_shard(self, reducer: Callable, output: OutputSink, split_keys: List[Any], node_id: int,
+                              reducer_input: Tuple[int, Dict[Any, List]],
+                              fence=None) -> Tuple[Dict[str, Any], List]:
+        """
+        Reducer节点（分片输出）：结果边归约边写入编号为reducer_id的分片；
+        推测执行时被放弃的副本（见fence）不再替换分片
+
+        Returns:
+            (分片摘要, 被拆分key的部分结果)
+        """
+        reducer_id, group_data = reducer_input
+        self.logger.info(f"Reducer {reducer_id + 1} 处理 {len(group_data)} 个key")
+        held = []
+        shard = output.write_shard(reducer_id, hold_split_keys(self._iter_reduce(reducer, group_data),
+                                                               split_keys, held), fence=fence)
+        self.logger.info(f"Reducer {reducer_id + 1} 写出 {shard['records']} 个最终结果到 {shard['file']}")
+        return shard, held
+
+    def _iter_reduce(self, reducer: Callable, group_data: Dict[Any, List]) -> Iterator[Tuple[Any, Any]]:
+        keys = group_data.keys()
+        if self.partitioner.sorted_output:
+            keys = sorted(keys, key=key_order)
+        for key in keys:
+            yield key, reducer(key, group_data[key])
 
-        return dict(shuffled)
\ No newline at end of file
+    def _execute_cluster(self, data_shards: Iterator[List[Any]], mapper: Callable, reducer: Callable,
+                         combiner, partitioner, hot_keys: Dict[Any, int], merge: Callable,
+                         output: Optional[OutputSink] = None) -> Any:
+        """在本地多进程集群上执行作业"""
+        if self.speculative:
+            self.logger.warning("cluster模式暂不支持推测执行，按普通方式运行")
+
+        cluster = LocalCluster(self.num_mappers, self.num_reducers, partitioner, self.codec, self.trace)
+        final_results = cluster.execute(data_shards, mapper, reducer, combiner,
+                                        split_keys=hot_keys, merge=merge, output=output,
+                                        observe_shard=self._chunker.observe if self._chunker else None)
+        self.transfer_stats = cluster.transfers
+        self.job_stats = cluster.stats
+        self._report_skew(cluster.key_counts, cluster.split_counts, hot_keys)
+        return final_results
+
+    def _split_data(self, data: Iterable[Any], num_shards: int) -> Iterator[List[Any]]:
+        """
+        数据分片，文件输入按字节范围切分
+
+        静态调度时已知长度的输入切分为num_shards份，迭代器输入按默认块大小切分；
+        动态调度时按已完成分片的耗时自适应切分：simulate模式读取map阶段的任务指标，
+        cluster模式由协调者在Mapper领取下一个分片时反馈耗时。
+        """
+        self._chunker = None
+        if self.schedule == SCHEDULE_DYNAMIC:
+            self._chunker = AdaptiveChunker(num_shards, self.target_task_seconds)
+        metrics = self.job_stats.phase("map").tasks if self.mode == MODE_SIMULATE else None
+        return iter_scheduled_chunks(data, num_shards, self.schedule, chunker=self._chunker, metrics=metrics)
+
+    def _shuffle_data(self) -> Dict[int, Dict[Any, List]]:
+        """Shuffle数据到对应的Reducer，合并各Mapper的缓冲区后按key编号分组"""
+        buffers = defaultdict(ColumnarBuffer)
+        for mapper_result in self.mapper_results:
+            for reducer_id, buffer in mapper_result.items():
+                buffers[reducer_id].extend(buffer)
+        return {reducer_id: buffer.groups() for reducer_id, buffer in buffers.items()}
\ No newline at end of file
@@ -0,0 +1,126 @@
+import pickle
+from contextlib import contextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+from utils.logger import get_logger
+
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+EXECUTOR_TYPES = (EXECUTOR_THREAD, EXECUTOR_PROCESS)
+
+logger = get_logger("mapreduce_framework")
+
+
+class CompletedTask:
+    """已有结果的任务（如命中缓存），提交时直接返回结果而不占用worker"""
+
+    def __init__(self, result: Any):
+        self.result = result
+
+
+def is_picklable(obj: Any) -> bool:
+    """检查对象能否被pickle（进程池需要把函数发送到子进程）"""
+    try:
+        pickle.dumps(obj)
+        return True
+    except Exception:
+        return False
+
+
+def resolve_executor_type(executor_type: str, *payloads: Any) -> str:
+    """
+    确定实际使用的执行器类型
+
+    进程模式下，mapper/reducer等对象必须可以pickle；lambda、闭包（如
+    demo中的average_mapper）无法发送到子进程，此时回退到线程池。
+
+    Args:
+        executor_type: 期望的执行器类型
+        payloads: 需要发送到子进程的对象
+
+    Returns:
+        实际使用的执行器类型
+    """
+    if executor_type not in EXECUTOR_TYPES:
+        raise ValueError(f"未知的执行器类型: {executor_type}，可选: {EXECUTOR_TYPES}")
+
+    if executor_type == EXECUTOR_PROCESS:
+        for payload in payloads:
+            if payload is not None and not is_picklable(payload):
+                name = getattr(payload, "__qualname__", repr(payload))
+                logger.warning(f"{name} 无法pickle，回退到线程执行器")
+                return EXECUTOR_THREAD
+    return executor_type
+
+
+def create_executor(executor_type: str, max_workers: int) -> Executor:
+    """根据类型创建线程池或进程池"""
+    if executor_type == EXECUTOR_PROCESS:
+        return ProcessPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+@contextmanager
+def open_executor(executor_type: str, max_workers: int, wait_on_exit: bool = True) -> Iterator[Executor]:
+    """
+    创建执行器的上下文管理器
+
+    wait_on_exit为False时退出不等待仍在运行的任务（推测执行中被放弃的副本），
+    未开始的任务直接取消。
+    """
+    executor = create_executor(executor_type, max_workers)
+    try:
+        yield executor
+    finally:
+        executor.shutdown(wait=wait_on_exit, cancel_futures=not wait_on_exit)
+
+
+def submit_bounded(executor: Executor, fn: Callable, tasks: Iterable[Any],
+                   max_inflight: int) -> Iterator[Tuple[int, Any]]:
+    """
+    带背压的任务提交
+
+    逐个从tasks中取出任务提交，同时运行中的任务数不超过max_inflight；
+    达到上限时等待任意任务完成后再读取下一个任务，因此输入可以是惰性生成器。
+
+    Args:
+        executor: 执行器
+        fn: 任务函数，调用方式为 fn(task_id, task)
+        tasks: 任务迭代器，CompletedTask直接返回其结果
+        max_inflight: 最大在途任务数
+
+    Yields:
+        按完成顺序返回 (task_id, result)
+    """
+    pending = {}
+    for task_id, task in enumerate(tasks):
+        if isinstance(task, CompletedTask):
+            yield task_id, task.result
+            continue
+        if len(pending) >= max_inflight:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+        pending[executor.submit(fn, task_id, task)] = task_id
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
+
+
+def iter_in_order(results: Iterable[Tuple[int, Any]]) -> Iterator[Any]:
+    """
+    把按完成顺序返回的 (task_id, result) 重新按task_id顺序输出
+
+    只缓存提前完成的结果，使输出顺序与输入顺序一致。
+    """
+    pending = {}
+    next_id = 0
+    for task_id, result in results:
+        pending[task_id] = result
+        while next_id in pending:
+            yield pending.pop(next_id)
+            next_id += 1
@@ -1,158 +1,681 @@
+import os
 import time
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, List, Any, Dict
-import hashlib
+from collections.abc import Collection, Sequence
+from functools import partial
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, List, Any, Dict, Optional, Tuple, Union
 
 from storage.file_manager import FileManager
 from storage.data_serializer import DataSerializer
+from storage.state_store import StateStore
+from storage.input_format import is_file_input
+from storage.output_sink import OutputSink, OutputManifest, resolve_output_sink
+from storage.job_cache import JobCache, MISS, function_fingerprint, data_fingerprint, combine_keys
 from utils.logger import get_logger
-from core.partitioner import Partitioner
+from utils.chunking import iter_chunks, describe_input
+from core.partitioner import create_partitioner
+from core.executor import (EXECUTOR_THREAD, resolve_executor_type, open_executor, submit_bounded,
+                           iter_in_order, CompletedTask)
+from core.tasks import (map_task, iter_map_output, reduce_batch_task, group_partition, shuffle_reduce_task,
+                        DEFAULT_REDUCE_BATCH_SIZE)
+from core.combiner import resolve_combiner
+from core.shuffle import ExternalSorter
+from core.columnar import ColumnarBuffer
+from core.async_runner import DEFAULT_ASYNC_CONCURRENCY, is_async_function, wrap_async
+from core.memoize import DEFAULT_MEMO_MAX_MB, is_memoized_mapper, wrap_memoized
+from core.speculative import submit_speculative
+from core.stats import JobStats, PhaseStats, instrumented_task
+from core.tracing import span
+from core.scheduler import (SCHEDULE_DYNAMIC, SCHEDULE_STATIC, DEFAULT_TARGET_TASK_SECONDS, AdaptiveChunker,
+                            iter_scheduled_chunks, resolve_schedule)
+from core.vectorized import (batch_sample_keys, is_batch_mapper, require_numpy, resolve_vectorized_reducer,
+                             vectorized_map_task, vectorized_reduce_task)
+
+
+# 自适应Reduce批大小的上限
+MAX_REDUCE_BATCH_SIZE = 10000
+# 范围分区采样的输入记录数
+PARTITION_SAMPLE_RECORDS = 1000
+
+
+def _count_output(output: Optional[OutputSink]) -> Callable[[Any], int]:
+    """分区任务输出的记录数：结果列表的长度，或分片摘要中的记录数"""
+    if output is None:
+        return len
+    return lambda shard: shard["records"]
 
 
 class MapReduce:
     """MapReduce框架核心类"""
 
     def __init__(self, num_workers: int = 4, temp_dir: str = "./temp_mapreduce",
-                 use_disk_storage: bool = False):
+                 use_disk_storage: bool = False, executor_type: str = EXECUTOR_THREAD,
+                 chunk_size: Optional[int] = None, max_inflight_chunks: Optional[int] = None,
+                 sort_buffer_mb: Optional[float] = None, partitioner=None,
+                 spill_compression: Optional[str] = None, spill_mmap: bool = False,
+                 reduce_batch_size: Optional[int] = None, speculative: bool = False,
+                 speculative_slow_factor: float = 2.0, cache: bool = False,
+                 cache_max_mb: float = 512, async_concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                 spill_codec: Optional[str] = None, trace: bool = False,
+                 schedule: str = SCHEDULE_DYNAMIC, target_task_seconds: float = DEFAULT_TARGET_TASK_SECONDS,
+                 memoize_mapper: bool = False, memo_max_mb: float = DEFAULT_MEMO_MAX_MB):
         """
         初始化MapReduce框架
 
         Args:
-            num_workers: worker线程数量
+            num_workers: worker数量
             temp_dir: 临时文件目录
-            use_disk_storage: 是否使用磁盘存储中间结果
+            use_disk_storage: 是否使用磁盘存储中间结果（每个map任务按分区写分帧溢写文件）
+            executor_type: 执行器类型，"thread"（线程池）或 "process"（进程池，
+                适合CPU密集的纯Python mapper/reducer）
+            chunk_size: 每个map任务的固定记录数，指定后按该大小静态切分
+            max_inflight_chunks: 同时在途的map任务数上限（背压），默认 2 * num_workers
+            sort_buffer_mb: 设置后启用排序Shuffle：map输出缓冲超过该内存预算（MB）时
+                排序并溢写到temp_dir，最后k路归并；未溢写时仍按哈希分组
+            partitioner: 分区策略，None/"hash"、"range"（每次作业前对输入采样，
+                输出按key全局有序）、Partitioner实例或 func(key, num_partitions) -> int
+            spill_compression: 溢写文件压缩方式，None、"zlib"或"lzma"
+            spill_mmap: 读取溢写文件时是否使用mmap
+            reduce_batch_size: 每个reduce任务处理的key数量，默认根据key数量和worker数自适应
+            speculative: 是否启用推测执行，为运行明显慢于其他任务的map/reduce任务启动备份
+            speculative_slow_factor: 运行时间超过已完成任务中位数的多少倍视为慢任务
+            cache: 是否启用内容寻址缓存（位于 temp_dir/cache），跨作业复用输入未变化的
+                数据块的map输出；输入和函数都未变化时直接复用最终结果
+            cache_max_mb: 缓存总大小上限（MB），超过时按LRU淘汰
+            async_concurrency: async def mapper/reducer同时运行的协程数上限，
+                同一进程内的所有任务共享，见 core.async_runner
+            spill_codec: 溢写文件帧负载的编解码器，默认pickle；可选 "pickle5"、"marshal"、
+                "records"（键值对的紧凑二进制格式），见 storage.data_serializer
+            trace: 是否记录各任务和关键步骤（分区、溢写、帧读取、分组、reduce批次）的span，
+                作业结束后可以用 job_stats.trace.save(path) 导出Chrome trace，见 core.tracing
+            schedule: map任务调度方式，"dynamic"（默认）按已完成任务的耗时把输入自适应地切成
+                许多小任务，由空闲worker拉取；"static"切成 num_workers 个等记录数的块，
+                任务边界可复现（启用cache时总是使用静态切分），见 core.scheduler
+            target_task_seconds: 动态调度时每个map任务的目标耗时（秒）
+            memoize_mapper: 是否缓存mapper对每条不同记录的输出，重复记录不再执行mapper；
+                与sum/count/mean combiner一起使用时块内重复记录的输出按出现次数加权聚合，
+                只适用于确定性的mapper，见 core.memoize
+            memo_max_mb: 每个进程中mapper输出缓存的内存上限（MB），超过时按LRU淘汰
         """
         self.num_workers = num_workers
         self.temp_dir = temp_dir
         self.use_disk_storage = use_disk_storage
-        self.partitioner = Partitioner(num_workers)
+        self.executor_type = resolve_executor_type(executor_type)
+        self.chunk_size = chunk_size
+        self.max_inflight_chunks = max_inflight_chunks or 2 * num_workers
+        self.sort_buffer_mb = sort_buffer_mb
+        self.reduce_batch_size = reduce_batch_size
+        self.speculative = speculative
+        self.speculative_slow_factor = speculative_slow_factor
+        self.async_concurrency = async_concurrency
+        self.trace = trace
+        self.schedule = resolve_schedule(schedule)
+        self.target_task_seconds = target_task_seconds
+        self.memoize_mapper = memoize_mapper
+        self.memo_max_mb = memo_max_mb
+        self.partitioner = create_partitioner(partitioner, num_workers)
+        self._sample_partitioner = partitioner == "range"
         self.logger = get_logger("mapreduce_framework")
 
-        if use_disk_storage:
-            self.file_manager = FileManager(temp_dir)
-            self.serializer = DataSerializer()
+        self._job_id = None
+        # 本次作业各数据块的缓存key，用于计算最终结果的缓存key
+        self._chunk_keys: List[Optional[str]] = []
+        self.cache = JobCache(os.path.join(temp_dir, "cache"), cache_max_mb) if cache else None
+        # 最近一次作业的统计，run() 开始时重置
+        self.job_stats = JobStats(trace=trace)
+
+        if use_disk_storage or sort_buffer_mb is not None:
+            self.file_manager = FileManager(temp_dir, compression=spill_compression,
+                                            use_mmap=spill_mmap, codec=spill_codec)
+            self.serializer = DataSerializer(spill_codec)
 
         self._create_temp_dir()
 
     def _create_temp_dir(self):
         """创建临时目录"""
-        import os
         if not os.path.exists(self.temp_dir):
             os.makedirs(self.temp_dir)
 
-    def map_phase(self, mapper: Callable, data: List[Any]) -> Dict[str, List]:
+    def _current_job(self) -> str:
+        """当前作业在FileManager中的ID，单独调用各阶段时按需创建"""
+        if self._job_id is None:
+            self._job_id = self.file_manager.start_job()
+        return self._job_id
+
+    def _finish_job(self):
+        """清理当前作业的临时文件"""
+        if self._job_id is not None:
+            self.file_manager.cleanup_job(self._job_id)
+            self._job_id = None
+
+    def _open_executor(self, executor_type: str):
+        """创建执行器；推测执行时阶段结束不等待被放弃的慢副本"""
+        return open_executor(executor_type, self.num_workers, wait_on_exit=not self.speculative)
+
+    def _map_chunks(self, data: Iterable[Any], phase: PhaseStats) -> Tuple[Iterator[Any], Optional[AdaptiveChunker]]:
+        """
+        按调度方式把输入切分为map任务
+
+        动态调度时切分器读取phase中已完成任务的耗时来决定之后的块大小；
+        缓存map输出要求数据块边界可复现，此时使用静态切分。
+
+        Returns:
+            (数据块迭代器, 动态调度时的切分器)
+        """
+        schedule = SCHEDULE_STATIC if self.cache is not None else self.schedule
+        chunker = None
+        if schedule == SCHEDULE_DYNAMIC and self.chunk_size is None:
+            chunker = AdaptiveChunker(self.num_workers, self.target_task_seconds)
+        chunks = iter_scheduled_chunks(data, self.num_workers, schedule, self.chunk_size, chunker, phase.tasks)
+        return chunks, chunker
+
+    def _submit_tasks(self, executor, fn: Callable, tasks: Iterable[Any], phase: PhaseStats,
+                      attempt_kwarg: Optional[str] = None, fence_kwarg: Optional[str] = None,
+                      count_out: Optional[Callable[[Any], int]] = None) -> Iterable[Tuple[int, Any]]:
+        """
+        提交任务，启用推测执行时为慢任务启动备份，返回按完成顺序的 (task_id, result)
+
+        推测执行时各副本通过fence_kwarg收到自己的 AttemptFence，被放弃的副本不再提交结果。
+
+        每个任务的耗时、CPU时间和计数器记录到phase中，count_out用于根据结果计算输出记录数。
+        """
+        fn = partial(instrumented_task, fn, trace=self.trace, span_name=phase.name)
+        tasks = (CompletedTask((task.result, None)) if isinstance(task, CompletedTask) else task
+                 for task in tasks)
+        if self.speculative:
+            results = submit_speculative(executor, fn, tasks, self.num_workers,
+                                         slow_factor=self.speculative_slow_factor,
+                                         attempt_kwarg=attempt_kwarg, fence_kwarg=fence_kwarg)
+        else:
+            results = submit_bounded(executor, fn, tasks, self.max_inflight_chunks)
+        return phase.collect(results, count_out, self.job_stats.counters, self.job_stats.trace)
+
+    def _partition_counts(self, result: Dict[int, Any]) -> Dict[int, int]:
+        """一个map任务输出在各分区的键值对数量"""
+        if self.use_disk_storage:
+            return {pid: self.file_manager.record_count(filename) for pid, filename in result.items()}
+        return {pid: len(pairs) for pid, pairs in result.items()}
+
+    def _fit_partitioner(self, mapper: Callable, data: Iterable[Any]) -> Iterable[Any]:
+        """
+        对输入采样，用样本记录的map输出key拟合范围分区器
+
+        序列输入等间隔采样；集合等可重复迭代的输入和文件输入读取开头的若干条记录，
+        都不消耗数据；迭代器输入读取开头的若干条记录，再与剩余数据拼接返回。
+        样本记录与Map阶段一样逐条处理错误，单条坏记录不会中止采样。
+
+        Returns:
+            可继续用于Map阶段的输入
+        """
+        if isinstance(data, Sequence):
+            step = max(1, len(data) // PARTITION_SAMPLE_RECORDS)
+            sample = [data[i] for i in range(0, len(data), step)]
+        elif is_file_input(data) or isinstance(data, Collection):
+            # 文件输入和set/dict视图等可以重复迭代，只读取开头的样本记录
+            sample = list(islice(data, PARTITION_SAMPLE_RECORDS))
+        else:
+            iterator = iter(data)
+            sample = list(islice(iterator, PARTITION_SAMPLE_RECORDS))
+            data = chain(sample, iterator)
+
+        if is_batch_mapper(mapper):
+            sample_keys = batch_sample_keys(mapper, sample)
+        else:
+            if is_memoized_mapper(mapper):
+                # 采样不经过输出缓存，LRU的占用统计只来自map任务
+                mapper = mapper.mapper
+            sample_keys = [key for key, _ in iter_map_output(mapper, sample)]
+        self.partitioner.fit(sample_keys)
+        self.logger.info(f"范围分区器采样完成: {len(sample)} 条记录, {len(sample_keys)} 个key")
+        return data
+
+    def _cached_chunks(self, chunks: Iterable[List[Any]], map_fingerprint: str, job_id: Optional[str],
+                       pending_keys: Dict[int, str]) -> Iterable[Any]:
+        """
+        查询每个数据块的map输出缓存
+
+        命中的数据块包装为CompletedTask，不再提交给worker；未命中的数据块原样返回，
+        其缓存key记录到pending_keys，map任务完成后写入缓存。
+        """
+        storage = "disk" if self.use_disk_storage else "memory"
+        for chunk_id, chunk in enumerate(chunks):
+            chunk_key = combine_keys(data_fingerprint(chunk), map_fingerprint, storage)
+            self._chunk_keys.append(chunk_key)
+            cached = self.cache.get(chunk_key)
+            if cached is MISS:
+                pending_keys[chunk_id] = chunk_key
+                yield chunk
+            elif self.use_disk_storage:
+                # 把缓存的溢写文件复制进本作业目录，缓存淘汰不影响本次作业
+                outputs = {}
+                for partition_id, path in cached.items():
+                    filename = self.file_manager.job_file(job_id, f"map_{chunk_id}_part_{partition_id}.spill")
+                    self.file_manager.import_file(path, filename)
+                    outputs[partition_id] = filename
+                yield CompletedTask(outputs)
+            else:
+                yield CompletedTask(cached)
+
+    def _cache_map_output(self, chunk_key: str, result: Dict[int, Any]):
+        """把一个数据块的map输出写入缓存"""
+        if self.use_disk_storage:
+            self.cache.put_files(chunk_key, {partition_id: os.path.join(self.file_manager.base_dir, filename)
+                                             for partition_id, filename in result.items()})
+        else:
+            self.cache.put(chunk_key, result)
+
+    def map_phase(self, mapper: Callable, data: Iterable[Any], combiner=None) -> Dict[int, Any]:
         """
         Map阶段：将输入数据转换为键值对
+
+        输入按块惰性读取，在途的map任务不超过 max_inflight_chunks 个，
+        因此输入可以是生成器，内存占用只与在途数据块有关。
+
+        Args:
+            mapper: Map函数
+            data: 输入数据，list或任意可迭代对象
+            combiner: 可选的map端预聚合器，见 core.combiner
+
+        Returns:
+            内存模式返回 {分区编号: ColumnarBuffer}，
+            磁盘模式返回 {分区编号: [溢写文件名, ...]}，
+            排序Shuffle模式返回 {分区编号: 该分区的ExternalSorter}
         """
         self.logger.info("开始Map阶段...")
-        intermediate = defaultdict(list)
-
-        def process_chunk(chunk_id, chunk):
-            """处理数据块"""
-            local_intermediate = defaultdict(list)
-            for item in chunk:
-                try:
-                    for key, value in mapper(item):
-                        partition_key = self.partitioner.get_partition(key)
-                        local_intermediate[partition_key].append((key, value))
-                except Exception as e:
-                    self.logger.error(f"Map处理错误: {e}")
-
-            # 根据配置选择存储方式
+        intermediate = defaultdict(list if self.use_disk_storage else ColumnarBuffer)
+
+        combiner = resolve_combiner(combiner)
+        file_manager = self.file_manager if self.use_disk_storage else None
+        job_id = self._current_job() if self.use_disk_storage else None
+        executor_type = resolve_executor_type(self.executor_type, mapper, combiner, self.partitioner)
+        process_chunk = partial(map_task, mapper, self.partitioner,
+                                file_manager=file_manager, combiner=combiner, job_id=job_id)
+
+        # 将数据分块，文件输入按字节范围切分，由map任务各自读取
+        chunks, chunker = self._map_chunks(data, self.job_stats.phase("map"))
+        self._chunk_keys = []
+        pending_keys: Dict[int, str] = {}
+        if self.cache is not None:
+            map_fingerprint = function_fingerprint(mapper, combiner, self.partitioner)
+            chunks = self._cached_chunks(chunks, map_fingerprint, job_id, pending_keys)
+
+        if self.sort_buffer_mb is not None:
+            # 每个分区一个外部排序器，平分内存预算
+            sorter_budget = self.sort_buffer_mb / self.partitioner.num_partitions
+            sort_job_id = self._current_job()
+            intermediate = defaultdict(lambda: ExternalSorter(
+                self.file_manager, sorter_budget, sort_in_memory=self.partitioner.sorted_output,
+                job_id=sort_job_id))
+
+        stats = self.job_stats
+
+        def count_map_output(result) -> int:
+            """统计map任务输出，同时累加到各分区的value数"""
+            counts = self._partition_counts(result)
+            for partition_id, count in counts.items():
+                stats.partition_values[partition_id] = stats.partition_values.get(partition_id, 0) + count
             if self.use_disk_storage:
-                filename = f"map_output_{chunk_id}.pkl"
-                self.file_manager.save_data(local_intermediate, filename)
-                return filename
-            else:
-                return local_intermediate
+                stats.spill_files += len(result)
+                stats.intermediate_bytes += sum(self.file_manager.file_size(f) for f in result.values())
+            return sum(counts.values())
 
-        # 将数据分块
-        chunk_size = max(1, len(data) // self.num_workers)
-        chunks = [(i, data[i:i + chunk_size]) for i in range(0, len(data), chunk_size)]
+        def merge_result(result):
+            """合并一个map任务的输出"""
+            for partition, output in result.items():
+                if self.sort_buffer_mb is not None:
+                    if self.use_disk_storage:
+                        output = self.file_manager.iter_records(output)
+                    intermediate[partition].extend(output)
+                elif self.use_disk_storage:
+                    # 磁盘模式只记录溢写文件，由Shuffle阶段按分区流式读取
+                    intermediate[partition].append(output)
+                else:
+                    intermediate[partition].extend(output)
 
-        # 并行执行map任务
-        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            results = list(executor.map(lambda x: process_chunk(x[0], x[1]), chunks))
+        # 并行执行map任务，按数据块顺序合并结果，保证输出顺序确定
+        with stats.timed_phase("map") as phase, self._open_executor(executor_type) as executor:
+            results = self._submit_tasks(executor, process_chunk, chunks, phase,
+                                         attempt_kwarg="attempt",
+                                         fence_kwarg="fence" if self.use_disk_storage else None,
+                                         count_out=count_map_output)
+            for chunk_id, result in enumerate(iter_in_order(results)):
+                if chunk_id in pending_keys:
+                    self._cache_map_output(pending_keys.pop(chunk_id), result)
+                with span("merge_map_output", "shuffle", chunk_id=chunk_id):
+                    merge_result(result)
+        stats.intermediate_pairs = sum(stats.partition_values.values())
+        if chunker is not None:
+            self.logger.info(f"动态调度: {chunker.summary()}")
+        memo = stats.mapper_memo()
+        if memo:
+            self.logger.info(f"Mapper记忆化: 命中率 {memo['hit_rate']:.1%}, 缓存 {memo['entries']} 条记录的输出, "
+                             f"{memo['bytes'] / 1024:.1f}KB, 淘汰 {memo['evictions']} 次")
 
-        # 合并结果
-        if self.use_disk_storage:
-            # 从磁盘加载并合并
-            for filename in results:
-                chunk_data = self.file_manager.load_data(filename)
-                for partition, kvs in chunk_data.items():
-                    intermediate[partition].extend(kvs)
+        if self.sort_buffer_mb is not None:
+            spill_count = sum(sorter.spill_count for sorter in intermediate.values())
+            stats.spill_files += spill_count
+            stats.intermediate_bytes += sum(sorter.bytes_spilled for sorter in intermediate.values())
+            self.logger.info(f"Map阶段完成，溢写 {spill_count} 个有序文件")
+        elif self.use_disk_storage:
+            spill_files = sum(len(v) for v in intermediate.values())
+            self.logger.info(f"Map阶段完成，生成 {spill_files} 个分区溢写文件")
         else:
-            # 内存中合并
-            for result in results:
-                for partition, kvs in result.items():
-                    intermediate[partition].extend(kvs)
-
-        map_count = sum(len(v) for v in intermediate.values())
-        self.logger.info(f"Map阶段完成，生成 {map_count} 个中间键值对")
+            map_count = sum(len(v) for v in intermediate.values())
+            self.logger.info(f"Map阶段完成，生成 {map_count} 个中间键值对")
         return intermediate
 
-    def shuffle_phase(self, intermediate: Dict[str, List]) -> Dict[Any, List]:
+    def shuffle_phase(self, intermediate: Dict[int, Any]) -> Dict[Any, List]:
         """
         Shuffle阶段：按键分组，为Reduce阶段准备数据
+
+        把所有分区合并为一个全局分组字典，供单独调用 reduce_phase 使用；
+        run() 使用按分区并行的 shuffle_reduce_phase，不经过这一步。
         """
         self.logger.info("开始Shuffle阶段...")
         grouped_data = defaultdict(list)
+        file_manager = self.file_manager if self.use_disk_storage else None
 
-        # 收集所有键值对并按key分组
-        for partition_data in intermediate.values():
-            for key, value in partition_data:
-                grouped_data[key].append(value)
+        # 按分区编号顺序收集所有键值对并按key分组
+        with self.job_stats.timed_phase("shuffle"):
+            for partition_id in sorted(intermediate):
+                partition_groups = group_partition(intermediate[partition_id], file_manager,
+                                                   self.partitioner.sorted_output)
+                items = partition_groups.items() if isinstance(partition_groups, dict) else partition_groups
+                for key, values in items:
+                    grouped_data[key].extend(values)
 
         self.logger.info(f"Shuffle阶段完成，生成 {len(grouped_data)} 个不同的key")
         return grouped_data
 
-    def reduce_phase(self, reducer: Callable, grouped_data: Dict[Any, List]) -> Dict[Any, Any]:
+    def shuffle_reduce_phase(self, reducer: Callable, intermediate: Dict[int, Any],
+                             output: Optional[OutputSink] = None) -> Union[Dict[Any, Any], OutputManifest]:
+        """
+        按分区并行的Shuffle+Reduce阶段
+
+        每个分区作为一个独立任务，在worker中完成分组和归约，不再在主线程构建
+        全局分组字典；结果按分区编号顺序合并，范围分区时输出按key全局有序。
+        指定output时每个分区任务把结果直接写入自己的分片文件，主线程只收集分片摘要。
+        """
+        self.logger.info(f"开始Shuffle+Reduce阶段，分区数: {len(intermediate)}")
+
+        file_manager = self.file_manager if self.use_disk_storage else None
+        executor_type = resolve_executor_type(self.executor_type, reducer)
+        process_partition = partial(shuffle_reduce_task, reducer, file_manager=file_manager,
+                                    sorted_output=self.partitioner.sorted_output,
+                                    batch_size=self.reduce_batch_size or DEFAULT_REDUCE_BATCH_SIZE,
+                                    output=output)
+        partition_ids = sorted(intermediate)
+
+        stats = self.job_stats
+        with stats.timed_phase("shuffle_reduce") as phase, self._open_executor(executor_type) as executor:
+            partition_results = self._submit_tasks(executor, process_partition,
+                                                   (intermediate[pid] for pid in partition_ids),
+                                                   phase, fence_kwarg="fence" if output is not None else None,
+                                                   count_out=_count_output(output))
+            results = self._collect_partitions(partition_ids, iter_in_order(partition_results), output)
+
+        # 分区任务的输入是文件列表或排序器时无法直接计数，使用map阶段统计的分区value数
+        for task in phase.tasks:
+            task.records_in = stats.partition_values.get(partition_ids[task.task_id], 0)
+
+        self.logger.info(f"Shuffle+Reduce阶段完成，生成 {len(results)} 个最终结果")
+        return results
+
+    def _collect_partitions(self, partition_ids: List[int], partition_results: Iterable[Any],
+                            output: Optional[OutputSink]) -> Union[Dict[Any, Any], OutputManifest]:
+        """按分区编号顺序合并各分区任务的结果；指定output时汇总分片摘要并写出清单"""
+        stats = self.job_stats
+        if output is None:
+            results = {}
+            for partition_id, partition_result in zip(partition_ids, partition_results):
+                stats.partition_keys[partition_id] = len(partition_result)
+                results.update(partition_result)
+            return results
+        shards = []
+        for partition_id, shard in zip(partition_ids, partition_results):
+            stats.partition_keys[partition_id] = shard["records"]
+            shards.append(shard)
+        manifest = output.commit(shards)
+        self.logger.info(f"结果已写入 {output.output_dir}: {len(shards)} 个分片, {manifest.total_bytes} 字节")
+        return manifest
+
+    def _resolve_reduce_batch_size(self, num_keys: Optional[int]) -> int:
+        """
+        计算reduce批大小
+
+        未配置时按 key数 / (4 * num_workers) 自适应，使每个worker分到若干批，
+        流式输入的key数未知，使用默认批大小。
+        """
+        if self.reduce_batch_size is not None:
+            return max(1, self.reduce_batch_size)
+        if num_keys is None:
+            return DEFAULT_REDUCE_BATCH_SIZE
+        return max(1, min(MAX_REDUCE_BATCH_SIZE, num_keys // (self.num_workers * 4)))
+
+    def reduce_phase(self, reducer: Callable,
+                     grouped_data: Union[Dict[Any, List], Iterable[Tuple[Any, List]]]) -> Dict[Any, Any]:
         """
         Reduce阶段：对每个key的所有value进行归约
+
+        key按批提交，每个任务归约一批key，避免每个key一个future的调度开销。
+        reducer可以是普通的 reducer(key, values)，也可以是 batch_reducer 标记的
+        批量reducer。失败的key记录日志后丢弃。
+
+        Args:
+            reducer: Reduce函数
+            grouped_data: {key: [values]}，或按key有序的 (key, [values]) 流；
+                流式输入按批读取，内存中只保留在途的批次
         """
         self.logger.info("开始Reduce阶段...")
         results = {}
 
-        def process_group(key_values):
-            """处理一个key的所有values"""
-            key, values = key_values
-            try:
-                result = reducer(key, values)
-                return key, result
-            except Exception as e:
-                self.logger.error(f"Reduce处理错误 key={key}: {e}")
-                return key, None
-
-        # 并行执行reduce任务
-        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            reduce_results = list(executor.map(process_group, grouped_data.items()))
+        executor_type = resolve_executor_type(self.executor_type, reducer)
+        process_batch = partial(reduce_batch_task, reducer)
+        if isinstance(grouped_data, dict):
+            batch_size = self._resolve_reduce_batch_size(len(grouped_data))
+            batches = iter_chunks(grouped_data.items(), batch_size)
+        else:
+            batch_size = self._resolve_reduce_batch_size(None)
+            batches = iter_chunks(grouped_data, batch_size)
 
-        # 收集结果
-        for key, result in reduce_results:
-            if result is not None:
-                results[key] = result
+        # 并行执行reduce任务，按批次顺序收集结果
+        with self.job_stats.timed_phase("reduce") as phase, self._open_executor(executor_type) as executor:
+            batch_results = self._submit_tasks(executor, process_batch, batches, phase, count_out=len)
+            for batch_result in iter_in_order(batch_results):
+                results.update(batch_result)
 
         self.logger.info(f"Reduce阶段完成，生成 {len(results)} 个最终结果")
         return results
 
-    def run(self, data: List[Any], mapper: Callable, reducer: Callable) -> Dict[Any, Any]:
+    def vectorized_phase(self, mapper: Callable, data: Iterable[Any], reducer,
+                         output: Optional[OutputSink] = None) -> Union[Dict[Any, Any], OutputManifest]:
+        """
+        批量（向量化）执行：mapper每次处理一个数据块并返回key/value数组
+
+        map端在数组上预聚合和分区，每个分区的部分结果在一个任务中合并，见 core.vectorized。
+
+        Args:
+            mapper: batch_mapper 标记的批量mapper
+            data: 输入数据
+            reducer: 内置向量化reducer名称（"sum"/"count"/"mean"/"min"/"max"）或普通reducer
+            output: 可选的 OutputSink，见 shuffle_reduce_phase
+        """
+        require_numpy()
+        reducer_name = resolve_vectorized_reducer(reducer)
+        self.logger.info(f"开始向量化Map阶段，reducer: {reducer_name or '自定义'}")
+        stats = self.job_stats
+        executor_type = resolve_executor_type(self.executor_type, mapper, reducer, self.partitioner)
+        chunks, chunker = self._map_chunks(data, stats.phase("map"))
+        process_chunk = partial(vectorized_map_task, mapper, reducer_name, self.partitioner)
+        partitions = defaultdict(list)
+
+        with self._open_executor(executor_type) as executor:
+            with stats.timed_phase("map") as phase:
+                map_results = self._submit_tasks(
+                    executor, process_chunk, chunks, phase,
+                    count_out=lambda result: sum(len(keys) for keys, _ in result.values()))
+                for result in iter_in_order(map_results):
+                    for partition_id, part in result.items():
+                        partitions[partition_id].append(part)
+                        stats.partition_values[partition_id] = \
+                            stats.partition_values.get(partition_id, 0) + len(part[0])
+            stats.intermediate_pairs = sum(stats.partition_values.values())
+            if chunker is not None:
+                self.logger.info(f"动态调度: {chunker.summary()}")
+            self.logger.info(f"向量化Map阶段完成，生成 {stats.intermediate_pairs} 条部分结果")
+
+            partition_ids = sorted(partitions)
+            process_partition = partial(vectorized_reduce_task, reducer, reducer_name, output=output)
+            with stats.timed_phase("shuffle_reduce") as phase:
+                partition_results = self._submit_tasks(executor, process_partition,
+                                                       (partitions.pop(pid) for pid in partition_ids),
+                                                       phase, fence_kwarg="fence" if output is not None else None,
+                                                       count_out=_count_output(output))
+                results = self._collect_partitions(partition_ids, iter_in_order(partition_results), output)
+
+        self.logger.info(f"向量化Reduce阶段完成，生成 {len(results)} 个最终结果")
+        return results
+
+    def run(self, data: Iterable[Any], mapper: Callable, reducer: Callable,
+            combiner=None, return_stats: bool = False,
+            output: Union[None, str, OutputSink] = None) -> Union[Dict[Any, Any], OutputManifest, Tuple[Any, JobStats]]:
         """
         执行完整的MapReduce作业
+
+        Args:
+            data: 输入数据，list或任意可迭代对象（迭代器、生成器），或 FileInput
+                （每个map任务读取文件的一个字节范围，见 storage.input_format）
+            mapper: Map函数；batch_mapper 标记的批量mapper走向量化路径，见 vectorized_phase；
+                async def 函数（或异步生成器）在事件循环上并发执行，见 core.async_runner
+            reducer: Reduce函数，也可以是 async def 函数；批量mapper时也可以是内置向量化reducer名称
+            combiner: 可选的map端预聚合器，可以是内置名称("sum"/"count"/"mean")、
+                Combiner实例或 func(key, values) -> value 函数
+            return_stats: 为True时返回 (results, JobStats)；统计也可以从 self.job_stats 读取
+            output: 输出目录或 OutputSink（见 storage.output_sink）；指定后每个Reduce任务把结果
+                流式写入自己的分片文件，不在内存中合并，适合结果很大的作业
+
+        Returns:
+            {key: 归约结果}；指定output时返回 OutputManifest（可迭代读取全部结果）
         """
-        self.logger.info(f"开始MapReduce作业，数据量: {len(data)}, Workers: {self.num_workers}")
+        self.job_stats = JobStats(trace=self.trace)
+        output = resolve_output_sink(output)
+        if output is not None:
+            output.prepare()
+        mapper = wrap_async(mapper, self.async_concurrency)
+        reducer = wrap_async(reducer, self.async_concurrency)
+        if self.memoize_mapper:
+            if is_batch_mapper(mapper) or is_async_function(mapper):
+                self.logger.warning("批量mapper和async mapper不支持记忆化，按普通方式执行")
+            else:
+                mapper = wrap_memoized(mapper, self.memo_max_mb)
+        self.logger.info(f"开始MapReduce作业，数据量: {describe_input(data)}, Workers: {self.num_workers}")
         start_time = time.time()
 
-        # 1. Map阶段
-        intermediate = self.map_phase(mapper, data)
+        with self.job_stats.tracing():
+            if self._sample_partitioner or self.partitioner.requires_sample:
+                data = self._fit_partitioner(mapper, data)
 
-        # 2. Shuffle阶段
-        grouped_data = self.shuffle_phase(intermediate)
+            try:
+                if is_batch_mapper(mapper):
+                    # 批量mapper: map/shuffle/reduce都在数组上完成
+                    results = self.vectorized_phase(mapper, data, reducer, output)
+                else:
+                    # 1. Map阶段
+                    intermediate = self.map_phase(mapper, data, combiner)
 
-        # 3. Reduce阶段
-        results = self.reduce_phase(reducer, grouped_data)
+                    # 2. Shuffle + 3. Reduce阶段（按分区并行）
+                    result_key = None
+                    results = MISS
+                    # 分片输出写入磁盘，不缓存最终结果
+                    if self.cache is not None and output is None:
+                        result_key = combine_keys(*self._chunk_keys, function_fingerprint(reducer))
+                        results = self.cache.get(result_key)
+                    if results is not MISS:
+                        self.logger.info("输入和函数均未变化，复用缓存的最终结果")
+                    else:
+                        results = self.shuffle_reduce_phase(reducer, intermediate, output)
+                        if result_key is not None:
+                            self.cache.put(result_key, results)
+            finally:
+                # 作业结束后删除本作业的溢写文件
+                if hasattr(self, 'file_manager'):
+                    self._finish_job()
+                if self.cache is not None:
+                    self.cache.flush()
+                    self.logger.info(f"缓存统计: {self.cache.stats()}")
+                if is_memoized_mapper(mapper):
+                    # 释放驱动进程（线程池）中的缓存；进程池的子进程随执行器一起退出
+                    mapper.release()
 
         end_time = time.time()
+        self.job_stats.total_seconds = end_time - start_time
         self.logger.info(f"MapReduce作业完成，耗时: {end_time - start_time:.2f}秒")
 
-        return results
\ No newline at end of file
+        if return_stats:
+            return results, self.job_stats
+        return results
+
+    def run_incremental(self, data: Iterable[Any], mapper: Callable, reducer: Callable,
+                        merge: Callable[[Any, Any], Any], state_path: str,
+                        removed: Optional[Iterable[Any]] = None,
+                        retract: Optional[Callable[[Any, Any], Any]] = None,
+                        combiner=None) -> Dict[Any, Any]:
+        """
+        增量执行：只对新增（和删除）的记录运行MapReduce，再合并进持久化的状态
+
+        适用于可结合的reducer（如词频统计）。状态保存在state_path的sqlite文件中，
+        每次只读取和写回本次涉及的key，耗时与增量大小成正比，而不是与全部数据成正比。
+        key须为 None/bool/int/float/str/bytes 或由它们组成的 tuple/frozenset（见 storage.state_store）。
+
+        Args:
+            data: 新增的输入记录
+            mapper: Map函数
+            reducer: Reduce函数
+            merge: merge(旧状态, 增量归约结果) -> 新状态
+            state_path: 状态文件路径，第一次运行时创建
+            removed: 被删除的输入记录，用同一个mapper/reducer归约后从状态中撤回
+            retract: retract(旧状态, 删除记录的归约结果) -> 新状态，返回None表示删除该key
+            combiner: 可选的map端预聚合器
+
+        Returns:
+            本次发生变化的key的新状态，被删除的key不在其中；完整状态见 load_state
+        """
+        if removed is not None and retract is None:
+            raise ValueError("提供removed时必须同时提供retract函数")
+
+        added = self.run(data, mapper, reducer, combiner)
+        retracted = self.run(removed, mapper, reducer, combiner) if removed is not None else {}
+
+        with StateStore(state_path) as store:
+            current = store.get_many(chain(added, retracted))
+            updates = {}
+            for key, value in added.items():
+                updates[key] = merge(current[key], value) if key in current else value
+            deletions = []
+            for key, value in retracted.items():
+                if key in updates:
+                    old = updates[key]
+                elif key in current:
+                    old = current[key]
+                else:
+                    self.logger.warning(f"撤回的key不在状态中，已忽略: {key}")
+                    continue
+                new_value = retract(old, value)
+                if new_value is None:
+                    updates.pop(key, None)
+                    deletions.append(key)
+                else:
+                    updates[key] = new_value
+            store.apply(updates, deletions)
+            total = len(store)
+
+        self.logger.info(f"增量合并完成: 更新 {len(updates)} 个key, 删除 {len(deletions)} 个key, "
+                         f"状态共 {total} 个key")
+        return updates
+
+    @staticmethod
+    def load_state(state_path: str) -> Dict[Any, Any]:
+        """读取增量作业的完整状态"""
+        with StateStore(state_path) as store:
+            return store.to_dict()
@@ -0,0 +1,276 @@
+"""
+Mapper输出记忆化
+
+真实输入中常有大量重复记录（重复的日志行、模板化的文档），每条重复记录都会被mapper
+从头处理一遍。memoize_mapper=True 时mapper被包装为 MemoizedMapper：
+    - 以记录本身及其类型（较长的字符串/字节串用其128位blake2b摘要）作为key，把mapper
+      产生的键值对缓存在有界的LRU中，超过内存上限时淘汰最久未使用的记录；
+      1、1.0、True 这样相等但类型不同的记录（包括元组中的元素）各自缓存；
+    - 每个进程一个LRU，同一进程内的所有map任务共用（线程池下跨任务命中，
+      进程池下每个子进程各自缓存）；
+    - 与支持权重的Combiner（sum/count/mean）一起使用时，数据块内的重复记录先合并计数，
+      每个不同记录的输出只产生一次并带上出现次数，由Combiner按次数加权聚合；
+      其余情况下按原顺序逐条输出缓存的键值对；
+    - mapper中途抛出异常的记录与不记忆化时一样保留出错前产生的键值对，但不缓存，
+      之后的重复记录会重新调用mapper。
+
+mapper是确定性的纯函数时，作业结果与不记忆化时相同；加权聚合浮点数value时求和顺序不同，
+结果可能有舍入误差。
+
+命中、未命中、淘汰次数以及LRU占用的字节数和条目数记录为框架计数器，
+汇总见 JobStats.mapper_memo()。
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from utils.logger import get_logger
+from core.shuffle import estimate_pair_size
+from core.stats import increment_counter, FRAMEWORK_GROUP
+from storage.job_cache import function_fingerprint
+
+
+# 默认每个进程的LRU内存上限（MB）
+DEFAULT_MEMO_MAX_MB = 64
+# 超过该长度的字符串/字节串以摘要作为key，LRU不持有原记录
+DIGEST_MIN_LENGTH = 256
+# LRU中每个条目的固定开销估计（OrderedDict节点、条目元组）
+ENTRY_OVERHEAD_BYTES = 160
+
+logger = get_logger("mapreduce_framework")
+
+
+def _typed(value: Any) -> Hashable:
+    """把值与其类型绑定，元组和frozenset逐个元素绑定"""
+    if isinstance(value, tuple):
+        return type(value), tuple(_typed(item) for item in value)
+    if isinstance(value, frozenset):
+        return type(value), frozenset(_typed(item) for item in value)
+    return type(value), value
+
+
+def memo_key(record: Any) -> Optional[Hashable]:
+    """
+    记录在LRU中的key
+
+    相等但类型不同的记录（如 1、1.0、True，或 (1, "a") 与 (1.0, "a")）得到不同的key，
+    因为mapper可能对它们产生不同的输出。
+
+    Returns:
+        较长的字符串/字节串返回 (类型, 摘要)，其余可哈希的记录返回与类型绑定的记录，
+        不可哈希时返回None（不缓存）
+    """
+    if isinstance(record, (str, bytes)) and len(record) >= DIGEST_MIN_LENGTH:
+        data = record.encode("utf-8", "surrogatepass") if isinstance(record, str) else record
+        return type(record), hashlib.blake2b(data, digest_size=16).digest()
+    key = _typed(record)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class MapperMemo:
+    """一个进程内的mapper输出LRU"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[Tuple[Any, Any], ...], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Tuple[Tuple[Any, Any], ...]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, pairs: Tuple[Tuple[Any, Any], ...]) -> Tuple[int, int, int]:
+        """
+        缓存一条记录的输出，必要时淘汰最久未使用的记录；超过内存上限的单条输出不缓存
+
+        Returns:
+            (占用字节数的变化, 条目数的变化, 淘汰的条目数)
+        """
+        size = ENTRY_OVERHEAD_BYTES + sys.getsizeof(key) + sys.getsizeof(pairs) + \
+            sum(estimate_pair_size(k, v) for k, v in pairs)
+        if size > self.max_bytes:
+            return 0, 0, 0
+        with self._lock:
+            if key in self._entries:
+                # 其他线程已缓存了同一条记录
+                return 0, 0, 0
+            before = self.bytes
+            self._entries[key] = (pairs, size)
+            self.bytes += size
+            evicted = 0
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                evicted += 1
+            return self.bytes - before, 1 - evicted, evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+_memos: Dict[str, MapperMemo] = {}
+_memos_lock = threading.Lock()
+
+
+def get_memo(memo_id: str, max_bytes: int) -> MapperMemo:
+    """
+    获取本进程中指定mapper的LRU，不存在时创建
+
+    fork出的子进程会继承父进程的LRU和其中的锁，按进程号判断后重新创建。
+    """
+    with _memos_lock:
+        memo = _memos.get(memo_id)
+        if memo is None or memo.pid != os.getpid():
+            memo = _memos[memo_id] = MapperMemo(max_bytes)
+        return memo
+
+
+def release_memo(memo_id: str):
+    """释放本进程中指定mapper的LRU"""
+    with _memos_lock:
+        _memos.pop(memo_id, None)
+
+
+class MemoizedMapper:
+    """
+    带输出缓存的mapper
+
+    只保存原mapper、内存上限和由mapper指纹得到的LRU编号，原mapper可以pickle时包装对象
+    也可以pickle；编号是确定的，不影响 storage.job_cache 对mapper计算的指纹。
+    """
+
+    def __init__(self, mapper: Callable, max_mb: float = DEFAULT_MEMO_MAX_MB):
+        self.mapper = mapper
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.memo_id = function_fingerprint(mapper)
+        self.__qualname__ = getattr(mapper, "__qualname__", type(mapper).__qualname__)
+
+    def __call__(self, record: Any) -> Iterable[Tuple[Any, Any]]:
+        # 任务之外的直接调用（如范围分区采样）不经过缓存，LRU的占用统计只来自map任务
+        return self.mapper(record)
+
+    def release(self):
+        """释放当前进程中的LRU（作业结束后在驱动端调用）"""
+        release_memo(self.memo_id)
+
+    def _run(self, record: Any) -> Tuple[Tuple[Tuple[Any, Any], ...], Optional[Exception]]:
+        """
+        调用mapper
+
+        Returns:
+            (键值对元组, 异常)；mapper中途出错时键值对为出错前已产生的部分
+        """
+        pairs = []
+        try:
+            for pair in self.mapper(record):
+                pairs.append(pair)
+        except Exception as e:
+            return tuple(pairs), e
+        return tuple(pairs), None
+
+    def _lookup(self, memo: MapperMemo, record: Any,
+                counters: Dict[str, int]) -> Tuple[Tuple[Tuple[Any, Any], ...], Optional[Exception]]:
+        """查询或计算一条记录的输出，返回 (键值对元组, mapper的异常)；出错或不可缓存的记录不缓存"""
+        key = memo_key(record)
+        pairs = memo.get(key) if key is not None else None
+        if pairs is not None:
+            counters["hits"] = counters.get("hits", 0) + 1
+            return pairs, None
+        counters["misses"] = counters.get("misses", 0) + 1
+        pairs, error = self._run(record)
+        if key is None or error is not None:
+            return pairs, error
+        grown, added, evicted = memo.put(key, pairs)
+        counters["bytes"] = counters.get("bytes", 0) + grown
+        counters["entries"] = counters.get("entries", 0) + added
+        counters["evictions"] = counters.get("evictions", 0) + evicted
+        return pairs, None
+
+    def iter_outputs(self, chunk: Iterable[Any],
+                     weighted: bool = False) -> Iterator[Tuple[Tuple[Tuple[Any, Any], ...], int]]:
+        """
+        逐条产生数据块中记录的输出
+
+        Args:
+            chunk: 数据块
+            weighted: 为True时先合并重复记录，每个不同记录只产生一次 (输出, 出现次数)，
+                否则按原顺序逐条产生 (输出, 1)
+
+        Yields:
+            (键值对元组, 次数)；mapper出错的记录记录日志，只产生出错前的键值对
+        """
+        memo = get_memo(self.memo_id, self.max_bytes)
+        counters: Dict[str, int] = {}
+        records: Iterable[Tuple[Any, int]] = ((record, 1) for record in chunk)
+        if weighted:
+            records = _count_duplicates(chunk, counters)
+        try:
+            for record, count in records:
+                pairs, error = self._lookup(memo, record, counters)
+                if error is not None:
+                    logger.error(f"Map处理错误: {error}")
+                    increment_counter("map_errors", count, group=FRAMEWORK_GROUP)
+                    if not pairs:
+                        continue
+                yield pairs, count
+        finally:
+            # bytes/entries记录为增量，各任务之和即为各进程LRU当前的占用
+            for name, value in counters.items():
+                increment_counter(f"mapper_memo_{name}", value, group=FRAMEWORK_GROUP)
+
+
+def _count_duplicates(chunk: Iterable[Any], counters: Dict[str, int]) -> List[Tuple[Any, int]]:
+    """
+    合并数据块中的重复记录
+
+    Returns:
+        按首次出现顺序的 [(记录, 出现次数)]；不可哈希的记录各自单独出现
+    """
+    counts: Dict[Hashable, List] = {}
+    result = []
+    for record in chunk:
+        key = memo_key(record)
+        if key is None:
+            result.append([record, 1])
+            continue
+        entry = counts.get(key)
+        if entry is None:
+            entry = counts[key] = [record, 1]
+            result.append(entry)
+        else:
+            entry[1] += 1
+    duplicates = sum(count for _, count in result) - len(result)
+    if duplicates:
+        # 数据块内的重复记录不需要查询LRU，计为命中
+        counters["hits"] = counters.get("hits", 0) + duplicates
+    return [(record, count) for record, count in result]
+
+
+def is_memoized_mapper(mapper: Any) -> bool:
+    return isinstance(mapper, MemoizedMapper)
+
+
+def wrap_memoized(mapper: Any, max_mb: float = DEFAULT_MEMO_MAX_MB) -> Any:
+    """普通mapper包装为MemoizedMapper，已包装的mapper原样返回"""
+    if mapper is None or is_memoized_mapper(mapper):
+        return mapper
+    return MemoizedMapper(mapper, max_mb)
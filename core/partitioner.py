@@ -1,14 +1,64 @@
-import hashlib
-from typing import Any
+import bisect
+import zlib
+from typing import Any, Callable, Iterable, List, Optional, Union
+
+from core.shuffle import key_order
+
+
+# splitmix64 终混函数的常数
+MASK64 = 0xFFFFFFFFFFFFFFFF
+SPLITMIX_GAMMA = 0x9E3779B97F4A7C15
+SPLITMIX_MUL1 = 0xBF58476D1CE4E5B9
+SPLITMIX_MUL2 = 0x94D049BB133111EB
+
+
+def int_hash(key: int) -> int:
+    """
+    整数的32位哈希：取低64位（负数按补码）做splitmix64终混，返回高32位
+
+    只做乘法散列时低位只取决于key的低位，步长为2的幂的key（0, 4, 8, ...）
+    对2的幂个分区取模会全部落入同一分区；终混后每一位都取决于key的所有位。
+    core.vectorized 在数组上实现了相同的计算。
+    """
+    z = ((key & MASK64) + SPLITMIX_GAMMA) & MASK64
+    z = ((z ^ (z >> 30)) * SPLITMIX_MUL1) & MASK64
+    z = ((z ^ (z >> 27)) * SPLITMIX_MUL2) & MASK64
+    return (z ^ (z >> 31)) >> 32
+
+
+def stable_hash(key: Any) -> int:
+    """
+    稳定的非加密哈希
+
+    与内置hash()不同，结果不受PYTHONHASHSEED影响，在不同进程中保持一致。
+    字符串/字节使用C实现的crc32，整数（以及值为整数的浮点数，与相等的整数key落在同一分区）
+    使用 int_hash，其余类型对str(key)做crc32。
+    """
+    if isinstance(key, str):
+        return zlib.crc32(key.encode())
+    if isinstance(key, int):
+        return int_hash(key)
+    if isinstance(key, bytes):
+        return zlib.crc32(key)
+    if isinstance(key, float) and key.is_integer():
+        return int_hash(int(key))
+    return zlib.crc32(str(key).encode())
 
 
 class Partitioner:
-    """数据分区器"""
+    """数据分区器（哈希分区）"""
+
+    # 分区号是否与key的顺序一致（为True时按分区号拼接各分区的有序输出即为全局有序）
+    sorted_output = False
+    # 是否需要先用样本key拟合后才能使用
+    requires_sample = False
+    # 同一个key是否总是分到同一个分区（为True时每个不同的key只需计算一次分区）
+    per_key = True
 
     def __init__(self, num_partitions: int):
         self.num_partitions = num_partitions
 
-    def get_partition(self, key: Any) -> str:
+    def get_partition(self, key: Any) -> int:
         """
         根据key获取分区
 
@@ -16,13 +66,116 @@ class Partitioner:
             key: 键值
 
         Returns:
-            分区标识符
+            分区编号，范围 [0, num_partitions)
         """
-        key_str = str(key)
-        partition_id = int(hashlib.md5(key_str.encode()).hexdigest()[:8], 16) % self.num_partitions
-        return f"part_{partition_id}"
+        if isinstance(key, str):
+            return zlib.crc32(key.encode()) % self.num_partitions
+        return stable_hash(key) % self.num_partitions
+
+    def get_partitions(self, keys: Iterable[Any]) -> List[int]:
+        """
+        批量获取分区编号
+
+        Args:
+            keys: key序列
+
+        Returns:
+            与keys一一对应的分区编号列表
+        """
+        n = self.num_partitions
+        crc32 = zlib.crc32
+        return [crc32(key.encode()) % n if key.__class__ is str else stable_hash(key) % n
+                for key in keys]
 
     def get_reducer_for_key(self, key: Any) -> int:
         """获取处理指定key的reducer ID"""
-        key_str = str(key)
-        return int(hashlib.md5(key_str.encode()).hexdigest()[:8], 16) % self.num_partitions
\ No newline at end of file
+        return self.get_partition(key)
+
+
+class FunctionPartitioner(Partitioner):
+    """用户自定义分区函数 func(key, num_partitions) -> int"""
+
+    def __init__(self, func: Callable[[Any, int], int], num_partitions: int):
+        super().__init__(num_partitions)
+        self.func = func
+
+    def get_partition(self, key: Any) -> int:
+        return self.func(key, self.num_partitions) % self.num_partitions
+
+    def get_partitions(self, keys: Iterable[Any]) -> List[int]:
+        func, n = self.func, self.num_partitions
+        return [func(key, n) % n for key in keys]
+
+
+class RangePartitioner(Partitioner):
+    """
+    基于采样的范围分区
+
+    用样本key计算 num_partitions - 1 个分界点，key按顺序落入各分区，
+    因此各分区内有序的输出按分区号拼接后即为全局有序。
+    """
+
+    sorted_output = True
+
+    def __init__(self, num_partitions: int, boundaries: Optional[List[Any]] = None):
+        super().__init__(num_partitions)
+        self.boundaries = [key_order(b) for b in boundaries] if boundaries is not None else None
+
+    @property
+    def requires_sample(self) -> bool:
+        return self.boundaries is None
+
+    def fit(self, sample_keys: Iterable[Any]) -> "RangePartitioner":
+        """
+        根据样本key计算分界点
+
+        Args:
+            sample_keys: 样本key
+
+        Returns:
+            self
+        """
+        ordered = sorted(key_order(key) for key in sample_keys)
+        boundaries = []
+        if ordered:
+            for i in range(1, self.num_partitions):
+                boundaries.append(ordered[i * len(ordered) // self.num_partitions])
+        self.boundaries = boundaries
+        return self
+
+    @classmethod
+    def from_sample(cls, sample_keys: Iterable[Any], num_partitions: int) -> "RangePartitioner":
+        """由样本key直接创建范围分区器"""
+        return cls(num_partitions).fit(sample_keys)
+
+    def get_partition(self, key: Any) -> int:
+        if self.boundaries is None:
+            raise RuntimeError("RangePartitioner尚未拟合，请先调用fit()")
+        return bisect.bisect_right(self.boundaries, key_order(key))
+
+    def get_partitions(self, keys: Iterable[Any]) -> List[int]:
+        return [self.get_partition(key) for key in keys]
+
+
+def create_partitioner(partitioner: Union[None, str, Partitioner, Callable],
+                       num_partitions: int) -> Partitioner:
+    """
+    根据配置创建分区器
+
+    Args:
+        partitioner: None/"hash"（哈希分区）、"range"（采样范围分区，输出全局有序）、
+            Partitioner实例或 func(key, num_partitions) -> int 函数
+        num_partitions: 分区数
+
+    Returns:
+        分区器实例
+    """
+    if partitioner is None or partitioner == "hash":
+        return Partitioner(num_partitions)
+    if partitioner == "range":
+        return RangePartitioner(num_partitions)
+    if isinstance(partitioner, Partitioner):
+        return partitioner
+    if callable(partitioner):
+        return FunctionPartitioner(partitioner, num_partitions)
+    raise ValueError(f"不支持的分区器: {partitioner}")
@@ -0,0 +1,271 @@
+"""
+多阶段作业流水线
+
+把多个MapReduce作业串联为一个计划执行，例如 词频统计 → Top-K：
+    - 上一阶段的reduce输出以 (key, value) 记录流的形式直接作为下一阶段的map输入，
+      不需要调用方把结果字典重新整理成列表；
+    - 连续的map-only阶段（map/flat_map/filter）融合为一个函数，在一次遍历中完成，
+      并且融合进紧随其后的MapReduce阶段的mapper；记录逐条流过各个转换，不产生中间集合；
+    - map-only阶段必须是同步函数；MapReduce阶段的async mapper融合后仍按数据块批量
+      并发执行（见 AsyncFusedMapper）；
+    - 只有reduce阶段需要物化结果（按key分组本身要求），其余阶段都是惰性的。
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from core.mapreduce import MapReduce
+from core.async_runner import AsyncFunction, is_async_callable, wrap_async
+from core.stats import JobStats
+from utils.logger import get_logger
+
+
+class _Map:
+    """一对一转换"""
+
+    def __init__(self, func: Callable[[Any], Any]):
+        self.func = func
+
+    def __call__(self, record: Any) -> Iterable[Any]:
+        return (self.func(record),)
+
+
+class _Filter:
+    """按条件保留记录"""
+
+    def __init__(self, predicate: Callable[[Any], bool]):
+        self.predicate = predicate
+
+    def __call__(self, record: Any) -> Iterable[Any]:
+        return (record,) if self.predicate(record) else ()
+
+
+class FusedMapper:
+    """
+    融合后的map函数：依次执行一串 record -> 可迭代记录 的转换，最后可选地接一个mapper
+
+    定义为模块级类，组成它的函数可以pickle时它也可以pickle，因此可用于进程池执行器。
+    """
+
+    def __init__(self, transforms: List[Callable[[Any], Iterable[Any]]], mapper: Optional[Callable] = None):
+        self.transforms = transforms
+        self.mapper = mapper
+
+    def _apply(self, record: Any, index: int) -> Iterator[Any]:
+        if index == len(self.transforms):
+            if self.mapper is None:
+                yield record
+            else:
+                yield from self.mapper(record)
+            return
+        for output in self.transforms[index](record):
+            yield from self._apply(output, index + 1)
+
+    def __call__(self, record: Any) -> Iterator[Any]:
+        return self._apply(record, 0)
+
+
+class AsyncFusedMapper(AsyncFunction):
+    """
+    以async mapper结尾的融合mapper
+
+    map-only转换逐条同步执行，数据块中所有记录转换后的输出一次性并发提交给async mapper，
+    而不是每条记录单独等待一次事件循环；map任务按 AsyncFunction 的方式批量调用它。
+    """
+
+    def __init__(self, transforms: List[Callable[[Any], Iterable[Any]]], mapper: AsyncFunction):
+        super().__init__(mapper.func, mapper.concurrency)
+        self.transforms = FusedMapper(transforms)
+
+    def call_many(self, args_list: List[Sequence[Any]]) -> List[Tuple[Optional[Exception], Any]]:
+        """并发调用，返回与args_list一一对应的 (异常或None, 该记录全部转换输出的键值对列表)"""
+        errors: List[Optional[Exception]] = [None] * len(args_list)
+        owners = []
+        converted = []
+        for index, (record,) in enumerate(args_list):
+            try:
+                for output in self.transforms(record):
+                    owners.append(index)
+                    converted.append((output,))
+            except Exception as e:
+                errors[index] = e
+        outputs: List[List[Any]] = [[] for _ in args_list]
+        for owner, (error, output) in zip(owners, super().call_many(converted)):
+            if error is not None:
+                errors[owner] = errors[owner] or error
+            elif errors[owner] is None:
+                outputs[owner].extend(output)
+        return [(error, None if error is not None else output) for error, output in zip(errors, outputs)]
+
+
+class _Stage:
+    """用户声明的一个阶段"""
+
+    def __init__(self, name: str, transform: Optional[Callable] = None, mapper: Optional[Callable] = None,
+                 reducer: Optional[Callable] = None, combiner=None):
+        self.name = name
+        self.transform = transform
+        self.mapper = mapper
+        self.reducer = reducer
+        self.combiner = combiner
+
+    @property
+    def is_map_only(self) -> bool:
+        return self.reducer is None
+
+
+class PlannedStage:
+    """融合后实际执行的一个阶段"""
+
+    def __init__(self, names: List[str], mapper: Callable, reducer: Optional[Callable] = None, combiner=None):
+        self.names = names
+        self.mapper = mapper
+        self.reducer = reducer
+        self.combiner = combiner
+
+    @property
+    def is_map_only(self) -> bool:
+        return self.reducer is None
+
+    def describe(self) -> str:
+        kind = "map-only" if self.is_map_only else "mapreduce"
+        return f"{kind}[{' -> '.join(self.names)}]"
+
+
+class Pipeline:
+    """多阶段MapReduce流水线"""
+
+    def __init__(self, engine: Optional[MapReduce] = None, **engine_kwargs):
+        """
+        Args:
+            engine: 执行MapReduce阶段的引擎，各阶段共用
+            engine_kwargs: 未提供engine时用这些参数创建 MapReduce
+        """
+        self.engine = engine or MapReduce(**engine_kwargs)
+        self.logger = get_logger("mapreduce_framework")
+        self._stages: List[_Stage] = []
+        # 最近一次运行中每个MapReduce阶段的统计
+        self.stage_stats: List[JobStats] = []
+
+    def map(self, func: Callable[[Any], Any], name: Optional[str] = None) -> "Pipeline":
+        """添加一对一转换阶段"""
+        _require_sync(func)
+        self._stages.append(_Stage(name or f"map:{_name_of(func)}", transform=_Map(func)))
+        return self
+
+    def flat_map(self, func: Callable[[Any], Iterable[Any]], name: Optional[str] = None) -> "Pipeline":
+        """添加一对多转换阶段，func返回可迭代的输出记录"""
+        _require_sync(func)
+        self._stages.append(_Stage(name or f"flat_map:{_name_of(func)}", transform=func))
+        return self
+
+    def filter(self, predicate: Callable[[Any], bool], name: Optional[str] = None) -> "Pipeline":
+        """添加过滤阶段"""
+        _require_sync(predicate)
+        self._stages.append(_Stage(name or f"filter:{_name_of(predicate)}", transform=_Filter(predicate)))
+        return self
+
+    def map_reduce(self, mapper: Callable, reducer: Callable, combiner=None,
+                   name: Optional[str] = None) -> "Pipeline":
+        """
+        添加MapReduce阶段
+
+        第一阶段的mapper接收原始输入记录，之后阶段的mapper接收上一个reduce阶段输出的
+        (key, value) 记录。
+        """
+        self._stages.append(_Stage(name or f"mapreduce:{_name_of(mapper)}/{_name_of(reducer)}",
+                                   mapper=mapper, reducer=reducer, combiner=combiner))
+        return self
+
+    def plan(self) -> List[PlannedStage]:
+        """把连续的map-only阶段融合进下一个MapReduce阶段的mapper，返回实际执行的阶段"""
+        planned = []
+        pending: List[_Stage] = []
+        for stage in self._stages:
+            if stage.is_map_only:
+                pending.append(stage)
+                continue
+            names = [s.name for s in pending] + [stage.name]
+            mapper = stage.mapper
+            if pending:
+                transforms = [s.transform for s in pending]
+                mapper = wrap_async(mapper, self.engine.async_concurrency)
+                if isinstance(mapper, AsyncFunction):
+                    # async mapper融合后仍按数据块批量并发执行
+                    mapper = AsyncFusedMapper(transforms, mapper)
+                else:
+                    mapper = FusedMapper(transforms, mapper)
+            planned.append(PlannedStage(names, mapper, stage.reducer, stage.combiner))
+            pending = []
+        if pending:
+            planned.append(PlannedStage([s.name for s in pending], FusedMapper([s.transform for s in pending])))
+        return planned
+
+    def explain(self) -> str:
+        """执行计划的文字描述"""
+        return "\n".join(f"{i + 1}. {stage.describe()}" for i, stage in enumerate(self.plan()))
+
+    def _execute(self, data: Iterable[Any]) -> Tuple[Iterable[Any], Optional[Dict[Any, Any]]]:
+        """
+        按计划执行各阶段
+
+        Returns:
+            (最后阶段的输出记录流, 最后阶段是MapReduce时的结果字典，否则为None)
+        """
+        plan = self.plan()
+        self.logger.info(f"开始执行流水线，共 {len(plan)} 个阶段（声明 {len(self._stages)} 个）")
+        self.stage_stats = []
+        records: Iterable[Any] = data
+        results = None
+        for index, stage in enumerate(plan):
+            if stage.is_map_only:
+                # map-only只会出现在计划末尾，惰性地作用于上一阶段的输出
+                records = _iter_mapped(stage.mapper, records)
+                results = None
+                continue
+            self.logger.info(f"流水线阶段 {index + 1}/{len(plan)}: {stage.describe()}")
+            results = self.engine.run(records, stage.mapper, stage.reducer, stage.combiner)
+            self.stage_stats.append(self.engine.job_stats)
+            # reduce输出以记录流的形式交给下一阶段，不再复制为列表
+            records = _iter_items(results)
+        return records, results
+
+    def iter_run(self, data: Iterable[Any]) -> Iterator[Any]:
+        """
+        执行流水线，惰性返回最后一个阶段的输出记录
+
+        最后一个阶段是MapReduce时输出 (key, value)。
+        """
+        records, _ = self._execute(data)
+        return iter(records)
+
+    def run(self, data: Iterable[Any]) -> Union[Dict[Any, Any], List[Any]]:
+        """
+        执行流水线
+
+        Returns:
+            最后一个阶段是MapReduce时返回结果字典，否则返回输出记录列表
+        """
+        records, results = self._execute(data)
+        return results if results is not None else list(records)
+
+
+def _iter_mapped(mapper: Callable, records: Iterable[Any]) -> Iterator[Any]:
+    """惰性地对记录流执行map-only阶段；mapper作为参数绑定，不随循环变量变化"""
+    for record in records:
+        yield from mapper(record)
+
+
+def _iter_items(results: Dict[Any, Any]) -> Iterator[Any]:
+    """逐条产出结果字典中的 (key, value)"""
+    yield from results.items()
+
+
+def _require_sync(func: Callable):
+    """map-only阶段在融合后的mapper中逐条同步调用，不能是async函数"""
+    if is_async_callable(func):
+        raise TypeError(f"map/flat_map/filter 阶段不支持async函数: {_name_of(func)}，"
+                        f"请在 map_reduce 阶段使用async mapper")
+
+
+def _name_of(func: Callable) -> str:
+    return getattr(func, "__name__", type(func).__name__)
@@ -0,0 +1,178 @@
+"""
+Map任务调度：静态切分与自适应动态切分
+
+静态切分（schedule="static"）把已知长度的输入切成 num_workers 个等大的数据块，
+切分结果只取决于输入，适合需要可复现任务边界的场景（如map输出缓存）。
+记录的处理代价差别很大时（10个词的文档和10MB的文档），等记录数的块耗时并不相等，
+先完成的worker只能空等最慢的那个。
+
+动态切分（schedule="dynamic"）把输入切成许多小任务，由空闲worker从执行器的共享队列中
+拉取（在途任务数受 max_inflight_chunks 限制，队列中始终只有少量待领取的任务）：
+    - 每条记录按大小估计权重（字符串/字节串按长度），大记录单独成块；
+    - 已完成任务的耗时反馈为每条记录和每单位权重的代价（指数加权平均），之后的数据块
+      按 target_task_seconds 计算记录数和权重上限，先达到任一上限即切分；
+      代价估计出来之前用较小的探测块；
+    - 已知长度的输入在接近末尾时逐步缩小块（不超过剩余记录数的 1 / (2 * num_workers)，
+      也不小于正常大小的 MIN_TAIL_FRACTION），各worker几乎同时完成。
+
+任务越小负载越均衡，但每个任务都有固定开销（提交、结果传输、中间结果按key合并），
+target_task_seconds 在两者之间折中。
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from utils.chunking import has_length, iter_input_chunks
+
+
+SCHEDULE_STATIC = "static"
+SCHEDULE_DYNAMIC = "dynamic"
+SCHEDULES = (SCHEDULE_STATIC, SCHEDULE_DYNAMIC)
+
+# 动态切分时每个任务的目标耗时（秒）
+DEFAULT_TARGET_TASK_SECONDS = 0.2
+# 代价估计出来之前，探测块的累计权重
+INITIAL_CHUNK_WEIGHT = 1 << 12
+# 输入末尾缩小数据块时，块大小不低于目标大小的这一比例，避免产生大量开销占主导的小任务
+MIN_TAIL_FRACTION = 0.25
+# 每个数据块的记录数上限，限制在途数据块的内存占用
+MAX_CHUNK_RECORDS = 100_000
+# 代价估计的指数加权平均系数
+COST_SMOOTHING = 0.3
+# 动态调度文件输入时每个worker的切分数
+SPLITS_PER_WORKER = 4
+
+
+def resolve_schedule(schedule: str) -> str:
+    if schedule not in SCHEDULES:
+        raise ValueError(f"未知的调度方式: {schedule}，可选: {SCHEDULES}")
+    return schedule
+
+
+def record_weight(record: Any) -> int:
+    """估计一条记录的处理代价：字符串/字节串按长度，元组/列表累加其中文本字段的长度"""
+    if isinstance(record, (str, bytes)):
+        return len(record) + 1
+    if isinstance(record, (tuple, list)):
+        return 1 + sum(len(field) for field in record if isinstance(field, (str, bytes)))
+    return 1
+
+
+def _smooth(estimate: Optional[float], sample: float) -> float:
+    """指数加权平均"""
+    if estimate is None:
+        return sample
+    return estimate + COST_SMOOTHING * (sample - estimate)
+
+
+class AdaptiveChunker:
+    """根据已完成任务的耗时自适应地切分输入"""
+
+    def __init__(self, num_workers: int, target_task_seconds: float = DEFAULT_TARGET_TASK_SECONDS,
+                 weigh: Callable[[Any], int] = record_weight, max_chunk_records: int = MAX_CHUNK_RECORDS):
+        """
+        Args:
+            num_workers: 并行的worker数，用于在输入末尾缩小数据块
+            target_task_seconds: 每个任务的目标耗时
+            weigh: 估计单条记录代价的函数
+            max_chunk_records: 每个数据块的记录数上限
+        """
+        self.num_workers = num_workers
+        self.target_task_seconds = target_task_seconds
+        self.weigh = weigh
+        self.max_chunk_records = max_chunk_records
+        # 每条记录、每单位权重的耗时（秒），None表示还没有任务完成
+        self.cost_per_record: Optional[float] = None
+        self.cost_per_unit: Optional[float] = None
+        # 已切出但尚未反馈耗时的数据块: 编号 -> (记录数, 权重)
+        self._pending: Dict[int, Tuple[int, int]] = {}
+        self.chunk_records: List[int] = []
+
+    def observe(self, task_id: int, seconds: float):
+        """反馈一个任务的耗时"""
+        size = self._pending.pop(task_id, None)
+        if size is None:
+            return
+        records, weight = size
+        self.cost_per_record = _smooth(self.cost_per_record, seconds / records)
+        self.cost_per_unit = _smooth(self.cost_per_unit, seconds / weight)
+
+    def next_limits(self, remaining: Optional[int] = None) -> Tuple[float, float]:
+        """
+        下一个数据块的 (记录数上限, 权重上限)，先达到任一上限即切分
+
+        固定开销为主的小记录由记录数上限约束，大记录由权重上限约束，
+        两种代价各自按最近的任务估计，记录代价分布变化时块大小偏向保守。
+
+        Args:
+            remaining: 已知长度的输入中尚未切分的记录数
+        """
+        if not self.cost_per_unit:
+            return self.max_chunk_records, INITIAL_CHUNK_WEIGHT
+        max_records = min(self.max_chunk_records, self.target_task_seconds / self.cost_per_record)
+        if remaining is not None:
+            # 输入末尾逐步缩小数据块
+            max_records = max(min(max_records, remaining / (2 * self.num_workers)), max_records * MIN_TAIL_FRACTION)
+        return max(1.0, max_records), max(1.0, self.target_task_seconds / self.cost_per_unit)
+
+    def chunks(self, data: Iterable[Any], metrics: Optional[Sequence[Any]] = None) -> Iterator[List[Any]]:
+        """
+        惰性切分输入，每次只切出下一个数据块
+
+        Args:
+            data: 输入数据
+            metrics: 可选的任务指标列表（如 PhaseStats.tasks），每切一个块前读取其中新增的
+                TaskMetrics 并反馈耗时；不提供时由调用方调用 observe
+
+        Yields:
+            数据块，编号依次为 0, 1, 2, ...
+        """
+        remaining = len(data) if has_length(data) else None
+        iterator = iter(data)
+        seen = 0
+        chunk_id = 0
+        while True:
+            if metrics is not None:
+                for task in metrics[seen:]:
+                    self.observe(task.task_id, task.seconds)
+                seen = len(metrics)
+            max_records, max_weight = self.next_limits(remaining)
+            chunk = []
+            weight = 0
+            for record in iterator:
+                chunk.append(record)
+                weight += self.weigh(record)
+                if weight >= max_weight or len(chunk) >= max_records:
+                    break
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            self._pending[chunk_id] = (len(chunk), weight)
+            self.chunk_records.append(len(chunk))
+            yield chunk
+            chunk_id += 1
+
+    def summary(self) -> str:
+        """切分情况的日志描述"""
+        if not self.chunk_records:
+            return "0 个任务"
+        return (f"{len(self.chunk_records)} 个任务, 每块 {min(self.chunk_records)}-{max(self.chunk_records)} "
+                f"条记录")
+
+
+def iter_scheduled_chunks(data: Iterable[Any], num_workers: int, schedule: str = SCHEDULE_STATIC,
+                          chunk_size: Optional[int] = None, chunker: Optional[AdaptiveChunker] = None,
+                          metrics: Optional[Sequence[Any]] = None) -> Iterator[Any]:
+    """
+    按调度方式把输入切分为任务
+
+    静态调度和显式指定chunk_size时见 utils.chunking.iter_input_chunks；动态调度时文件输入切分为
+    num_workers * SPLITS_PER_WORKER 个字节范围，其余输入由chunker按耗时反馈自适应切分。
+    """
+    if schedule == SCHEDULE_STATIC or chunk_size is not None:
+        return iter_input_chunks(data, num_workers, chunk_size)
+    if hasattr(data, "splits"):
+        return iter(data.splits(num_workers * SPLITS_PER_WORKER))
+    if chunker is None:
+        chunker = AdaptiveChunker(num_workers)
+    return chunker.chunks(data, metrics)
@@ -0,0 +1,171 @@
+"""
+基于排序的外部Shuffle
+
+类似Hadoop的 io.sort.mb：map输出先写入内存缓冲区，超过内存预算时按key排序后
+作为一个有序run溢写到磁盘，最后对所有run做k路归并，按key依次产出分组。
+没有发生溢写的小作业直接在内存中按哈希分组。
+
+排序和归并使用 key_order 给出的全序，与哈希分组对key相等的判断保持一致：
+    - 数值（bool/int/float/Fraction/Decimal）按数值排在一起，1、1.0、True 是同一个key；
+    - str、bytes、None 各自成组，元组和frozenset按元素的 key_order 递归比较，
+      因此 (1, "a") 与 ("a", 1) 这样元素类型不同的元组也能比较；
+    - 其他定义了 < 的类型（datetime、Decimal等）按类型名和值排序；
+    - 无法排序的类型（complex除外，按实部虚部排序）按类型和 hash() 排列，只保证
+      相等的key被分到同一组，顺序没有意义；这类key不适合范围分区。
+归并时按排序键分组，排序键相同的不同key（如哈希值相同的无序对象）再按相等性分开。
+"""
+
+import heapq
+import numbers
+import os
+import sys
+import uuid
+from collections import defaultdict
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from storage.file_manager import FileManager
+from core.tracing import span
+from utils.logger import get_logger
+
+
+# 元组本身及其在列表中的引用开销的粗略估计
+PAIR_OVERHEAD_BYTES = 72
+
+
+def key_order(key: Any) -> Tuple[str, Any]:
+    """
+    排序键：先按类型分组再按值，使混合类型的key也能排序
+
+    相等的key（包括 1 == 1.0 == True）总是得到相等的排序键，规则见模块说明。
+    """
+    cls = key.__class__
+    if cls is str:
+        return "str", key
+    if cls is int or cls is float or cls is bool or \
+            (isinstance(key, numbers.Number) and not isinstance(key, complex)):
+        if key != key:
+            # NaN与任何值都不相等，单独排在数值之后
+            return "number~nan", 0
+        return "number", key
+    if cls is bytes:
+        return "bytes", key
+    if key is None:
+        return "NoneType", 0
+    if isinstance(key, tuple):
+        return "tuple", tuple(key_order(item) for item in key)
+    if isinstance(key, frozenset):
+        return "frozenset", tuple(sorted(key_order(item) for item in key))
+    if isinstance(key, complex):
+        return "complex", (key.real, key.imag)
+    name = f"{cls.__module__}.{cls.__qualname__}"
+    if getattr(cls, "__lt__", object.__lt__) is not object.__lt__:
+        return name, key
+    # 无法排序的类型：相等的对象哈希值相同，归并时再按相等性分组
+    return name + "~unordered", hash(key)
+
+
+def _pair_order(pair: Tuple[Any, Any]) -> Tuple[str, Any]:
+    return key_order(pair[0])
+
+
+def estimate_pair_size(key: Any, value: Any) -> int:
+    """估算一个键值对占用的内存字节数"""
+    return PAIR_OVERHEAD_BYTES + sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class ExternalSorter:
+    """内存有界的排序-溢写-归并Shuffle"""
+
+    def __init__(self, file_manager: FileManager, memory_limit_mb: float = 100,
+                 sort_in_memory: bool = False, job_id: Optional[str] = None):
+        """
+        Args:
+            file_manager: 用于写入/读取溢写文件的文件管理器
+            memory_limit_mb: 内存缓冲区预算（MB），超过后溢写
+            sort_in_memory: 未溢写时是否也按key排序输出（需要全局有序输出时使用）
+            job_id: 溢写文件所属的作业，None时写入base_dir
+        """
+        self.file_manager = file_manager
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.logger = get_logger("mapreduce_framework")
+        self._buffer: List[Tuple[Any, Any]] = []
+        self._buffer_bytes = 0
+        self._runs: List[str] = []
+        # 已溢写的字节数
+        self.bytes_spilled = 0
+        self._prefix = f"spill_{uuid.uuid4().hex[:8]}"
+        self.sort_in_memory = sort_in_memory
+        self.job_id = job_id
+
+    @property
+    def spill_count(self) -> int:
+        return len(self._runs)
+
+    def extend(self, pairs: Iterable[Tuple[Any, Any]]):
+        """把键值对加入缓冲区，超过内存预算时溢写"""
+        for key, value in pairs:
+            self._buffer.append((key, value))
+            self._buffer_bytes += estimate_pair_size(key, value)
+            if self._buffer_bytes >= self.memory_limit:
+                self._spill()
+
+    def _spill(self):
+        """将缓冲区排序后写成一个有序run"""
+        if not self._buffer:
+            return
+        with span("sort_run", "shuffle", records=len(self._buffer)):
+            self._buffer.sort(key=_pair_order)
+        filename = f"{self._prefix}_{len(self._runs)}.run"
+        if self.job_id is not None:
+            filename = self.file_manager.job_file(self.job_id, filename)
+        self.bytes_spilled += os.path.getsize(self.file_manager.save_records(self._buffer, filename))
+        self._runs.append(filename)
+        self.logger.debug(f"溢写 {len(self._buffer)} 个键值对到 {filename}")
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def groups(self) -> Union[Dict[Any, List], Iterator[Tuple[Any, List]]]:
+        """
+        按key分组
+
+        Returns:
+            未溢写时返回内存中的 {key: [values]}；否则返回按key有序的
+            (key, [values]) 迭代器，每次只在内存中保留一个key的values
+        """
+        if not self._runs:
+            if self.sort_in_memory:
+                self._buffer.sort(key=_pair_order)
+            grouped_data = defaultdict(list)
+            for key, value in self._buffer:
+                grouped_data[key].append(value)
+            self._buffer = []
+            self._buffer_bytes = 0
+            return grouped_data
+
+        self._spill()
+        self.logger.info(f"k路归并 {len(self._runs)} 个溢写文件")
+        return self._merge_runs()
+
+    def _merge_runs(self) -> Iterator[Tuple[Any, List]]:
+        """k路归并所有有序run"""
+        streams = [self.file_manager.iter_records(filename) for filename in self._runs]
+        merged = heapq.merge(*streams, key=_pair_order)
+        for _, pairs in groupby(merged, key=_pair_order):
+            # 排序键相同的key按相等性分组，与内存中的哈希分组一致（1与1.0合并，哈希冲突的对象分开）
+            grouped: Dict[Any, List] = {}
+            for key, value in pairs:
+                values = grouped.get(key)
+                if values is None:
+                    grouped[key] = [value]
+                else:
+                    values.append(value)
+            yield from grouped.items()
+
+    def cleanup(self):
+        """删除本次Shuffle产生的溢写文件"""
+        for filename in self._runs:
+            self.file_manager.remove(filename)
+        self._runs = []
+        self._buffer = []
+        self._buffer_bytes = 0
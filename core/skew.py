@@ -0,0 +1,243 @@
+"""
+热点key检测与拆分
+
+Zipf分布的数据中少数key占据大部分value，按key分区时持有这些key的Reducer
+承担了几乎全部工作。启用拆分后：
+    1. 对map输出采样，统计占比超过阈值的热点key；
+    2. 热点key的value按轮询分散到若干个Reducer（salting），每个Reducer只归约其中一部分；
+    3. 所有Reducer完成后，用合并函数把同一个热点key的部分结果合并为最终结果。
+
+拆分要求reducer的结果可以再次合并（例如求和），因此需要每个作业显式开启。
+"""
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.partitioner import Partitioner
+
+
+# 报告中列出的最大key数量
+DEFAULT_TOP_KEYS = 10
+
+
+def detect_hot_keys(sample_keys: Iterable[Any], num_reducers: int,
+                    threshold: Optional[float] = None) -> Dict[Any, int]:
+    """
+    从采样的map输出key中找出热点key
+
+    Args:
+        sample_keys: 采样得到的key（每个键值对一个）
+        num_reducers: Reducer数量
+        threshold: 占比超过该值的key视为热点，默认 0.5 / num_reducers，
+            即单个key超过一个Reducer平均负载的一半
+
+    Returns:
+        {热点key: 拆分份数}，拆分后每份不超过一个Reducer的平均负载
+    """
+    if num_reducers < 2:
+        return {}
+    counts = Counter(sample_keys)
+    total = sum(counts.values())
+    if total == 0:
+        return {}
+    threshold = threshold if threshold is not None else 0.5 / num_reducers
+    hot_keys = {}
+    for key, count in counts.most_common():
+        share = count / total
+        if share < threshold:
+            break
+        hot_keys[key] = max(2, min(num_reducers, math.ceil(share * num_reducers)))
+    return hot_keys
+
+
+class HotKeySplitter(Partitioner):
+    """把热点key的value轮询分散到多个分区的分区器，其余key交给原分区器"""
+
+    sorted_output = False
+    requires_sample = False
+    # 热点key按键值对轮询分区
+    per_key = False
+
+    def __init__(self, partitioner: Partitioner, hot_keys: Dict[Any, int]):
+        """
+        Args:
+            partitioner: 原分区器
+            hot_keys: {热点key: 拆分份数}
+        """
+        super().__init__(partitioner.num_partitions)
+        self.partitioner = partitioner
+        self.hot_keys = hot_keys
+        self._next_salt: Dict[Any, int] = defaultdict(int)
+
+    def _salted(self, key: Any, base: int) -> int:
+        salt = self._next_salt[key]
+        self._next_salt[key] = salt + 1
+        return (base + salt % self.hot_keys[key]) % self.num_partitions
+
+    def get_partition(self, key: Any) -> int:
+        base = self.partitioner.get_partition(key)
+        return self._salted(key, base) if key in self.hot_keys else base
+
+    def get_partitions(self, keys: Iterable[Any]) -> List[int]:
+        keys = list(keys)
+        partitions = self.partitioner.get_partitions(keys)
+        hot_keys = self.hot_keys
+        return [self._salted(key, base) if key in hot_keys else base
+                for key, base in zip(keys, partitions)]
+
+    def get_reducer_for_key(self, key: Any) -> int:
+        """key未拆分时所在的reducer"""
+        return self.partitioner.get_partition(key)
+
+
+def merge_split_results(outputs: Iterable[Iterable[Tuple[Any, Any]]], split_keys: Iterable[Any],
+                        merge: Callable[[Any, List[Any]], Any]) -> Dict[Any, Any]:
+    """
+    合并各Reducer的输出，被拆分的key用merge合并部分结果
+
+    Args:
+        outputs: 每个Reducer的 [(key, result), ...] 或 {key: result}
+        split_keys: 被拆分的key
+        merge: merge(key, 部分结果列表) -> 最终结果
+
+    Returns:
+        最终结果
+    """
+    split_keys = set(split_keys)
+    results = {}
+    partials = defaultdict(list)
+    for output in outputs:
+        items = output.items() if isinstance(output, dict) else output
+        for key, value in items:
+            if key in split_keys:
+                partials[key].append(value)
+            else:
+                results[key] = value
+    for key, values in partials.items():
+        results[key] = merge(key, values) if len(values) > 1 else values[0]
+    return results
+
+
+def hold_split_keys(results: Iterable[Tuple[Any, Any]], split_keys: Iterable[Any],
+                    held: List[Tuple[Any, Any]]) -> Iterator[Tuple[Any, Any]]:
+    """
+    分片输出时使用：被拆分key的部分结果放入held留给协调者合并，其余结果原样返回
+
+    Args:
+        results: Reducer的 (key, result) 流
+        split_keys: 被拆分的key
+        held: 收集部分结果的列表
+    """
+    split_keys = set(split_keys)
+    for key, value in results:
+        if key in split_keys:
+            held.append((key, value))
+        else:
+            yield key, value
+
+
+def commit_split_output(output, shards: Iterable[Dict[str, Any]], held_outputs: Iterable[Iterable[Tuple[Any, Any]]],
+                        split_keys: Iterable[Any], merge: Callable[[Any, List[Any]], Any]):
+    """
+    结束分片输出：合并各Reducer留下的热点key部分结果，写入编号最大的一个额外分片，再写出清单
+
+    Args:
+        output: OutputSink
+        shards: 各Reducer写出的分片摘要
+        held_outputs: 各Reducer由 hold_split_keys 留下的部分结果
+        split_keys: 被拆分的key
+        merge: merge(key, 部分结果列表) -> 最终结果
+
+    Returns:
+        OutputManifest
+    """
+    shards = list(shards)
+    merged = merge_split_results(held_outputs, split_keys, merge)
+    if merged:
+        shard_id = max((shard["shard"] for shard in shards), default=-1) + 1
+        shards.append(output.write_shard(shard_id, merged.items()))
+    return output.commit(shards)
+
+
+def _imbalance(loads: List[int]) -> float:
+    """最大负载与平均负载之比，1.0表示完全均衡"""
+    total = sum(loads)
+    if not loads or total == 0:
+        return 1.0
+    return max(loads) / (total / len(loads))
+
+
+class SkewReport:
+    """数据倾斜报告"""
+
+    def __init__(self, reducer_values: List[int], top_keys: List[Tuple[Any, int]],
+                 hot_keys: Dict[Any, int], unsplit_values: Optional[List[int]] = None):
+        """
+        Args:
+            reducer_values: 每个Reducer实际收到的value数
+            top_keys: value数最多的key及其value数
+            hot_keys: 检测到并拆分的热点key及拆分份数
+            unsplit_values: 不拆分时每个Reducer会收到的value数
+        """
+        self.reducer_values = reducer_values
+        self.top_keys = top_keys
+        self.hot_keys = hot_keys
+        self.unsplit_values = unsplit_values if unsplit_values is not None else list(reducer_values)
+
+    @classmethod
+    def from_counts(cls, partitioner: Partitioner, reducer_values: Dict[int, int],
+                    key_counts: Dict[Any, int], split_counts: Dict[Any, Dict[int, int]],
+                    hot_keys: Dict[Any, int], top: int = DEFAULT_TOP_KEYS) -> "SkewReport":
+        """
+        根据统计数据生成报告
+
+        Args:
+            partitioner: 原分区器，用于计算不拆分时热点key所在的Reducer
+            reducer_values: {reducer编号: value数}
+            key_counts: {key: value数}，至少包含数量最多的key
+            split_counts: {被拆分的key: {reducer编号: value数}}
+            hot_keys: {热点key: 拆分份数}
+            top: 报告中列出的key数量
+        """
+        loads = [reducer_values.get(rid, 0) for rid in range(partitioner.num_partitions)]
+        unsplit = list(loads)
+        for key, counts in split_counts.items():
+            base = partitioner.get_partition(key)
+            for reducer_id, count in counts.items():
+                unsplit[reducer_id] -= count
+                unsplit[base] += count
+        top_keys = heapq.nlargest(top, key_counts.items(), key=itemgetter(1))
+        return cls(loads, top_keys, hot_keys, unsplit)
+
+    @property
+    def imbalance(self) -> float:
+        return _imbalance(self.reducer_values)
+
+    @property
+    def unsplit_imbalance(self) -> float:
+        return _imbalance(self.unsplit_values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = sum(self.reducer_values) or 1
+        return {
+            "reducer_values": self.reducer_values,
+            "imbalance": self.imbalance,
+            "unsplit_values": self.unsplit_values,
+            "unsplit_imbalance": self.unsplit_imbalance,
+            "top_keys": [{"key": repr(key), "values": count, "share": count / total}
+                         for key, count in self.top_keys],
+            "hot_keys": {repr(key): split for key, split in self.hot_keys.items()},
+        }
+
+    def summary(self) -> str:
+        total = sum(self.reducer_values) or 1
+        lines = [f"Reducer负载: {self.reducer_values}, 倾斜度 {self.imbalance:.2f}"]
+        if self.hot_keys:
+            lines.append(f"  拆分前负载: {self.unsplit_values}, 倾斜度 {self.unsplit_imbalance:.2f}")
+            lines.append(f"  拆分的热点key: {self.hot_keys}")
+        top = ", ".join(f"{key}={count}({count / total:.1%})" for key, count in self.top_keys)
+        lines.append(f"  最热的key: {top}")
+        return "\n".join(lines)
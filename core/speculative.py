@@ -0,0 +1,218 @@
+"""
+推测执行
+
+跟踪每个任务的运行时间，当输入已全部提交、有空闲worker，且某个任务的运行时间
+明显超过已完成任务的中位数时，为它启动一个备份副本；先完成的副本生效，
+另一个副本被取消（已开始运行的副本无法中断，其结果会被丢弃）。
+
+已开始运行的副本由 AttemptFence 隔离：副本把结果提交到共享位置（重命名溢写文件、
+替换输出分片）时持有围栏的锁，驱动端在使用胜者的结果之前取消其他副本的围栏，
+此后被放弃的副本不会再提交任何结果，作业清理临时目录之后也不会再写入。
+"""
+
+import multiprocessing
+import statistics
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from utils.logger import get_logger
+from core.executor import CompletedTask
+
+
+logger = get_logger("mapreduce_framework")
+
+# 检查慢任务的轮询间隔（秒）
+POLL_INTERVAL = 0.05
+
+
+class AttemptCancelled(Exception):
+    """副本已被放弃（同一任务的其他副本先完成），不再提交结果"""
+
+
+class AttemptFence:
+    """
+    一个任务副本的围栏
+
+    同一次推测执行中的所有围栏共享一把锁和一个已取消副本的集合；进程池下两者由
+    multiprocessing.Manager 提供，围栏可以pickle后发送到子进程。
+    """
+
+    def __init__(self, lock: Any, cancelled: Any, token: Hashable):
+        self._lock = lock
+        self._cancelled = cancelled
+        self.token = token
+
+    def cancelled(self) -> bool:
+        return self.token in self._cancelled
+
+    def check(self):
+        """已被放弃时抛出 AttemptCancelled，用于在写出结果之前提前退出"""
+        if self.cancelled():
+            raise AttemptCancelled(f"副本 {self.token} 已被放弃")
+
+    @contextmanager
+    def commit(self) -> Iterator[None]:
+        """在锁内把结果提交到共享位置；副本已被放弃时抛出 AttemptCancelled"""
+        with self._lock:
+            self.check()
+            yield
+
+    def cancel(self):
+        """放弃该副本，返回后副本不会再进入 commit()"""
+        with self._lock:
+            self._cancelled[self.token] = True
+
+
+class TaskTracker:
+    """任务进度跟踪：记录每个任务的开始时间、尝试次数和已完成任务的耗时"""
+
+    def __init__(self):
+        self.start_times: Dict[int, float] = {}
+        self.attempts: Dict[int, List[Future]] = {}
+        self.durations: List[float] = []
+        self.finished = set()
+        self.backups_launched = 0
+        self.backups_won = 0
+
+    def start(self, task_id: int, future: Future):
+        self.start_times.setdefault(task_id, time.perf_counter())
+        self.attempts.setdefault(task_id, []).append(future)
+
+    def finish(self, task_id: int, winner: Future) -> List[Future]:
+        """
+        记录任务完成并取消其他副本
+
+        Returns:
+            被放弃的其他副本
+        """
+        self.finished.add(task_id)
+        self.durations.append(time.perf_counter() - self.start_times[task_id])
+        futures = self.attempts.pop(task_id)
+        if futures.index(winner) > 0:
+            self.backups_won += 1
+        losers = [future for future in futures if future is not winner]
+        for future in losers:
+            future.cancel()
+        return losers
+
+    def running(self) -> int:
+        return sum(1 for futures in self.attempts.values() for f in futures if not f.done())
+
+    def stragglers(self, slow_factor: float, min_completed: int) -> List[int]:
+        """运行时间超过 slow_factor * 已完成任务耗时中位数、且还没有备份的任务"""
+        if len(self.durations) < min_completed:
+            return []
+        threshold = slow_factor * statistics.median(self.durations)
+        now = time.perf_counter()
+        return [task_id for task_id, futures in self.attempts.items()
+                if len(futures) == 1 and now - self.start_times[task_id] > threshold]
+
+
+def submit_speculative(executor: Executor, fn: Callable, tasks: Iterable[Any], num_workers: int,
+                       slow_factor: float = 2.0, min_completed: int = 2,
+                       attempt_kwarg: Optional[str] = None,
+                       fence_kwarg: Optional[str] = None) -> Iterator[Tuple[int, Any]]:
+    """
+    带推测执行的任务提交
+
+    在途任务数不超过num_workers，因此提交时间近似于开始运行的时间；
+    输入耗尽后出现空闲worker时，为慢任务启动备份副本。
+
+    Args:
+        executor: 执行器
+        fn: 任务函数，调用方式为 fn(task_id, task)
+        tasks: 任务迭代器，CompletedTask直接返回其结果
+        num_workers: worker数量
+        slow_factor: 慢任务判定倍数
+        min_completed: 至少完成多少个任务后才开始判定慢任务
+        attempt_kwarg: 不为None时以该关键字参数把副本编号传给fn，
+            用于让各副本写入不同的临时文件
+        fence_kwarg: 不为None时以该关键字参数把副本的 AttemptFence 传给fn，
+            任务在提交结果时使用 fence.commit()
+
+    Yields:
+        按完成顺序返回 (task_id, result)，每个任务只返回一次
+    """
+    tracker = TaskTracker()
+    task_inputs: Dict[int, Any] = {}
+    future_tasks: Dict[Future, int] = {}
+    fences: Dict[Future, AttemptFence] = {}
+    task_iter = enumerate(tasks)
+    exhausted = False
+    manager = None
+    if fence_kwarg is not None and isinstance(executor, ProcessPoolExecutor):
+        manager = multiprocessing.Manager()
+        fence_lock, cancelled = manager.Lock(), manager.dict()
+    else:
+        fence_lock, cancelled = threading.Lock(), {}
+
+    def launch(task_id: int, attempt: int):
+        kwargs = {attempt_kwarg: attempt} if attempt_kwarg is not None else {}
+        fence = None
+        if fence_kwarg is not None:
+            fence = kwargs[fence_kwarg] = AttemptFence(fence_lock, cancelled, (task_id, attempt))
+        future = executor.submit(fn, task_id, task_inputs[task_id], **kwargs)
+        future_tasks[future] = task_id
+        if fence is not None:
+            fences[future] = fence
+        tracker.start(task_id, future)
+
+    try:
+        while True:
+            # 补充任务直到占满worker
+            while not exhausted and tracker.running() < num_workers:
+                try:
+                    task_id, task = next(task_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if isinstance(task, CompletedTask):
+                    yield task_id, task.result
+                    continue
+                task_inputs[task_id] = task
+                launch(task_id, 0)
+
+            active = [f for f in future_tasks if not f.done()]
+            done = [f for f in future_tasks if f.done()]
+            if not active and not done:
+                break
+            if not done:
+                done, _ = wait(active, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                task_id = future_tasks.pop(future, None)
+                if task_id is None or task_id in tracker.finished or future.cancelled():
+                    continue
+                if future.exception() is not None:
+                    # 还有其他副本在运行时等待它们，否则抛出异常
+                    if any(not f.done() for f in tracker.attempts[task_id]):
+                        continue
+                    raise future.exception()
+                # 先隔离被放弃的副本，再使用胜者的结果；不再等待被放弃的副本
+                fences.pop(future, None)
+                for loser in tracker.finish(task_id, future):
+                    future_tasks.pop(loser, None)
+                    fence = fences.pop(loser, None)
+                    if fence is not None:
+                        fence.cancel()
+                task_inputs.pop(task_id, None)
+                yield task_id, future.result()
+
+            # 输入耗尽且有空闲worker时，为慢任务启动备份
+            if exhausted:
+                idle = num_workers - tracker.running()
+                for task_id in tracker.stragglers(slow_factor, min_completed)[:max(0, idle)]:
+                    logger.info(f"任务 {task_id} 运行过慢，启动备份任务")
+                    tracker.backups_launched += 1
+                    launch(task_id, 1)
+    finally:
+        # 被放弃的副本此时都已取消围栏；Manager关闭后仍在运行的副本提交时直接失败
+        if manager is not None:
+            manager.shutdown()
+
+    if tracker.backups_launched:
+        logger.info(f"推测执行: 启动 {tracker.backups_launched} 个备份任务, "
+                    f"其中 {tracker.backups_won} 个先于原任务完成")
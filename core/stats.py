@@ -0,0 +1,319 @@
+"""
+作业统计与用户计数器
+
+JobStats 汇总一次作业的各阶段耗时、每个任务的输入/输出记录数和延迟、
+中间数据量以及每个分区的key/value数量（用于观察数据倾斜）。
+
+用户计数器类似Hadoop的Counters：mapper/reducer中调用 increment_counter，
+计数先累加在当前任务的上下文局部字典中，任务结束后随结果一起返回并由驱动端合并，
+因此线程池和进程池下都不需要加锁，被放弃的推测执行副本的计数也不会被计入。
+计数字典保存在ContextVar中，async mapper/reducer的协程继承提交任务时的上下文，
+同样计入所在的任务。开启追踪时任务的span以同样的方式收集，见 core.tracing。
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.tracing import Trace, span, trace_scope
+
+
+# 框架内置计数器所在的组
+FRAMEWORK_GROUP = "framework"
+USER_GROUP = "user"
+
+_counters: ContextVar[Optional[Dict[Tuple[str, str], int]]] = ContextVar("mapreduce_counters", default=None)
+
+
+def increment_counter(name: str, amount: int = 1, group: str = USER_GROUP):
+    """
+    在当前任务中增加一个计数器
+
+    不在任务中调用时（例如范围分区采样时执行mapper）计数被忽略。
+
+    Args:
+        name: 计数器名称
+        amount: 增量
+        group: 计数器组
+    """
+    counters = _counters.get()
+    if counters is not None:
+        key = (group, name)
+        counters[key] = counters.get(key, 0) + amount
+
+
+@contextmanager
+def counter_scope() -> Iterator[Dict[Tuple[str, str], int]]:
+    """在当前上下文中收集计数器，退出时恢复外层的收集字典"""
+    counters: Dict[Tuple[str, str], int] = {}
+    token = _counters.set(counters)
+    try:
+        yield counters
+    finally:
+        _counters.reset(token)
+
+
+class TaskMetrics:
+    """一个任务的运行指标"""
+
+    def __init__(self, task_id: int, seconds: float, cpu_seconds: float,
+                 records_in: Optional[int] = None, records_out: Optional[int] = None,
+                 counters: Optional[Dict[Tuple[str, str], int]] = None,
+                 spans: Optional[List[Dict[str, Any]]] = None):
+        self.task_id = task_id
+        self.seconds = seconds
+        self.cpu_seconds = cpu_seconds
+        self.records_in = records_in
+        self.records_out = records_out
+        self.counters = counters or {}
+        # 开启追踪时任务内记录的事件，最后一个是任务本身的span
+        self.spans = spans
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"task_id": self.task_id, "seconds": self.seconds, "cpu_seconds": self.cpu_seconds,
+                "records_in": self.records_in, "records_out": self.records_out}
+
+
+def instrumented_task(fn: Callable, task_id: int, task: Any, trace: bool = False, span_name: str = "task",
+                      **kwargs) -> Tuple[Any, TaskMetrics]:
+    """
+    执行任务并记录耗时、CPU时间和计数器
+
+    定义在模块级，可以和 fn 一起pickle后在进程池中执行。
+
+    Args:
+        trace: 是否记录span（任务本身记为名为span_name的span）
+        span_name: 任务span的名称，通常为阶段名
+
+    Returns:
+        (任务结果, TaskMetrics)
+    """
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    records_in = len(task) if isinstance(task, list) else None
+    with counter_scope() as counters, trace_scope(trace) as spans:
+        with span(span_name, "task", task_id=task_id, records_in=records_in):
+            result = fn(task_id, task, **kwargs)
+    metrics = TaskMetrics(task_id, time.perf_counter() - start, time.thread_time() - cpu_start,
+                          records_in=records_in, counters=counters, spans=spans)
+    return result, metrics
+
+
+def percentiles(values: List[float], points: Iterable[int] = (50, 90, 99)) -> Dict[str, float]:
+    """最近秩法计算百分位数，另附最大值"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        index = max(0, -(-point * len(ordered) // 100) - 1)
+        result[f"p{point}"] = ordered[index]
+    result["max"] = ordered[-1]
+    return result
+
+
+class PhaseStats:
+    """一个阶段的统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.tasks: List[TaskMetrics] = []
+        self.cached_tasks = 0
+        self._start: Optional[float] = None
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self):
+        if self._start is not None:
+            self.wall_seconds += time.perf_counter() - self._start
+            self._start = None
+
+    @property
+    def cpu_seconds(self) -> float:
+        """各任务CPU时间之和"""
+        return sum(task.cpu_seconds for task in self.tasks)
+
+    @property
+    def records_in(self) -> int:
+        return sum(task.records_in or 0 for task in self.tasks)
+
+    @property
+    def records_out(self) -> int:
+        return sum(task.records_out or 0 for task in self.tasks)
+
+    def latency_percentiles(self) -> Dict[str, float]:
+        return percentiles([task.seconds for task in self.tasks])
+
+    def collect(self, results: Iterable[Tuple[int, Tuple[Any, Optional[TaskMetrics]]]],
+                count_out: Optional[Callable[[Any], int]] = None,
+                counters: Optional["Counters"] = None,
+                trace: Optional[Trace] = None) -> Iterator[Tuple[int, Any]]:
+        """
+        记录 instrumented_task 返回的指标，并去掉指标只返回结果
+
+        Args:
+            results: (task_id, (result, metrics)) 迭代器，metrics为None表示该任务没有执行（命中缓存）
+            count_out: 根据任务结果计算输出记录数
+            counters: 合并各任务计数器的目标
+            trace: 合并各任务span的目标
+        """
+        for task_id, (result, metrics) in results:
+            if metrics is None:
+                self.cached_tasks += 1
+            else:
+                if count_out is not None:
+                    metrics.records_out = count_out(result)
+                self.tasks.append(metrics)
+                if counters is not None:
+                    counters.merge(metrics.counters)
+                if trace is not None and metrics.spans:
+                    metrics.spans[-1]["args"]["records_out"] = metrics.records_out
+                    trace.extend(metrics.spans)
+            yield task_id, result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "tasks": len(self.tasks),
+            "cached_tasks": self.cached_tasks,
+            "records_in": self.records_in,
+            "records_out": self.records_out,
+            "latency": self.latency_percentiles(),
+        }
+
+
+class Counters:
+    """按 (组, 名称) 汇总的计数器"""
+
+    def __init__(self):
+        self._values: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def merge(self, counters: Dict[Tuple[str, str], int]):
+        with self._lock:
+            for key, value in counters.items():
+                self._values[key] += value
+
+    def get(self, name: str, group: str = USER_GROUP) -> int:
+        return self._values.get((group, name), 0)
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        """{组: {名称: 值}}"""
+        grouped: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for (group, name), value in sorted(self._values.items()):
+            grouped[group][name] = value
+        return dict(grouped)
+
+
+class JobStats:
+    """一次作业的统计"""
+
+    def __init__(self, trace: bool = False):
+        """
+        Args:
+            trace: 是否收集span时间线，见 core.tracing
+        """
+        self.phases: Dict[str, PhaseStats] = {}
+        self.counters = Counters()
+        self.total_seconds = 0.0
+        self.intermediate_pairs = 0
+        self.intermediate_bytes = 0
+        self.spill_files = 0
+        self.partition_keys: Dict[int, int] = {}
+        self.partition_values: Dict[int, int] = {}
+        self.trace: Optional[Trace] = Trace() if trace else None
+
+    def phase(self, name: str) -> PhaseStats:
+        """获取（按需创建）一个阶段的统计"""
+        if name not in self.phases:
+            self.phases[name] = PhaseStats(name)
+        return self.phases[name]
+
+    @contextmanager
+    def timed_phase(self, name: str) -> Iterator[PhaseStats]:
+        phase = self.phase(name)
+        phase.start()
+        try:
+            with span(name, "phase"):
+                yield phase
+        finally:
+            phase.stop()
+
+    @contextmanager
+    def tracing(self) -> Iterator[None]:
+        """在驱动端收集span（阶段、Shuffle合并等），退出时并入 self.trace；未开启追踪时不做任何事"""
+        with trace_scope(self.trace is not None) as events:
+            try:
+                yield
+            finally:
+                if events is not None:
+                    self.trace.extend(events)
+
+    def skew_histogram(self) -> Dict[int, Dict[str, int]]:
+        """每个分区的key数和value数"""
+        partitions = sorted(set(self.partition_keys) | set(self.partition_values))
+        return {pid: {"keys": self.partition_keys.get(pid, 0), "values": self.partition_values.get(pid, 0)}
+                for pid in partitions}
+
+    def skew_ratio(self) -> float:
+        """最大分区value数与平均值之比，1.0表示完全均衡"""
+        counts = list(self.partition_values.values())
+        if not counts or sum(counts) == 0:
+            return 1.0
+        return max(counts) / (sum(counts) / len(counts))
+
+    def mapper_memo(self) -> Dict[str, Any]:
+        """
+        mapper记忆化的统计（见 core.memoize）：命中/未命中次数、命中率、淘汰次数，
+        以及作业结束时各进程LRU的总字节数和条目数；未开启记忆化时为空dict
+        """
+        hits = self.counters.get("mapper_memo_hits", FRAMEWORK_GROUP)
+        misses = self.counters.get("mapper_memo_misses", FRAMEWORK_GROUP)
+        if hits + misses == 0:
+            return {}
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses),
+            "evictions": self.counters.get("mapper_memo_evictions", FRAMEWORK_GROUP),
+            "bytes": self.counters.get("mapper_memo_bytes", FRAMEWORK_GROUP),
+            "entries": self.counters.get("mapper_memo_entries", FRAMEWORK_GROUP),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": self.total_seconds,
+            "phases": {name: phase.to_dict() for name, phase in self.phases.items()},
+            "intermediate_pairs": self.intermediate_pairs,
+            "intermediate_bytes": self.intermediate_bytes,
+            "spill_files": self.spill_files,
+            "partitions": self.skew_histogram(),
+            "skew_ratio": self.skew_ratio(),
+            "counters": self.counters.to_dict(),
+            "mapper_memo": self.mapper_memo(),
+        }
+
+    def summary(self) -> str:
+        """便于打印的多行摘要"""
+        lines = [f"总耗时: {self.total_seconds:.3f}秒"]
+        for name, phase in self.phases.items():
+            latency = phase.latency_percentiles()
+            lines.append(f"  {name}: 墙钟 {phase.wall_seconds:.3f}秒, CPU {phase.cpu_seconds:.3f}秒, "
+                         f"任务 {len(phase.tasks)} 个, 输入 {phase.records_in}, 输出 {phase.records_out}, "
+                         f"p50 {latency.get('p50', 0):.4f}秒, p99 {latency.get('p99', 0):.4f}秒")
+        lines.append(f"  中间结果: {self.intermediate_pairs} 个键值对, {self.intermediate_bytes} 字节, "
+                     f"溢写文件 {self.spill_files} 个")
+        lines.append(f"  分区倾斜度: {self.skew_ratio():.2f}")
+        memo = self.mapper_memo()
+        if memo:
+            lines.append(f"  Mapper记忆化: 命中率 {memo['hit_rate']:.1%} ({memo['hits']}/{memo['hits'] + memo['misses']}), "
+                         f"{memo['entries']} 条, {memo['bytes']} 字节, 淘汰 {memo['evictions']} 次")
+        for group, values in self.counters.to_dict().items():
+            lines.append(f"  计数器[{group}]: {values}")
+        return "\n".join(lines)
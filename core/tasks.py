@@ -0,0 +1,300 @@
+"""
+Map/Reduce任务函数
+
+任务函数定义在模块级别，以便进程池可以通过pickle把它们发送到子进程。
+"""
+
+from collections import defaultdict
+from contextlib import nullcontext
+from itertools import chain
+from typing import Callable, List, Any, Dict, Iterable, Iterator, Tuple, Optional, Union
+
+from utils.logger import get_logger
+from utils.chunking import iter_chunks
+from core.partitioner import Partitioner
+from core.columnar import ColumnarBuffer, partition_buffers
+from core.shuffle import ExternalSorter, key_order
+from core.stats import increment_counter, FRAMEWORK_GROUP
+from core.async_runner import is_async_function
+from core.memoize import is_memoized_mapper
+from core.tracing import span
+
+
+logger = get_logger("mapreduce_framework")
+
+# 分区内每批归约的key数量
+DEFAULT_REDUCE_BATCH_SIZE = 1024
+
+
+def iter_map_output(mapper: Callable, chunk: List[Any]) -> Iterator[Tuple[Any, Any]]:
+    """对数据块逐条执行mapper，单条记录出错时记录日志并跳过"""
+    if is_async_function(mapper):
+        # 整个数据块的记录同时提交到事件循环，并发度由mapper的并发上限控制
+        for error, output in mapper.call_many([(item,) for item in chunk]):
+            if error is not None:
+                logger.error(f"Map处理错误: {error}")
+                increment_counter("map_errors", group=FRAMEWORK_GROUP)
+                continue
+            yield from output
+        return
+    if is_memoized_mapper(mapper):
+        # 重复记录直接取缓存的输出，保持原有的记录顺序
+        for pairs, _ in mapper.iter_outputs(chunk):
+            yield from pairs
+        return
+    for item in chunk:
+        try:
+            for key, value in mapper(item):
+                yield key, value
+        except Exception as e:
+            logger.error(f"Map处理错误: {e}")
+            increment_counter("map_errors", group=FRAMEWORK_GROUP)
+
+
+def partition_pairs(partitioner: Partitioner, pairs: Iterable[Tuple[Any, Any]]) -> Dict[int, ColumnarBuffer]:
+    """
+    把键值对分到各分区并编码为ColumnarBuffer
+
+    同一个key总是分到同一分区时逐条流式编码，每个不同的key只计算一次分区，
+    不需要先物化全部键值对；否则使用批量分区接口。
+
+    Returns:
+        {分区编号: 该分区键值对的ColumnarBuffer}，只包含非空分区
+    """
+    if partitioner.per_key:
+        return partition_buffers(partitioner, pairs)
+    pairs = list(pairs)
+    buckets = [[] for _ in range(partitioner.num_partitions)]
+    partition_ids = partitioner.get_partitions([key for key, _ in pairs])
+    for partition_id, pair in zip(partition_ids, pairs):
+        buckets[partition_id].append(pair)
+    return {partition_id: ColumnarBuffer(bucket) for partition_id, bucket in enumerate(buckets) if bucket}
+
+
+def map_task(mapper: Callable, partitioner: Partitioner, chunk_id: int, chunk: List[Any],
+             file_manager=None, combiner=None, job_id: Optional[str] = None, attempt: int = 0,
+             fence=None):
+    """
+    处理一个数据块
+
+    Args:
+        mapper: Map函数
+        partitioner: 分区器
+        chunk_id: 数据块编号
+        chunk: 数据块
+        file_manager: 不为None时将中间结果按分区写入磁盘
+        combiner: 不为None时在块内按key预聚合
+        job_id: 磁盘模式下溢写文件所属的作业
+        attempt: 副本编号（推测执行时同一数据块可能有多个副本同时运行）
+        fence: 推测执行时副本的 AttemptFence（见 core.speculative），磁盘模式下在围栏内提交溢写文件
+
+    Returns:
+        内存模式返回 {分区编号: ColumnarBuffer}，
+        磁盘模式返回 {分区编号: 溢写文件名}
+    """
+    # mapper按需惰性执行，span覆盖执行mapper、预聚合和分区编码
+    with span("map_partition", "map", chunk_id=chunk_id) as map_span:
+        if combiner is not None and combiner.weighted and is_memoized_mapper(mapper):
+            # 块内重复记录合并计数，每个不同记录的输出只按出现次数加权聚合一次
+            pairs = combiner.combine_weighted(mapper.iter_outputs(chunk, weighted=True))
+        else:
+            pairs = iter_map_output(mapper, chunk)
+            if combiner is not None:
+                pairs = combiner.combine(pairs)
+        local_intermediate = partition_pairs(partitioner, pairs)
+        map_span.set(partitions=len(local_intermediate))
+
+    # 根据配置选择存储方式，磁盘模式下每个分区写一个溢写文件。
+    # 先写入副本专属的临时文件，再在围栏内原子重命名：多个副本的输出不会互相覆盖一半，
+    # 被放弃的副本不会再提交（也不会在作业目录清理之后写入），并删除自己的临时文件
+    if file_manager is not None:
+        if fence is not None:
+            fence.check()
+        filenames = {}
+        attempt_filenames = {}
+        try:
+            for partition_id, pairs in local_intermediate.items():
+                filename = file_manager.job_file(job_id, f"map_{chunk_id}_part_{partition_id}.spill")
+                attempt_filenames[filename] = f"{filename}.attempt{attempt}"
+                file_manager.save_records(pairs, attempt_filenames[filename])
+                filenames[partition_id] = filename
+            with fence.commit() if fence is not None else nullcontext():
+                for filename, attempt_filename in attempt_filenames.items():
+                    file_manager.commit_file(attempt_filename, filename)
+        except BaseException:
+            for attempt_filename in attempt_filenames.values():
+                file_manager.remove(attempt_filename)
+            raise
+        return filenames
+    return local_intermediate
+
+
+def batch_reducer(func: Callable[[List[Any], List[List]], List[Any]]) -> Callable:
+    """
+    把函数标记为批量（向量化）reducer
+
+    批量reducer的签名为 func(keys, values_lists) -> results，一次处理一批key，
+    返回与keys一一对应的结果列表；结果为None的key会被丢弃。
+    """
+    func.is_batch_reducer = True
+    return func
+
+
+def is_batch_reducer(reducer: Callable) -> bool:
+    return getattr(reducer, "is_batch_reducer", False)
+
+
+def reduce_task(reducer: Callable, key_values: Tuple[Any, List]) -> Tuple[Any, Optional[Any]]:
+    """处理一个key的所有values"""
+    key, values = key_values
+    try:
+        result = reducer(key, values)
+        return key, result
+    except Exception as e:
+        logger.error(f"Reduce处理错误 key={key}: {e}")
+        increment_counter("reduce_errors", group=FRAMEWORK_GROUP)
+        return key, None
+
+
+def iter_partition_pairs(partition_data: Union[ColumnarBuffer, List],
+                         file_manager=None) -> Iterable[Tuple[Any, Any]]:
+    """遍历一个分区的键值对，磁盘模式下逐个流式读取该分区的溢写文件"""
+    if file_manager is None:
+        return partition_data
+    return chain.from_iterable(file_manager.iter_records(filename) for filename in partition_data)
+
+
+def group_partition(partition_data: Union[ColumnarBuffer, List, ExternalSorter], file_manager=None,
+                    sorted_output: bool = False) -> Union[Dict[Any, List], Iterator[Tuple[Any, List]]]:
+    """
+    对一个分区的数据按key分组
+
+    Args:
+        partition_data: ColumnarBuffer、键值对列表、溢写文件名列表（磁盘模式）或该分区的外部排序器
+        file_manager: 磁盘模式下用于读取溢写文件
+        sorted_output: 是否按key排序输出
+
+    Returns:
+        {key: [values]}，或外部排序器归并产生的 (key, [values]) 有序流
+    """
+    if isinstance(partition_data, ExternalSorter):
+        return partition_data.groups()
+    if isinstance(partition_data, ColumnarBuffer):
+        # 直接在key编号上分组
+        return partition_data.groups(sorted_output)
+
+    pairs = iter_partition_pairs(partition_data, file_manager)
+    if sorted_output:
+        pairs = sorted(pairs, key=lambda pair: key_order(pair[0]))
+    grouped_data = defaultdict(list)
+    for key, value in pairs:
+        grouped_data[key].append(value)
+    return grouped_data
+
+
+def shuffle_reduce_task(reducer: Callable, partition_id: int,
+                        partition_data: Union[ColumnarBuffer, List, ExternalSorter],
+                        file_manager=None, sorted_output: bool = False,
+                        batch_size: int = DEFAULT_REDUCE_BATCH_SIZE,
+                        output=None, fence=None) -> Union[List[Tuple[Any, Any]], Dict[str, Any]]:
+    """
+    对一个分区执行Shuffle和Reduce
+
+    每个分区独立分组、归约，多个分区可以并行执行；分区内按batch_size个key一批归约。
+    任务只读取分区数据，推测执行时多个副本可以安全地同时运行（输出分片在围栏内原子替换）。
+
+    Args:
+        reducer: Reduce函数
+        partition_id: 分区任务编号
+        partition_data: 分区数据，见 group_partition
+        file_manager: 磁盘模式下用于读取溢写文件
+        sorted_output: 是否按key排序输出
+        batch_size: 每批归约的key数量
+        output: 可选的 OutputSink，结果边归约边写入编号为partition_id的分片
+        fence: 推测执行时副本的 AttemptFence，被放弃的副本不再替换输出分片
+
+    Returns:
+        该分区的 [(key, result), ...]，归约失败的key已被丢弃；
+        指定output时返回分片摘要
+    """
+    # 外部排序器的归并分组是惰性的，其读取溢写帧的时间计入之后的reduce批次
+    with span("group", "shuffle", partition_id=partition_id) as group_span:
+        grouped_data = group_partition(partition_data, file_manager, sorted_output)
+        if isinstance(grouped_data, dict):
+            group_span.set(keys=len(grouped_data))
+    items = grouped_data.items() if isinstance(grouped_data, dict) else grouped_data
+    results = (result for batch_id, batch in enumerate(iter_chunks(items, batch_size))
+               for result in reduce_batch_task(reducer, batch_id, batch))
+    if output is not None:
+        return output.write_shard(partition_id, results, fence=fence)
+    return list(results)
+
+
+def reduce_batch_task(reducer: Callable, batch_id: int, batch: List[Tuple[Any, List]]) -> List[Tuple[Any, Any]]:
+    """
+    归约一批key
+
+    普通reducer逐个key调用；批量reducer（见 batch_reducer）对整批调用一次，
+    整批失败时退化为逐个key调用以定位出错的key。出错的key记录日志后丢弃。
+
+    Args:
+        reducer: Reduce函数
+        batch_id: 批次编号
+        batch: [(key, values), ...]
+
+    Returns:
+        [(key, result), ...]，不包含失败或结果为None的key
+    """
+    with span("reduce_batch", "reduce", batch_id=batch_id, keys=len(batch)) as batch_span:
+        results = _reduce_batch(reducer, batch_id, batch)
+        batch_span.set(results=len(results))
+    return results
+
+
+def _reduce_batch(reducer: Callable, batch_id: int, batch: List[Tuple[Any, List]]) -> List[Tuple[Any, Any]]:
+    """reduce_batch_task 的实现"""
+    if is_batch_reducer(reducer):
+        keys = [key for key, _ in batch]
+        try:
+            batch_results = _call_batch_reducer(reducer, keys, [values for _, values in batch])
+            return [(key, result) for key, result in zip(keys, batch_results) if result is not None]
+        except Exception as e:
+            logger.error(f"批量Reduce处理错误 batch={batch_id}: {e}，逐个key重试")
+            reduce_one = _reduce_one_with_batch_reducer
+    elif is_async_function(reducer):
+        return _reduce_batch_async(reducer, batch)
+    else:
+        reduce_one = reduce_task
+
+    results = []
+    for key_values in batch:
+        key, result = reduce_one(reducer, key_values)
+        if result is not None:
+            results.append((key, result))
+    return results
+
+
+def _reduce_batch_async(reducer, batch: List[Tuple[Any, List]]) -> List[Tuple[Any, Any]]:
+    """在事件循环上并发归约一批key"""
+    results = []
+    for (key, _), (error, result) in zip(batch, reducer.call_many(batch)):
+        if error is not None:
+            logger.error(f"Reduce处理错误 key={key}: {error}")
+            increment_counter("reduce_errors", group=FRAMEWORK_GROUP)
+        elif result is not None:
+            results.append((key, result))
+    return results
+
+
+def _call_batch_reducer(reducer: Callable, keys: List[Any], values_lists: List[List]) -> List[Any]:
+    """调用批量reducer，结果数与key数不一致时抛出ValueError，不按位置静默错配或丢弃key"""
+    results = list(reducer(keys, values_lists))
+    if len(results) != len(keys):
+        raise ValueError(f"批量reducer返回了 {len(results)} 个结果，应为 {len(keys)} 个")
+    return results
+
+
+def _reduce_one_with_batch_reducer(reducer: Callable, key_values: Tuple[Any, List]) -> Tuple[Any, Optional[Any]]:
+    """用批量reducer处理单个key"""
+    key, values = key_values
+    return reduce_task(lambda k, v: _call_batch_reducer(reducer, [k], [v])[0], (key, values))
@@ -0,0 +1,82 @@
+"""core.async_runner 的测试：async mapper/reducer"""
+
+import asyncio
+
+from core.async_runner import AsyncFunction, wrap_async
+from core.mapreduce import MapReduce
+from core.stats import FRAMEWORK_GROUP, increment_counter
+
+
+LINES = [f"w{i % 11} w{i % 4}" for i in range(200)] + ["bad"]
+
+
+async def async_mapper(line):
+    await asyncio.sleep(0)
+    if line == "bad":
+        raise ValueError("bad record")
+    increment_counter("async_lines")
+    return [(word, 1) for word in line.split()]
+
+
+async def async_gen_mapper(line):
+    if line == "bad":
+        raise ValueError("bad record")
+    for word in line.split():
+        await asyncio.sleep(0)
+        yield word, 1
+
+
+async def async_reducer(key, values):
+    await asyncio.sleep(0)
+    if key == "w3":
+        raise ValueError("bad key")
+    return sum(values)
+
+
+def sync_mapper(line):
+    if line == "bad":
+        raise ValueError("bad record")
+    return [(word, 1) for word in line.split()]
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def test_async_jobs_match_sync_job(tmp_path):
+    expected = MapReduce(num_workers=2, temp_dir=str(tmp_path)).run(LINES, sync_mapper, sum_reducer)
+    for mapper in (async_mapper, async_gen_mapper):
+        mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), async_concurrency=8)
+        results, stats = mr.run(LINES, mapper, sum_reducer, return_stats=True)
+        assert results == expected
+        assert stats.counters.get("map_errors", FRAMEWORK_GROUP) == 1
+
+    results, stats = MapReduce(num_workers=2, temp_dir=str(tmp_path)).run(
+        LINES, async_mapper, async_reducer, return_stats=True)
+    assert results == {key: value for key, value in expected.items() if key != "w3"}
+    assert stats.counters.get("reduce_errors", FRAMEWORK_GROUP) == 1
+    # 协程继承提交任务时的上下文，计数计入所在的map任务
+    assert stats.counters.get("async_lines") == 200
+
+
+def test_concurrency_limit():
+    state = {"running": 0, "peak": 0}
+
+    async def tracked(x):
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01)
+        state["running"] -= 1
+        return x * 2
+
+    results = AsyncFunction(tracked, concurrency=3).call_many([(i,) for i in range(12)])
+    assert results == [(None, i * 2) for i in range(12)]
+    assert state["peak"] == 3
+
+
+def test_wrap_async_leaves_sync_callables():
+    assert wrap_async(sync_mapper, 4) is sync_mapper
+    assert wrap_async("sum", 4) == "sum"
+    wrapped = wrap_async(async_mapper, 4)
+    assert isinstance(wrapped, AsyncFunction)
+    assert wrapped("a b") == [("a", 1), ("b", 1)]
@@ -0,0 +1,55 @@
+"""core.cluster 的测试：本地多进程集群"""
+
+import pytest
+
+from core.distributed import DistributedMapReduce
+
+
+LINES = [f"w{i % 23} w{i % 7} w{i % 3}" for i in range(600)]
+
+
+def word_mapper(line):
+    for word in line.split():
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def expected_counts():
+    counts = {}
+    for line in LINES:
+        for word in line.split():
+            counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+@pytest.mark.parametrize("partitioner", [None, "range"])
+def test_cluster_matches_simulate(partitioner):
+    cluster = DistributedMapReduce(num_mappers=3, num_reducers=2, partitioner=partitioner, mode="cluster")
+    results = cluster.simulate_distributed_execution(LINES, word_mapper, sum_reducer)
+    simulated = DistributedMapReduce(num_mappers=3, num_reducers=2, partitioner=partitioner)
+    assert results == expected_counts()
+    assert results == simulated.simulate_distributed_execution(LINES, word_mapper, sum_reducer)
+    if partitioner == "range":
+        assert list(results) == sorted(results)
+
+
+def test_cluster_records_transfers():
+    cluster = DistributedMapReduce(num_mappers=2, num_reducers=3, mode="cluster")
+    cluster.simulate_distributed_execution(LINES, word_mapper, sum_reducer, combiner="sum")
+    # 每个Mapper向每个Reducer推送一次，空分区也会发送
+    assert len(cluster.transfer_stats) == 2 * 3
+    assert all(transfer.num_bytes > 0 for transfer in cluster.transfer_stats)
+
+
+def test_cluster_propagates_node_failure():
+    def failing_partitioner(key, num_partitions):
+        if key == "w5":
+            raise ValueError("partition failed")
+        return 0
+
+    cluster = DistributedMapReduce(num_mappers=2, num_reducers=2, partitioner=failing_partitioner, mode="cluster")
+    with pytest.raises(RuntimeError, match="partition failed"):
+        cluster.simulate_distributed_execution(LINES, word_mapper, sum_reducer)
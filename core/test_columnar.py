@@ -0,0 +1,54 @@
+"""core.columnar 的测试：列式中间结果缓冲区"""
+
+import pickle
+
+import pytest
+
+from core.columnar import ColumnarBuffer, partition_buffers
+from core.partitioner import Partitioner
+
+
+@pytest.mark.parametrize("pairs, typed", [
+    ([("a", 1), ("b", 2), ("a", 3)], True),
+    ([("a", 1.5), (("t", 1), 2.5)], True),
+    ([("a", 1), ("b", 2.5)], False),
+    ([("a", True), ("a", 1)], False),
+    ([("a", 1), ("b", 2 ** 70)], False),
+    ([(1, "x"), (None, [1, 2]), (b"k", None)], False),
+])
+def test_round_trip_preserves_pairs_and_types(pairs, typed):
+    buffer = ColumnarBuffer(pairs)
+    assert len(buffer) == len(pairs)
+    assert buffer.is_typed == typed
+    assert list(buffer) == pairs
+    assert [tuple(map(type, pair)) for pair in buffer] == [tuple(map(type, pair)) for pair in pairs]
+    for protocol in (4, pickle.HIGHEST_PROTOCOL):
+        assert list(pickle.loads(pickle.dumps(buffer, protocol=protocol))) == pairs
+
+
+def test_extend_merges_buffers_and_falls_back_to_objects():
+    buffer = ColumnarBuffer([("a", 1), ("b", 2)])
+    buffer.extend(ColumnarBuffer([("b", 3), ("c", 4)]))
+    assert buffer.is_typed and buffer.num_keys == 3
+    buffer.extend([("a", "text")])
+    assert not buffer.is_typed
+    # 反序列化后的缓冲区可以继续追加
+    restored = pickle.loads(pickle.dumps(buffer))
+    restored.append("d", 5)
+    assert list(restored) == [("a", 1), ("b", 2), ("b", 3), ("c", 4), ("a", "text"), ("d", 5)]
+
+
+def test_groups():
+    buffer = ColumnarBuffer([("b", 1), ("a", 2), ("b", 3)])
+    assert list(buffer.groups().items()) == [("b", [1, 3]), ("a", [2])]
+    assert list(buffer.groups(sorted_output=True).items()) == [("a", [2]), ("b", [1, 3])]
+
+
+def test_partition_buffers_matches_partitioner():
+    partitioner = Partitioner(3)
+    pairs = [(f"k{i % 10}", i) for i in range(100)]
+    buffers = partition_buffers(partitioner, pairs)
+    expected = {}
+    for key, value in pairs:
+        expected.setdefault(partitioner.get_partition(key), []).append((key, value))
+    assert {pid: list(buffer) for pid, buffer in buffers.items()} == expected
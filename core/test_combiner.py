@@ -0,0 +1,67 @@
+"""core.combiner 的测试：使用Combiner与不使用时结果相同"""
+
+import pytest
+
+from core.combiner import FunctionCombiner, resolve_combiner
+from core.distributed import DistributedMapReduce
+from core.mapreduce import MapReduce
+
+
+LINES = [f"w{i % 7} w{i % 3} w{i % 11}" for i in range(300)]
+
+
+def word_mapper(line):
+    for word in line.split():
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def length_mean_mapper(line):
+    for word in line.split():
+        yield word[:2], (len(word), 1)
+
+
+def mean_reducer(key, values):
+    total = sum(value for value, _ in values)
+    count = sum(count for _, count in values)
+    return total / count
+
+
+@pytest.mark.parametrize("combiner", ["sum", "count", FunctionCombiner(lambda key, values: sum(values))])
+def test_combiner_matches_plain_run(tmp_path, combiner):
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path))
+    assert mr.run(LINES, word_mapper, sum_reducer, combiner=combiner) == mr.run(LINES, word_mapper, sum_reducer)
+
+
+def test_mean_combiner_matches_plain_run(tmp_path):
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path))
+    assert (mr.run(LINES, length_mean_mapper, mean_reducer, combiner="mean")
+            == mr.run(LINES, length_mean_mapper, mean_reducer))
+
+
+def test_distributed_combiner_matches_plain_run():
+    combined = DistributedMapReduce(num_mappers=3, num_reducers=2).simulate_distributed_execution(
+        LINES, word_mapper, sum_reducer, combiner="sum")
+    plain = DistributedMapReduce(num_mappers=3, num_reducers=2).simulate_distributed_execution(
+        LINES, word_mapper, sum_reducer)
+    assert combined == plain
+
+
+def test_combiner_flushes_when_buffer_is_full():
+    combiner = resolve_combiner("sum")
+    combiner.max_keys = 2
+    pairs = [("a", 1), ("b", 1), ("a", 1), ("c", 1), ("a", 1)]
+    combined = list(combiner.combine(iter(pairs)))
+    assert len(combined) > 3
+    totals = {}
+    for key, value in combined:
+        totals[key] = totals.get(key, 0) + value
+    assert totals == {"a": 3, "b": 1, "c": 1}
+
+
+def test_unknown_combiner_name_is_rejected():
+    with pytest.raises(ValueError):
+        resolve_combiner("median")
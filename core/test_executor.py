@@ -0,0 +1,49 @@
+"""core.executor 的测试：进程池执行器与无法pickle时回退到线程池"""
+
+import pytest
+
+from core.executor import EXECUTOR_PROCESS, EXECUTOR_THREAD, resolve_executor_type
+from core.mapreduce import MapReduce
+
+
+LINES = ["the quick brown fox", "the lazy dog", "quick quick fox"] * 20
+
+
+def word_mapper(line):
+    for word in line.split():
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def expected_counts():
+    counts = {}
+    for line in LINES:
+        for word in line.split():
+            counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+def test_process_executor_matches_thread_executor(tmp_path):
+    results = {}
+    for executor_type in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+        mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), executor_type=executor_type)
+        results[executor_type] = mr.run(LINES, word_mapper, sum_reducer)
+    assert results[EXECUTOR_PROCESS] == results[EXECUTOR_THREAD] == expected_counts()
+
+
+def test_unpicklable_functions_fall_back_to_threads(tmp_path):
+    offset = 0
+    assert resolve_executor_type(EXECUTOR_PROCESS, word_mapper, sum_reducer) == EXECUTOR_PROCESS
+    assert resolve_executor_type(EXECUTOR_PROCESS, word_mapper, lambda key, values: 0) == EXECUTOR_THREAD
+
+    # 闭包无法发送到子进程，作业仍然在线程池中正确完成
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), executor_type=EXECUTOR_PROCESS)
+    assert mr.run(LINES, word_mapper, lambda key, values: sum(values) + offset) == expected_counts()
+
+
+def test_unknown_executor_type_is_rejected():
+    with pytest.raises(ValueError):
+        resolve_executor_type("gpu")
@@ -0,0 +1,87 @@
+"""core.mapreduce 的测试"""
+
+import threading
+
+import pytest
+
+from core.mapreduce import MapReduce
+
+
+def word_mapper(line):
+    for word in line.split():
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def test_generator_input_matches_list_input(tmp_path):
+    lines = [f"w{i % 13} w{i % 5}" for i in range(1000)]
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path))
+    assert mr.run((line for line in lines), word_mapper, sum_reducer) == mr.run(lines, word_mapper, sum_reducer)
+
+
+def test_generator_input_is_read_with_backpressure(tmp_path):
+    chunk_size, max_inflight = 10, 2
+    state = {"pulled": 0, "mapped": 0, "max_ahead": 0}
+    lock = threading.Lock()
+
+    def records():
+        for i in range(2000):
+            with lock:
+                state["pulled"] += 1
+            yield f"w{i % 13}"
+
+    def counting_mapper(record):
+        with lock:
+            state["mapped"] += 1
+            state["max_ahead"] = max(state["max_ahead"], state["pulled"] - state["mapped"])
+        yield record, 1
+
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), chunk_size=chunk_size, max_inflight_chunks=max_inflight)
+    results = mr.run(records(), counting_mapper, sum_reducer)
+    assert sum(results.values()) == 2000
+    # 已读取但还未处理的记录不超过在途的数据块加上正在读取的一块
+    assert state["max_ahead"] <= (max_inflight + 1) * chunk_size
+
+
+def identity_mapper(record):
+    yield record, 1
+
+
+def fragile_mapper(record):
+    if record == "bad":
+        raise ValueError("bad record")
+    yield record, 1
+
+
+def test_range_partitioner_samples_unindexable_collections(tmp_path):
+    words = {f"w{i:03d}" for i in range(200)}
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), partitioner="range")
+    expected = {word: 1 for word in words}
+    assert mr.run(words, identity_mapper, sum_reducer) == expected
+    assert mr.run({word: None for word in words}.keys(), identity_mapper, sum_reducer) == expected
+    # 范围分区的结果按key全局有序
+    assert list(mr.run(words, identity_mapper, sum_reducer)) == sorted(words)
+
+
+def test_range_partitioner_sampling_skips_bad_records(tmp_path):
+    data = ["bad"] + [f"w{i:03d}" for i in range(100)]
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), partitioner="range")
+    assert mr.run(data, fragile_mapper, sum_reducer) == {f"w{i:03d}": 1 for i in range(100)}
+
+
+@pytest.mark.parametrize("options", [{}, {"use_disk_storage": True}, {"sort_buffer_mb": 0.01},
+                                     {"partitioner": "range"}])
+def test_partition_parallel_reduce_matches_serial_phases(tmp_path, options):
+    lines = [f"w{i % 97} w{i % 13} w{i % 5}" for i in range(3000)]
+    serial = MapReduce(num_workers=3, temp_dir=str(tmp_path))
+    grouped = serial.shuffle_phase(serial.map_phase(word_mapper, lines))
+    expected = serial.reduce_phase(sum_reducer, grouped)
+
+    mr = MapReduce(num_workers=3, temp_dir=str(tmp_path), **options)
+    results = mr.run(lines, word_mapper, sum_reducer)
+    assert results == expected
+    if options.get("partitioner") == "range":
+        assert list(results) == sorted(results)
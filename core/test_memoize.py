@@ -0,0 +1,62 @@
+"""core.memoize 的测试：缓存key区分类型，mapper出错时与不记忆化的行为一致"""
+
+import pytest
+
+from core.mapreduce import MapReduce
+from core.memoize import MemoizedMapper, memo_key
+
+
+def type_mapper(record):
+    yield type(record).__name__, 1
+
+
+def test_equal_records_of_different_types_are_cached_separately():
+    assert len({memo_key(1), memo_key(True), memo_key(1.0)}) == 3
+    assert memo_key((1, "a")) != memo_key((1.0, "a"))
+    assert memo_key(((True,), "a")) != memo_key(((1,), "a"))
+    assert memo_key(frozenset([1])) != memo_key(frozenset([True]))
+    assert memo_key("x" * 300) != memo_key(b"x" * 300)
+    assert memo_key(("a", [1])) is None
+
+    mapper = MemoizedMapper(type_mapper)
+    try:
+        outputs = [pairs for pairs, _ in mapper.iter_outputs([1, True, 1.0, 1])]
+    finally:
+        mapper.release()
+    assert outputs == [(("int", 1),), (("bool", 1),), (("float", 1),), (("int", 1),)]
+
+
+def failing_mapper(record):
+    """先产生一个键值对，对"bad"记录随后抛出异常"""
+    yield record, 1
+    if record == "bad":
+        raise ValueError("bad record")
+    yield "total", 1
+
+
+@pytest.mark.parametrize("combiner", [None, "sum"])
+def test_partial_output_matches_unmemoized_run(tmp_path, combiner):
+    data = ["ok", "bad", "ok", "bad", "bad"]
+    results = {}
+    for memoize in (False, True):
+        mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), memoize_mapper=memoize)
+        results[memoize] = mr.run(data, failing_mapper, lambda key, values: sum(values), combiner=combiner)
+    assert results[True] == results[False] == {"ok": 2, "bad": 3, "total": 2}
+
+
+def test_failed_records_are_not_cached():
+    calls = []
+
+    def flaky_mapper(record):
+        calls.append(record)
+        if len(calls) == 1:
+            raise ValueError("first call fails")
+        yield record, 1
+
+    mapper = MemoizedMapper(flaky_mapper)
+    try:
+        outputs = [pairs for pairs, _ in mapper.iter_outputs(["a", "a", "a"])]
+    finally:
+        mapper.release()
+    assert outputs == [(("a", 1),), (("a", 1),)]
+    assert calls == ["a", "a"]
@@ -0,0 +1,40 @@
+"""core.partitioner 的测试：哈希分区的均匀性和一致性"""
+
+from collections import Counter
+
+import pytest
+
+from core.partitioner import Partitioner, stable_hash
+
+
+def assert_balanced(counts: Counter, num_partitions: int, total: int, tolerance: float = 0.2):
+    """每个分区都有数据，且与平均值的偏差不超过tolerance"""
+    assert len(counts) == num_partitions
+    mean = total / num_partitions
+    assert max(counts.values()) <= mean * (1 + tolerance)
+    assert min(counts.values()) >= mean * (1 - tolerance)
+
+
+@pytest.mark.parametrize("num_partitions,stride", [(4, 4), (8, 1000), (8, 1024), (16, 1), (3, 3), (32, 65536)])
+def test_strided_int_keys_are_balanced(num_partitions, stride):
+    keys = [i * stride for i in range(10000)]
+    partitioner = Partitioner(num_partitions)
+    assert_balanced(Counter(partitioner.get_partitions(keys)), num_partitions, len(keys))
+
+
+def test_negative_and_large_int_keys():
+    partitioner = Partitioner(8)
+    keys = list(range(-5000, 5000)) + [2 ** 70 + i for i in range(1000)]
+    counts = Counter(partitioner.get_partition(key) for key in keys)
+    assert_balanced(counts, 8, len(keys))
+
+
+def test_batch_and_single_key_partitions_agree():
+    partitioner = Partitioner(7)
+    keys = [0, 1, -1, 2 ** 40, True, 1.0, 2.5, "word", b"bytes", ("a", 1), None]
+    assert partitioner.get_partitions(keys) == [partitioner.get_partition(key) for key in keys]
+
+
+def test_equal_keys_share_a_partition():
+    assert stable_hash(1) == stable_hash(True) == stable_hash(1.0)
+    assert stable_hash(-3) == stable_hash(-3.0)
@@ -0,0 +1,56 @@
+"""core.pipeline 的测试：map-only阶段的融合与async mapper的批量执行"""
+
+import asyncio
+import time
+
+import pytest
+
+from core.pipeline import AsyncFusedMapper, Pipeline
+
+
+def split_words(line):
+    return line.split()
+
+
+async def slow_pair_mapper(word):
+    await asyncio.sleep(0.05)
+    return [(word, 1)]
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def test_fused_async_mapper_runs_concurrently(tmp_path):
+    lines = [f"w{i % 5} w{i % 3}" for i in range(40)]
+    pipeline = (Pipeline(num_workers=1, temp_dir=str(tmp_path))
+                .flat_map(split_words)
+                .filter(lambda word: word != "w0")
+                .map_reduce(slow_pair_mapper, sum_reducer))
+    assert isinstance(pipeline.plan()[0].mapper, AsyncFusedMapper)
+    start = time.perf_counter()
+    results = pipeline.run(lines)
+    # 64个单词逐条执行至少需要3.2秒
+    assert time.perf_counter() - start < 2.0
+
+    expected = {}
+    for word in (word for line in lines for word in line.split() if word != "w0"):
+        expected[word] = expected.get(word, 0) + 1
+    assert results == expected
+
+
+def test_async_map_only_stage_is_rejected(tmp_path):
+    with pytest.raises(TypeError):
+        Pipeline(temp_dir=str(tmp_path)).map(slow_pair_mapper)
+
+
+def test_map_only_stages_stream_after_reduce(tmp_path):
+    pipeline = (Pipeline(num_workers=2, temp_dir=str(tmp_path))
+                .flat_map(split_words)
+                .map_reduce(lambda word: [(word, 1)], sum_reducer)
+                .filter(lambda item: item[1] > 1)
+                .map(lambda item: item[0]))
+    assert sorted(pipeline.iter_run(["a b", "a c", "b"])) == ["a", "b"]
+    assert pipeline.explain().splitlines() == [
+        "1. mapreduce[flat_map:split_words -> mapreduce:<lambda>/sum_reducer]",
+        "2. map-only[filter:<lambda> -> map:<lambda>]"]
@@ -0,0 +1,64 @@
+"""core.scheduler 的测试：自适应动态切分"""
+
+import pytest
+
+from core.distributed import DistributedMapReduce
+from core.mapreduce import MapReduce
+from core.scheduler import (INITIAL_CHUNK_WEIGHT, MIN_TAIL_FRACTION, AdaptiveChunker, iter_scheduled_chunks,
+                            resolve_schedule)
+
+
+def word_mapper(line):
+    for word in line.split():
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def test_probe_chunks_until_cost_is_known():
+    chunker = AdaptiveChunker(num_workers=2)
+    records = ["x" * 99] * 1000
+    chunks = chunker.chunks(records)
+    # 探测块按累计权重切分（每条记录权重为长度加一）
+    assert len(next(chunks)) == INITIAL_CHUNK_WEIGHT // 100 + 1
+
+
+def test_chunks_follow_observed_cost_and_shrink_at_tail():
+    chunker = AdaptiveChunker(num_workers=2, target_task_seconds=0.1)
+    records = list(range(10000))
+    chunks = chunker.chunks(records)
+    first = next(chunks)
+    # 每条记录1毫秒：目标0.1秒对应100条
+    chunker.observe(0, len(first) * 0.001)
+    sizes = [len(first)] + [len(chunk) for chunk in chunks]
+    assert sum(sizes) == len(records)
+    assert sizes[1] == 100
+    assert min(sizes[1:-1]) >= 100 * MIN_TAIL_FRACTION
+    assert sizes[-2] < 100
+
+
+def test_large_records_get_their_own_chunks():
+    chunker = AdaptiveChunker(num_workers=2)
+    records = ["small"] * 10 + ["x" * (INITIAL_CHUNK_WEIGHT * 2)] + ["small"] * 10
+    assert [len(chunk) for chunk in chunker.chunks(records)] == [11, 10]
+
+
+def test_static_schedule_and_explicit_chunk_size():
+    data = list(range(100))
+    assert [len(chunk) for chunk in iter_scheduled_chunks(data, 4, "static")] == [25] * 4
+    assert [len(chunk) for chunk in iter_scheduled_chunks(data, 4, "dynamic", chunk_size=30)] == [30, 30, 30, 10]
+    with pytest.raises(ValueError):
+        resolve_schedule("random")
+
+
+@pytest.mark.parametrize("schedule", ["static", "dynamic"])
+def test_schedules_produce_same_results(tmp_path, schedule):
+    lines = [("long " * 200) if i % 97 == 0 else f"w{i % 13}" for i in range(3000)]
+    expected = MapReduce(num_workers=1, temp_dir=str(tmp_path)).run(lines, word_mapper, sum_reducer)
+    mr = MapReduce(num_workers=3, temp_dir=str(tmp_path), schedule=schedule, target_task_seconds=0.001)
+    assert mr.run(lines, word_mapper, sum_reducer) == expected
+    for mode in ("simulate", "cluster"):
+        dmr = DistributedMapReduce(num_mappers=2, num_reducers=2, mode=mode, schedule=schedule)
+        assert dmr.simulate_distributed_execution(iter(lines), word_mapper, sum_reducer) == expected
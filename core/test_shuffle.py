@@ -0,0 +1,59 @@
+"""core.shuffle 的测试：混合类型key的排序与外部归并分组"""
+
+import random
+from collections import defaultdict
+
+from core.shuffle import ExternalSorter, key_order
+from storage.file_manager import FileManager
+
+
+class Unordered:
+    """可哈希但不可排序的key，哈希值故意冲突"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Unordered) and self.name == other.name
+
+    def __hash__(self):
+        return 7
+
+
+MIXED_KEYS = [1, 1.0, True, 2, 2.5, "a", "b", b"a", None, (1, "a"), ("a", 1), (1, ("x", 2)),
+              frozenset({1, "x"}), 3j, Unordered("p"), Unordered("q")]
+
+
+def hash_groups(pairs):
+    grouped = defaultdict(list)
+    for key, value in pairs:
+        grouped[key].append(value)
+    return grouped
+
+
+def test_equal_keys_have_equal_order():
+    assert key_order(1) == key_order(1.0) == key_order(True)
+    assert key_order((1, "a")) == key_order((1.0, "a"))
+    assert key_order(frozenset({1, "x"})) == key_order(frozenset({"x", True}))
+
+
+def test_mixed_keys_sort_without_error():
+    ordered = sorted(MIXED_KEYS, key=key_order)
+    assert sorted(ordered, key=key_order) == ordered
+    assert ordered.index("a") < ordered.index("b")
+    assert ordered.index(2) < ordered.index(2.5)
+
+
+def test_external_merge_matches_hash_grouping(tmp_path):
+    rng = random.Random(0)
+    pairs = [(rng.choice(MIXED_KEYS), i) for i in range(3000)]
+    sorter = ExternalSorter(FileManager(str(tmp_path)), memory_limit_mb=0.01)
+    sorter.extend(pairs)
+    assert sorter.spill_count > 1
+
+    merged = list(sorter.groups())
+    expected = hash_groups(pairs)
+    assert len(merged) == len(expected)
+    for key, values in merged:
+        assert sorted(values) == sorted(expected[key])
+    sorter.cleanup()
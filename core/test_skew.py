@@ -0,0 +1,57 @@
+"""core.skew 的测试：热点key检测与拆分"""
+
+import pytest
+
+from core.distributed import DistributedMapReduce
+from core.partitioner import Partitioner
+from core.skew import HotKeySplitter, detect_hot_keys, merge_split_results
+
+
+# "hot" 占一半以上的value
+LINES = ["hot hot hot " + f"w{i % 31}" for i in range(900)]
+
+
+def word_mapper(line):
+    for word in line.split():
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def test_detect_hot_keys():
+    keys = ["hot"] * 60 + ["warm"] * 20 + [f"k{i}" for i in range(20)]
+    assert detect_hot_keys(keys, num_reducers=4) == {"hot": 3, "warm": 2}
+    assert detect_hot_keys(keys, num_reducers=4, threshold=0.5) == {"hot": 3}
+    assert detect_hot_keys(keys, num_reducers=1) == {}
+    assert detect_hot_keys([], num_reducers=4) == {}
+
+
+def test_hot_key_splitter_spreads_hot_key_only():
+    base = Partitioner(4)
+    splitter = HotKeySplitter(base, {"hot": 3})
+    hot_partitions = splitter.get_partitions(["hot"] * 9)
+    assert len(set(hot_partitions)) == 3
+    assert all(hot_partitions.count(p) == 3 for p in set(hot_partitions))
+    assert splitter.get_partitions(["cold"] * 5) == [base.get_partition("cold")] * 5
+    assert splitter.get_reducer_for_key("hot") == base.get_partition("hot")
+
+
+def test_merge_split_results():
+    outputs = [[("hot", 3), ("a", 1)], {"hot": 4, "b": 2}, [("solo", 5)]]
+    merged = merge_split_results(outputs, ["hot", "solo"], lambda key, values: sum(values))
+    assert merged == {"hot": 7, "a": 1, "b": 2, "solo": 5}
+
+
+@pytest.mark.parametrize("mode", ["simulate", "cluster"])
+def test_split_hot_keys_matches_unsplit(mode):
+    expected = DistributedMapReduce(num_mappers=3, num_reducers=4).simulate_distributed_execution(
+        LINES, word_mapper, sum_reducer)
+    dmr = DistributedMapReduce(num_mappers=3, num_reducers=4, mode=mode)
+    results = dmr.simulate_distributed_execution(LINES, word_mapper, sum_reducer, split_hot_keys=True)
+    assert results == expected
+    report = dmr.skew_report
+    assert "hot" in report.hot_keys
+    assert sum(report.reducer_values) == sum(report.unsplit_values) == sum(expected.values())
+    assert report.imbalance < report.unsplit_imbalance
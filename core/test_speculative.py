@@ -0,0 +1,79 @@
+"""core.speculative 的测试：被放弃的副本不再提交结果"""
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import pytest
+
+from core.mapreduce import MapReduce
+from core.speculative import AttemptCancelled, AttemptFence, submit_speculative
+
+
+def test_cancelled_fence_refuses_commit():
+    fence = AttemptFence(threading.Lock(), {}, (0, 1))
+    with fence.commit():
+        pass
+    fence.cancel()
+    assert fence.cancelled()
+    with pytest.raises(AttemptCancelled):
+        fence.check()
+    with pytest.raises(AttemptCancelled):
+        with fence.commit():
+            pass
+
+
+def straggling_task(out_dir, task_id, task, attempt=0, fence=None):
+    """任务0的第一个副本很慢；每个副本在围栏内写出以 任务_副本 命名的文件"""
+    time.sleep(1.0 if (task_id, attempt) == (0, 0) else 0.02)
+    with fence.commit():
+        open(os.path.join(out_dir, f"{task_id}_{attempt}"), "w").close()
+    return task
+
+
+@pytest.mark.parametrize("executor_class", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_losing_attempt_never_commits(tmp_path, executor_class):
+    executor = executor_class(max_workers=2)
+    try:
+        fn = partial(straggling_task, str(tmp_path))
+        results = dict(submit_speculative(executor, fn, range(6), num_workers=2,
+                                          attempt_kwarg="attempt", fence_kwarg="fence"))
+    finally:
+        # 等待被放弃的慢副本运行结束
+        executor.shutdown(wait=True)
+    assert results == {i: i for i in range(6)}
+    written = sorted(os.listdir(tmp_path))
+    assert "0_1" in written and "0_0" not in written
+
+
+_slow_seen = set()
+_slow_lock = threading.Lock()
+
+
+def slow_once_mapper(record):
+    """第一次处理"slow"记录时很慢，备份副本很快"""
+    if record == "slow":
+        with _slow_lock:
+            first = record not in _slow_seen
+            _slow_seen.add(record)
+        if first:
+            time.sleep(1.0)
+    yield record, 1
+
+
+def test_abandoned_map_attempt_leaves_no_files(tmp_path):
+    _slow_seen.clear()
+    data = [f"w{i % 7}" for i in range(38)] + ["slow", "w1"]
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), use_disk_storage=True, speculative=True,
+                   chunk_size=4)
+    results = mr.run(data, slow_once_mapper, lambda key, values: sum(values))
+    expected = {}
+    for record in data:
+        expected[record] = expected.get(record, 0) + 1
+    assert results == expected
+
+    # 被放弃的副本醒来后既不提交溢写文件，也不在已清理的作业目录中留下临时文件
+    time.sleep(1.2)
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("job_")]
@@ -0,0 +1,69 @@
+"""core.stats 的测试：作业统计与用户计数器"""
+
+import pytest
+
+from core.distributed import DistributedMapReduce
+from core.mapreduce import MapReduce
+from core.stats import FRAMEWORK_GROUP, counter_scope, increment_counter, percentiles
+
+
+LINES = [f"w{i % 17} w{i % 5}" for i in range(400)] + ["bad"]
+
+
+def counting_mapper(line):
+    if line == "bad":
+        raise ValueError("bad record")
+    increment_counter("lines")
+    for word in line.split():
+        increment_counter("words")
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def test_counter_scope_collects_and_restores():
+    increment_counter("ignored")  # 不在任务中时忽略
+    with counter_scope() as outer:
+        increment_counter("a")
+        with counter_scope() as inner:
+            increment_counter("a", 2, group="g")
+        increment_counter("a")
+    assert outer == {("user", "a"): 2}
+    assert inner == {("g", "a"): 2}
+
+
+@pytest.mark.parametrize("executor_type", ["thread", "process"])
+def test_job_stats_counters(tmp_path, executor_type):
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), executor_type=executor_type, chunk_size=50)
+    results, stats = mr.run(LINES, counting_mapper, sum_reducer, return_stats=True)
+    assert mr.job_stats is stats
+    assert stats.counters.get("lines") == 400
+    assert stats.counters.get("words") == 800
+    assert stats.counters.get("map_errors", FRAMEWORK_GROUP) == 1
+
+    assert {"map", "shuffle_reduce"} <= set(stats.phases)
+    assert stats.phases["map"].records_in == len(LINES)
+    assert stats.phases["map"].records_out == stats.intermediate_pairs == 800
+    assert sum(stats.partition_values.values()) == 800
+    assert sum(stats.partition_keys.values()) == len(results)
+    assert stats.skew_ratio() >= 1.0
+    assert "计数器[user]" in stats.summary()
+    assert stats.to_dict()["counters"]["user"] == {"lines": 400, "words": 800}
+
+
+def test_distributed_job_stats():
+    dmr = DistributedMapReduce(num_mappers=3, num_reducers=2)
+    results, stats = dmr.simulate_distributed_execution(LINES[:-1], counting_mapper, sum_reducer,
+                                                        return_stats=True)
+    assert dmr.job_stats is stats
+    assert sum(results.values()) == 800
+    assert stats.counters.get("lines") == 400
+    assert stats.counters.get("words") == 800
+
+
+def test_percentiles():
+    assert percentiles([]) == {}
+    result = percentiles([float(i) for i in range(1, 101)])
+    assert result["p50"] <= result["p90"] <= result["p99"] <= 100
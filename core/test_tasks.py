@@ -0,0 +1,58 @@
+"""core.tasks 的测试：按批归约与批量reducer"""
+
+from core.mapreduce import MapReduce
+from core.tasks import batch_reducer, reduce_batch_task
+
+
+BATCH = [(f"k{i}", [i, i]) for i in range(10)]
+
+
+def test_plain_reducer_drops_failed_and_none_keys():
+    def reducer(key, values):
+        if key == "k3":
+            raise ValueError("bad key")
+        return None if key == "k4" else sum(values)
+
+    results = reduce_batch_task(reducer, 0, BATCH)
+    assert results == [(key, sum(values)) for key, values in BATCH if key not in ("k3", "k4")]
+
+
+def test_batch_reducer_is_called_once_per_batch():
+    calls = []
+
+    @batch_reducer
+    def reducer(keys, values_lists):
+        calls.append(len(keys))
+        return [sum(values) for values in values_lists]
+
+    assert reduce_batch_task(reducer, 0, BATCH) == [(key, sum(values)) for key, values in BATCH]
+    assert calls == [len(BATCH)]
+
+
+def test_failed_batch_is_retried_per_key():
+    @batch_reducer
+    def reducer(keys, values_lists):
+        if "k3" in keys:
+            raise ValueError("bad key")
+        return [sum(values) for values in values_lists]
+
+    results = reduce_batch_task(reducer, 0, BATCH)
+    assert results == [(key, sum(values)) for key, values in BATCH if key != "k3"]
+
+
+def test_batch_result_count_mismatch_is_retried_per_key():
+    @batch_reducer
+    def reducer(keys, values_lists):
+        # 多个key时漏掉一个结果，不能按位置错配到其余key上
+        results = [sum(values) for values in values_lists]
+        return results[1:] if len(keys) > 1 else results
+
+    assert reduce_batch_task(reducer, 0, BATCH) == [(key, sum(values)) for key, values in BATCH]
+
+
+def test_batch_reducer_in_job(tmp_path):
+    lines = [f"w{i % 50} w{i % 7}" for i in range(2000)]
+    mapper = lambda line: [(word, 1) for word in line.split()]
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), reduce_batch_size=8)
+    expected = mr.run(lines, mapper, lambda key, values: sum(values))
+    assert mr.run(lines, mapper, batch_reducer(lambda keys, values_lists: [sum(v) for v in values_lists])) == expected
@@ -0,0 +1,82 @@
+"""core.tracing 的测试：span时间线与Chrome trace导出"""
+
+import json
+
+import pytest
+
+from core.distributed import DistributedMapReduce
+from core.mapreduce import MapReduce
+from core.tracing import NULL_SPAN, Trace, is_tracing, span, trace_scope
+
+
+LINES = [f"w{i % 19} w{i % 7}" for i in range(500)]
+
+
+def word_mapper(line):
+    for word in line.split():
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def test_span_is_noop_without_scope():
+    assert not is_tracing()
+    assert span("map") is NULL_SPAN
+
+
+def test_trace_scope_records_nested_spans():
+    with trace_scope() as events:
+        with span("outer", "phase", n=1) as outer:
+            with span("inner", "io"):
+                pass
+            outer.set(records=3)
+        with pytest.raises(ValueError):
+            with span("failing"):
+                raise ValueError("boom")
+    assert not is_tracing()
+
+    trace = Trace()
+    trace.extend(events)
+    assert [event["name"] for event in trace.spans()] == ["outer", "inner", "failing"]
+    outer, inner, failing = trace.spans()
+    assert outer["args"] == {"n": 1, "records": 3}
+    assert outer["ts"] <= inner["ts"] and inner["dur"] <= outer["dur"]
+    assert failing["args"]["error"] == "ValueError"
+
+
+@pytest.mark.parametrize("options", [{}, {"use_disk_storage": True, "executor_type": "process"}])
+def test_mapreduce_trace(tmp_path, options):
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), trace=True, **options)
+    results, stats = mr.run(LINES, word_mapper, sum_reducer, return_stats=True)
+    trace = stats.trace
+    names = {event["name"] for event in trace.spans()}
+    assert {"map", "shuffle_reduce", "group", "reduce_batch"} <= names
+    if options:
+        assert "spill" in names
+    assert sum(event["args"]["results"] for event in trace.spans("reduce_batch")) == len(results)
+
+    path = trace.save(str(tmp_path / "trace.json"))
+    with open(path, encoding="utf-8") as f:
+        chrome = json.load(f)
+    phases = [event["ph"] for event in chrome["traceEvents"]]
+    assert set(phases) == {"M", "X"}
+    # 元数据事件在前，完整事件按开始时间排序
+    assert phases == sorted(phases, key=lambda ph: ph != "M")
+
+
+def test_trace_disabled_by_default(tmp_path):
+    _, stats = MapReduce(num_workers=2, temp_dir=str(tmp_path)).run(LINES, word_mapper, sum_reducer,
+                                                                    return_stats=True)
+    assert stats.trace is None
+
+
+@pytest.mark.parametrize("mode", ["simulate", "cluster"])
+def test_distributed_trace(mode):
+    dmr = DistributedMapReduce(num_mappers=2, num_reducers=2, mode=mode, trace=True)
+    _, stats = dmr.simulate_distributed_execution(LINES, word_mapper, sum_reducer, return_stats=True)
+    assert {"map", "reduce"} <= {event["name"] for event in stats.trace.spans()}
+    if mode == "cluster":
+        # 各节点进程的span随节点统计一起发回
+        assert len({event["pid"] for event in stats.trace.spans()}) > 1
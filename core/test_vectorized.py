@@ -0,0 +1,40 @@
+"""core.vectorized 的测试：数组上的分区计算与逐key分区一致"""
+
+from collections import Counter
+
+import pytest
+
+from core.partitioner import Partitioner
+
+np = pytest.importorskip("numpy")
+
+from core.vectorized import partition_ids, split_by_partition  # noqa: E402
+
+
+@pytest.mark.parametrize("dtype", ["int64", "int32", "uint64", "uint8"])
+@pytest.mark.parametrize("num_partitions", [1, 3, 8, 16])
+def test_array_and_scalar_partitions_agree(dtype, num_partitions):
+    info = np.iinfo(dtype)
+    keys = [0, 1, 2, 255, info.max, info.min, info.max // 3] + list(range(0, 4096, 4))
+    if info.min < 0:
+        keys += [-1, -2, -1000, info.min + 1]
+    array = np.array([key for key in keys if info.min <= key <= info.max], dtype=dtype)
+    partitioner = Partitioner(num_partitions)
+    expected = [partitioner.get_partition(int(key)) for key in array]
+    assert partition_ids(partitioner, array).tolist() == expected
+
+
+def test_strided_keys_spread_over_partitions():
+    keys = np.arange(0, 8 * 10000, 8, dtype=np.int64)
+    counts = Counter(partition_ids(Partitioner(8), keys).tolist())
+    assert len(counts) == 8
+    assert max(counts.values()) <= len(keys) / 8 * 1.2
+
+
+def test_split_by_partition_matches_scalar_partitioner():
+    partitioner = Partitioner(4)
+    keys = np.array([5, -7, 12, 5, 2 ** 40], dtype=np.int64)
+    values = np.arange(len(keys))
+    for pid, (part_keys, (part_values,)) in split_by_partition(partitioner, keys, [values]).items():
+        assert all(partitioner.get_partition(int(key)) == pid for key in part_keys)
+        assert part_keys.tolist() == keys[part_values].tolist()
@@ -0,0 +1,207 @@
+"""
+NumPy批量（向量化）map/reduce
+
+逐条处理时每个键值对都要经过一次生成器yield、一个元组和一次分区器调用。
+批量mapper一次处理整个数据块，返回key数组和value数组；之后的预聚合、分区和分组
+都在数组上完成：
+    - map端按key排序后用 ufunc.reduceat 预聚合为每个key一条部分结果；
+    - 整数key的哈希分区直接在数组上计算（与 stable_hash 结果一致）；
+    - reduce端把各数据块的部分结果拼接后再做一次排序和 reduceat 合并。
+
+内置的向量化reducer为 "sum"/"count"/"mean"/"min"/"max"；也可以使用普通reducer，
+此时只有分组是向量化的，reducer仍按key调用。
+
+numpy是可选依赖，只有使用批量mapper时才需要。
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy是可选依赖
+    np = None
+
+from utils.chunking import iter_chunks
+from core.partitioner import Partitioner, SPLITMIX_GAMMA, SPLITMIX_MUL1, SPLITMIX_MUL2
+from core.tasks import reduce_batch_task, DEFAULT_REDUCE_BATCH_SIZE
+
+
+# 内置向量化reducer: (map端初始部分结果的构造方式, 合并部分结果的ufunc名称)
+# 部分结果的构造方式: "values" 使用value本身，"ones" 每条记录计数1
+VECTORIZED_REDUCERS = {
+    "sum": (("values",), ("add",)),
+    "count": (("ones",), ("add",)),
+    "mean": (("values", "ones"), ("add", "add")),
+    "min": (("values",), ("minimum",)),
+    "max": (("values",), ("maximum",)),
+}
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("批量(向量化)模式需要安装numpy: pip install numpy")
+
+
+def batch_mapper(func: Callable[[List[Any]], Tuple[Any, Any]]) -> Callable:
+    """
+    把函数标记为批量mapper
+
+    批量mapper的签名为 func(records) -> (keys, values)，一次处理一个数据块，
+    返回长度相同的key数组和value数组（numpy数组或可以转换为数组的序列）。
+    """
+    func.is_batch_mapper = True
+    return func
+
+
+def is_batch_mapper(mapper: Callable) -> bool:
+    return getattr(mapper, "is_batch_mapper", False)
+
+
+def batch_sample_keys(mapper: Callable, records: List[Any]) -> List[Any]:
+    """对样本记录执行批量mapper，返回Python对象形式的key（用于拟合范围分区器）"""
+    if not records:
+        return []
+    keys, _ = _as_arrays(*mapper(records))
+    return keys.tolist()
+
+
+def resolve_vectorized_reducer(reducer: Any) -> Optional[str]:
+    """内置向量化reducer返回其名称，普通reducer返回None"""
+    if isinstance(reducer, str):
+        if reducer not in VECTORIZED_REDUCERS:
+            raise ValueError(f"未知的向量化reducer: {reducer}，可选: {list(VECTORIZED_REDUCERS)}")
+        return reducer
+    return None
+
+
+def _as_arrays(keys: Any, values: Any) -> Tuple[Any, Any]:
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+    if keys.shape != values.shape or keys.ndim != 1:
+        raise ValueError(f"批量mapper返回的key和value数组长度不一致: {keys.shape} vs {values.shape}")
+    return keys, values
+
+
+def _initial_partials(values: Any, reducer_name: str) -> Tuple[Any, ...]:
+    """map端每条记录的初始部分结果"""
+    sources, _ = VECTORIZED_REDUCERS[reducer_name]
+    return tuple(values if source == "values" else np.ones(len(values), dtype=np.int64)
+                 for source in sources)
+
+
+def aggregate(keys: Any, partials: Sequence[Any], reducer_name: str) -> Tuple[Any, Tuple[Any, ...]]:
+    """
+    按key合并部分结果
+
+    Returns:
+        (排序后的唯一key数组, 每个部分结果数组按key合并后的结果)
+    """
+    _, ufunc_names = VECTORIZED_REDUCERS[reducer_name]
+    if len(keys) == 0:
+        return keys, tuple(partials)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    merged = tuple(getattr(np, name).reduceat(partial[order], starts)
+                   for name, partial in zip(ufunc_names, partials))
+    return sorted_keys[starts], merged
+
+
+def finalize(partials: Tuple[Any, ...], reducer_name: str) -> Any:
+    """由合并后的部分结果计算最终值"""
+    if reducer_name == "mean":
+        sums, counts = partials
+        return sums / counts
+    return partials[0]
+
+
+def int_hash_array(keys: Any) -> Any:
+    """core.partitioner.int_hash 的数组版本：uint64运算自然按2**64回绕"""
+    z = keys.astype(np.uint64) + np.uint64(SPLITMIX_GAMMA)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(SPLITMIX_MUL1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(SPLITMIX_MUL2)
+    return (z ^ (z >> np.uint64(31))) >> np.uint64(32)
+
+
+def partition_ids(partitioner: Partitioner, keys: Any) -> Any:
+    """
+    计算key数组的分区编号
+
+    默认哈希分区器遇到整数key时直接在数组上计算，其余情况调用分区器的批量接口。
+    """
+    if type(partitioner) is Partitioner and keys.dtype.kind in "iu":
+        return (int_hash_array(keys) % np.uint64(partitioner.num_partitions)).astype(np.int64)
+    return np.asarray(partitioner.get_partitions(keys.tolist()), dtype=np.int64)
+
+
+def split_by_partition(partitioner: Partitioner, keys: Any,
+                       arrays: Sequence[Any]) -> Dict[int, Tuple[Any, Tuple[Any, ...]]]:
+    """把key数组及对应的数组按分区拆分，返回 {分区编号: (keys, arrays)}"""
+    if len(keys) == 0:
+        return {}
+    pids = partition_ids(partitioner, keys)
+    order = np.argsort(pids, kind="stable")
+    sorted_pids = pids[order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_pids[1:] != sorted_pids[:-1])))
+    ends = np.append(starts[1:], len(order))
+    result = {}
+    for start, end in zip(starts, ends):
+        index = order[start:end]
+        result[int(sorted_pids[start])] = (keys[index], tuple(array[index] for array in arrays))
+    return result
+
+
+def vectorized_map_task(mapper: Callable, reducer_name: Optional[str], partitioner: Partitioner,
+                        chunk_id: int, chunk: List[Any]) -> Dict[int, Tuple[Any, Tuple[Any, ...]]]:
+    """
+    对一个数据块执行批量mapper，预聚合并按分区拆分
+
+    Returns:
+        {分区编号: (keys, 部分结果数组元组)}；普通reducer时不预聚合，部分结果为 (values,)
+    """
+    if not isinstance(chunk, list):
+        # 文件输入切分：读取本任务的字节范围
+        chunk = list(chunk)
+    keys, values = _as_arrays(*mapper(chunk))
+    if reducer_name is None:
+        return split_by_partition(partitioner, keys, (values,))
+    keys, partials = aggregate(keys, _initial_partials(values, reducer_name), reducer_name)
+    return split_by_partition(partitioner, keys, partials)
+
+
+def vectorized_reduce_task(reducer: Any, reducer_name: Optional[str], partition_id: int,
+                           parts: List[Tuple[Any, Tuple[Any, ...]]],
+                           output=None, fence=None) -> Union[List[Tuple[Any, Any]], Dict[str, Any]]:
+    """
+    合并一个分区内各数据块的输出
+
+    Returns:
+        按key排序的 [(key, result), ...]；指定output（OutputSink）时写入编号为partition_id的分片，
+        返回分片摘要；推测执行时被放弃的副本（见fence）不再替换分片
+    """
+    results = _reduce_parts(reducer, reducer_name, parts)
+    if output is not None:
+        return output.write_shard(partition_id, results, fence=fence)
+    return list(results)
+
+
+def _reduce_parts(reducer: Any, reducer_name: Optional[str],
+                  parts: List[Tuple[Any, Tuple[Any, ...]]]) -> Iterator[Tuple[Any, Any]]:
+    """合并各数据块的部分结果，按key顺序返回 (key, result) 流"""
+    keys = np.concatenate([part_keys for part_keys, _ in parts])
+    arrays = [np.concatenate([part_arrays[i] for _, part_arrays in parts])
+              for i in range(len(parts[0][1]))]
+
+    if reducer_name is not None:
+        keys, partials = aggregate(keys, arrays, reducer_name)
+        return zip(keys.tolist(), finalize(partials, reducer_name).tolist())
+
+    # 普通reducer：向量化分组后按key调用
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    sorted_values = arrays[0][order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    groups = zip(sorted_keys[starts].tolist(), np.split(sorted_values, starts[1:]))
+    items = ((key, values.tolist()) for key, values in groups)
+    return (result for batch_id, batch in enumerate(iter_chunks(items, DEFAULT_REDUCE_BATCH_SIZE))
+            for result in reduce_batch_task(reducer, batch_id, batch))
@@ -4,8 +4,11 @@ MapReduce框架使用演示
 放在项目根目录下运行
 """
 
+import asyncio
+import shutil
 import sys
 import os
+import tempfile
 import time
 
 # 添加当前目录到Python路径
@@ -13,8 +16,13 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from core.mapreduce import MapReduce
 from core.distributed import DistributedMapReduce
+from core.pipeline import Pipeline
+from core.vectorized import batch_mapper
+from storage.input_format import FileInput
+from storage.output_sink import OutputSink
 from examples.word_count import word_count_mapper, word_count_reducer
 from examples.inverted_index import inverted_index_mapper, inverted_index_reducer
+from benchmarks.harness import run_suite, format_result
 
 
 def word_count_demo():
@@ -37,23 +45,36 @@ def word_count_demo():
     # 使用基本MapReduce
     print("\n1. 基本MapReduce版本:")
     mr = MapReduce(num_workers=2)
-    results = mr.run(documents, word_count_mapper, word_count_reducer)
+    results, stats = mr.run(documents, word_count_mapper, word_count_reducer, return_stats=True)
 
     print("词频统计结果:")
     for word, count in sorted(results.items(), key=lambda x: x[1], reverse=True):
         print(f"  {word}: {count}")
+    print("作业统计:")
+    print(stats.summary())
 
     # 使用分布式版本
     print("\n2. 分布式MapReduce版本:")
     dmr = DistributedMapReduce(num_mappers=2, num_reducers=2)
     distributed_results = dmr.simulate_distributed_execution(
-        documents, word_count_mapper, word_count_reducer
+        documents, word_count_mapper, word_count_reducer, combiner="sum"
     )
 
     print("分布式词频统计结果:")
     for word, count in sorted(distributed_results.items(), key=lambda x: x[1], reverse=True)[:5]:
         print(f"  {word}: {count}")
 
+    # 使用本地多进程集群
+    print("\n3. 本地集群版本:")
+    cluster = DistributedMapReduce(num_mappers=2, num_reducers=2, mode="cluster")
+    cluster_results = cluster.simulate_distributed_execution(
+        documents, word_count_mapper, word_count_reducer
+    )
+    print(f"本地集群结果与分布式模拟一致: {cluster_results == distributed_results}")
+    for transfer in cluster.transfer_stats:
+        print(f"  Mapper {transfer.mapper_id + 1} -> Reducer {transfer.reducer_id + 1}: "
+              f"{transfer.num_bytes} 字节, {transfer.transfer_seconds * 1000:.2f}毫秒")
+
 
 def inverted_index_demo():
     """倒排索引演示"""
@@ -78,22 +99,14 @@ def inverted_index_demo():
 
 
 def performance_demo():
-    """性能测试演示"""
+    """性能测试演示（完整的基准测试见 python -m benchmarks）"""
     print("\n" + "=" * 60)
     print("性能测试")
     print("=" * 60)
 
-    # 创建大数据集
-    large_data = ["hello world mapreduce big data " * 10] * 500
-    print(f"测试数据量: {len(large_data)} 条记录")
-
-    print("\n不同worker数量的性能对比:")
-    for workers in [1, 2, 4, 8]:
-        mr = MapReduce(num_workers=workers)
-        start = time.time()
-        results = mr.run(large_data, word_count_mapper, word_count_reducer)
-        end = time.time()
-        print(f"  Workers: {workers}, 耗时: {end - start:.3f}秒, 唯一单词数: {len(results)}")
+    print("\nZipf词频数据集上不同引擎、存储模式和worker数量的吞吐量对比:")
+    run_suite(["zipf"], storage_modes=["memory", "disk"], workers=[1, 2, 4], repeats=2,
+              progress=lambda result: print(f"  {format_result(result)}"))
 
 
 def disk_storage_demo():
@@ -108,19 +121,60 @@ def disk_storage_demo():
         "mapreduce is powerful"
     ]
 
-    # 使用磁盘存储模式
-    mr_disk = MapReduce(num_workers=2, use_disk_storage=True, temp_dir="./temp_demo")
-    results = mr_disk.run(documents, word_count_mapper, word_count_reducer)
+    # 使用磁盘存储模式，同时记录执行时间线
+    mr_disk = MapReduce(num_workers=2, use_disk_storage=True, temp_dir="./temp_demo", trace=True)
+    results, stats = mr_disk.run(documents, word_count_mapper, word_count_reducer, return_stats=True)
 
     print("磁盘存储模式结果:")
     for word, count in sorted(results.items()):
         print(f"  {word}: {count}")
 
+    trace_path = stats.trace.save(os.path.join(tempfile.gettempdir(), "mapreduce_trace.json"))
+    span_names = sorted({event["name"] for event in stats.trace.spans()})
+    print(f"执行时间线: {len(stats.trace.spans())} 个span（{', '.join(span_names)}）")
+    print(f"已导出Chrome trace: {trace_path}（可在 https://ui.perfetto.dev 中打开）")
+
     # 清理临时文件
     if hasattr(mr_disk, 'file_manager'):
         mr_disk.file_manager.cleanup()
 
 
+def file_input_demo():
+    """文件输入演示：map任务按字节范围各自读取文件"""
+    print("\n" + "=" * 60)
+    print("文件输入：倒排索引")
+    print("=" * 60)
+
+    input_dir = tempfile.mkdtemp(prefix="mapreduce_input_")
+    try:
+        # 每行一个文档: 文档ID<TAB>文本
+        with open(os.path.join(input_dir, "docs.tsv"), "w", encoding="utf-8") as f:
+            f.write("1\tapple banana orange\n")
+            f.write("2\tbanana cherry apple\n")
+            f.write("3\torange peach apple\n")
+            f.write("4\tbanana apple grape\n")
+
+        file_input = FileInput(input_dir, input_format="documents", use_mmap=True)
+        print(f"输入切分: {file_input.splits(2)}")
+        mr = MapReduce(num_workers=2)
+        results = mr.run(file_input, inverted_index_mapper, inverted_index_reducer)
+
+        print("倒排索引结果:")
+        for word, doc_ids in sorted(results.items()):
+            print(f"  {word}: {sorted(doc_ids)}")
+
+        # 结果较大时每个Reduce任务直接写出自己的分片文件，不在内存中合并
+        output_dir = os.path.join(input_dir, "_index")
+        manifest = mr.run(file_input, inverted_index_mapper, inverted_index_reducer,
+                          output=OutputSink(output_dir, sort_keys=True))
+        print(f"分片输出: {[os.path.basename(path) for path in manifest.files()]}, "
+              f"共 {manifest.total_records} 条, {manifest.total_bytes} 字节")
+        word, doc_ids = next(iter(manifest))
+        print(f"  第一个分片的首条记录: {word}: {doc_ids}")
+    finally:
+        shutil.rmtree(input_dir, ignore_errors=True)
+
+
 def custom_example_demo():
     """自定义MapReduce示例"""
     print("\n" + "=" * 60)
@@ -153,12 +207,110 @@ def custom_example_demo():
         return total / count if count > 0 else 0
 
     mr = MapReduce(num_workers=2)
-    results = mr.run(sales_data, average_mapper, average_reducer)
+    results = mr.run(sales_data, average_mapper, average_reducer, combiner="mean")
 
     print("各类别平均销售额:")
     for category, avg in sorted(results.items()):
         print(f"  {category}: ${avg:.2f}")
 
+    try:
+        import numpy as np
+    except ImportError:
+        print("未安装numpy，跳过向量化版本")
+        return
+
+    @batch_mapper
+    def average_batch_mapper(records):
+        """批量Map函数：一次返回整个数据块的类别数组和销售额数组"""
+        categories, values = zip(*records)
+        return np.array(categories), np.array(values, dtype=np.float64)
+
+    vectorized_results = mr.run(sales_data, average_batch_mapper, "mean")
+    print(f"向量化版本（内置mean reducer）结果一致: {vectorized_results == results}")
+
+
+def pipeline_demo():
+    """多阶段流水线演示：词频统计 -> Top-K"""
+    print("\n" + "=" * 60)
+    print("多阶段流水线：词频统计 -> Top-3")
+    print("=" * 60)
+
+    documents = [
+        "Hello world",
+        "hello mapreduce",
+        "mapreduce is powerful",
+        "big data processing with mapreduce",
+        "hello big data world",
+        "",
+    ]
+
+    def top_mapper(item):
+        """把所有 (单词, 次数) 发往同一个key"""
+        word, count = item
+        yield ("top", (count, word))
+
+    def top_reducer(key, values):
+        return sorted(values, reverse=True)[:3]
+
+    pipeline = (Pipeline(num_workers=2)
+                .filter(lambda doc: doc.strip(), name="非空文档")
+                .map(str.lower, name="转小写")
+                .map_reduce(word_count_mapper, word_count_reducer, combiner="sum")
+                .map_reduce(top_mapper, top_reducer)
+                .flat_map(lambda item: item[1], name="展开Top-K"))
+    print("执行计划（连续的map-only阶段已融合）:")
+    print(pipeline.explain())
+
+    print("Top-3单词:")
+    for count, word in pipeline.run(documents):
+        print(f"  {word}: {count}")
+
+
+def async_mapper_demo():
+    """async def mapper演示：I/O等待在事件循环上重叠"""
+    print("\n" + "=" * 60)
+    print("async mapper：并发执行I/O密集的map函数")
+    print("=" * 60)
+
+    async def fetch_length_mapper(url):
+        """模拟请求一个页面（耗时20ms），按域名统计页面总长度"""
+        await asyncio.sleep(0.02)
+        domain = url.split("/")[2]
+        yield (domain, len(url))
+
+    urls = [f"http://site{i % 5}.example/page/{i}" for i in range(500)]
+    mr = MapReduce(num_workers=2, async_concurrency=200)
+    results, stats = mr.run(urls, fetch_length_mapper, word_count_reducer, return_stats=True)
+
+    print(f"500个请求（每个20ms，2个worker）耗时: {stats.total_seconds:.2f}秒")
+    for domain, total in sorted(results.items()):
+        print(f"  {domain}: {total}")
+
+
+def memoize_demo():
+    """mapper记忆化演示：重复的日志行只解析一次"""
+    print("\n" + "=" * 60)
+    print("mapper记忆化：重复记录复用mapper输出")
+    print("=" * 60)
+
+    def parse_log_mapper(line):
+        """模拟较重的日志解析（每行约0.2ms），按状态码计数"""
+        deadline = time.perf_counter() + 0.0002
+        while time.perf_counter() < deadline:
+            pass
+        yield (line.rsplit(" ", 1)[-1], 1)
+
+    # 15种模板化的日志行重复出现
+    templates = [f"GET /api/item/{i % 10} HTTP/1.1 {200 if i % 4 else 404}" for i in range(20)]
+    lines = [templates[i % len(templates)] for i in range(5000)]
+
+    for memoize in (False, True):
+        mr = MapReduce(num_workers=2, memoize_mapper=memoize)
+        results, stats = mr.run(lines, parse_log_mapper, word_count_reducer, combiner="sum", return_stats=True)
+        print(f"memoize_mapper={memoize}: 耗时 {stats.total_seconds:.2f}秒, 结果 {dict(sorted(results.items()))}")
+    memo = stats.mapper_memo()
+    print(f"命中率 {memo['hit_rate']:.1%}, 缓存 {memo['entries']} 条记录的输出（{memo['bytes']} 字节）")
+
 
 def main():
     """主演示函数"""
@@ -171,7 +323,11 @@ def main():
     inverted_index_demo()
     performance_demo()
     disk_storage_demo()
+    file_input_demo()
     custom_example_demo()
+    pipeline_demo()
+    async_mapper_demo()
+    memoize_demo()
 
     print("\n" + "=" * 60)
     print("演示完成！")
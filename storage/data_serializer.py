@@ -1,14 +1,389 @@
+"""
+数据序列化器与编解码器注册表
+
+溢写文件、集群Shuffle传输和 FileManager 都通过编解码器（Codec）把对象编码为bytes，
+编解码器按名称配置，格式为 "名称" 或 "名称+压缩方式"：
+    - "pickle"：默认，最高协议的pickle；
+    - "pickle5"：pickle协议5，支持带外缓冲区的对象（numpy数组、ColumnarBuffer的定长列）
+      的数据不拷贝进pickle流，编码结果可以分段写入socket/文件，解码时直接引用负载中的内存；
+    - "marshal"：只支持内置类型（int/float/str/bytes/tuple/list/dict等），编解码开销最小；
+    - "records"：(key, value) 记录列表的紧凑二进制格式，key和value分别按列编码，
+      同类型的列使用定长数组（字符串为长度数组加拼接文本），其它类型的字段退化为逐字段编码；
+    - 压缩方式（可选）："zlib" 或 "lzma"，例如 "pickle5+zlib"。
+"""
+
+import lzma
+import marshal
 import pickle
 import json
-from typing import Any
+import struct
+import zlib
+from array import array
+from itertools import accumulate
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from utils.logger import get_logger
 
 
+DEFAULT_CODEC = "pickle"
+
+
+def _zlib_compress(data: bytes) -> bytes:
+    return zlib.compress(data, 1)
+
+
+def _lzma_compress(data: bytes) -> bytes:
+    return lzma.compress(data, preset=1)
+
+
+# 压缩方式 -> (压缩函数, 解压函数)，定义在模块级别以便编解码器可以pickle发送到进程池
+COMPRESSORS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (_zlib_compress, zlib.decompress),
+    "lzma": (_lzma_compress, lzma.decompress),
+}
+
+
+class Codec:
+    """编解码器：把一个对象编码为bytes，或从bytes解码"""
+
+    name = ""
+    # 能否编码任意可pickle的对象；为False时只支持内置类型（调用方需先转换为列表等）
+    supports_objects = True
+    # 解码结果是否可能引用输入缓冲区（零拷贝），为True时调用方需保证缓冲区在结果使用期间有效
+    decode_borrows_buffer = False
+
+    def encode(self, obj: Any) -> bytes:
+        return b"".join(self.encode_parts(obj))
+
+    def encode_parts(self, obj: Any) -> List[Union[bytes, memoryview]]:
+        """
+        编码为若干段，依次拼接即为 encode 的结果
+
+        写入socket或文件时逐段写出，带外缓冲区不需要先拼接成一个bytes。
+        """
+        return [self.encode(obj)]
+
+    def decode(self, data: Union[bytes, memoryview]) -> Any:
+        raise NotImplementedError
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r})"
+
+
+class PickleCodec(Codec):
+    name = "pickle"
+
+    def encode(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data: Union[bytes, memoryview]) -> Any:
+        return pickle.loads(data)
+
+
+# pickle5负载的头部：带外缓冲区个数，随后每个缓冲区的长度，最后是pickle流的长度
+_BUFFER_COUNT = struct.Struct("<I")
+_BUFFER_LENGTH = struct.Struct("<Q")
+
+
+class Pickle5Codec(Codec):
+    """
+    pickle协议5 + 带外缓冲区
+
+    负载布局: 缓冲区个数(uint32) | 各缓冲区长度(uint64...) | pickle流长度(uint64) | pickle流 | 缓冲区...
+    """
+
+    name = "pickle5"
+    # 带外缓冲区（如numpy数组）直接引用负载内存
+    decode_borrows_buffer = True
+
+    def encode_parts(self, obj: Any) -> List[Union[bytes, memoryview]]:
+        buffers: List[pickle.PickleBuffer] = []
+        stream = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        views = [buffer.raw() for buffer in buffers]
+        header = bytearray(_BUFFER_COUNT.pack(len(views)))
+        for view in views:
+            header += _BUFFER_LENGTH.pack(view.nbytes)
+        header += _BUFFER_LENGTH.pack(len(stream))
+        return [bytes(header), stream, *views]
+
+    def decode(self, data: Union[bytes, memoryview]) -> Any:
+        view = memoryview(data)
+        (num_buffers,) = _BUFFER_COUNT.unpack_from(view, 0)
+        offset = _BUFFER_COUNT.size
+        lengths = []
+        for _ in range(num_buffers + 1):
+            lengths.append(_BUFFER_LENGTH.unpack_from(view, offset)[0])
+            offset += _BUFFER_LENGTH.size
+        stream_length = lengths.pop()
+        stream = view[offset:offset + stream_length]
+        offset += stream_length
+        buffers = []
+        for length in lengths:
+            buffers.append(view[offset:offset + length])
+            offset += length
+        return pickle.loads(stream, buffers=buffers)
+
+
+class MarshalCodec(Codec):
+    name = "marshal"
+    supports_objects = False
+
+    def encode(self, obj: Any) -> bytes:
+        try:
+            return marshal.dumps(obj)
+        except ValueError as e:
+            raise ValueError(f"marshal只支持内置类型，无法编码 {type(obj).__name__}: {e}") from e
+
+    def decode(self, data: Union[bytes, memoryview]) -> Any:
+        return marshal.loads(data)
+
+
+# records格式的列类型：同一列全部为str、全部为int或全部为float时使用定长数组，否则逐字段编码
+_COLUMN_STR = 0
+_COLUMN_INT = 1
+_COLUMN_FLOAT = 2
+_COLUMN_MIXED = 3
+
+# 逐字段编码时的类型标记
+_TAG_NONE = 0
+_TAG_FALSE = 1
+_TAG_TRUE = 2
+_TAG_INT = 3
+_TAG_FLOAT = 4
+_TAG_STR = 5
+_TAG_BYTES = 6
+_TAG_PICKLE = 7
+
+_UINT8 = struct.Struct("<B")
+_UINT32 = struct.Struct("<I")
+_INT64 = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+# 按取值范围从小到大尝试的整数数组类型
+_INT_TYPECODES = ("b", "h", "i", "q")
+
+
+def _int_typecode(values: List[int]) -> Optional[str]:
+    low, high = min(values), max(values)
+    for typecode in _INT_TYPECODES:
+        bits = array(typecode).itemsize * 8 - 1
+        if -2 ** bits <= low and high < 2 ** bits:
+            return typecode
+    return None
+
+
+def _encode_column(out: bytearray, values: List[Any]):
+    types = set(map(type, values))
+    if types == {str}:
+        # 字符数组 + 拼接后的UTF-8文本，解码时整体解码后按字符数切片
+        lengths = list(map(len, values))
+        typecode = "B" if max(lengths) < 256 else "I"
+        text = "".join(values).encode("utf-8", "surrogatepass")
+        out += _UINT8.pack(_COLUMN_STR) + typecode.encode("ascii")
+        out += array(typecode, lengths).tobytes()
+        out += _UINT32.pack(len(text)) + text
+        return
+    if types == {int}:
+        typecode = _int_typecode(values)
+        if typecode is not None:
+            out += _UINT8.pack(_COLUMN_INT) + typecode.encode("ascii")
+            out += array(typecode, values).tobytes()
+            return
+    if types == {float}:
+        out += _UINT8.pack(_COLUMN_FLOAT)
+        out += array("d", values).tobytes()
+        return
+    out += _UINT8.pack(_COLUMN_MIXED)
+    for value in values:
+        _encode_field(out, value)
+
+
+def _encode_field(out: bytearray, value: Any):
+    """字段: 类型标记(1字节) | 整数/浮点数(8字节) 或 长度(uint32) + 数据"""
+    value_type = type(value)
+    if value_type is int and -2 ** 63 <= value < 2 ** 63:
+        out += _UINT8.pack(_TAG_INT) + _INT64.pack(value)
+    elif value_type is float:
+        out += _UINT8.pack(_TAG_FLOAT) + _FLOAT.pack(value)
+    elif value is None:
+        out += _UINT8.pack(_TAG_NONE)
+    elif value_type is bool:
+        out += _UINT8.pack(_TAG_TRUE if value else _TAG_FALSE)
+    else:
+        if value_type is str:
+            tag, data = _TAG_STR, value.encode("utf-8", "surrogatepass")
+        elif value_type is bytes:
+            tag, data = _TAG_BYTES, value
+        else:
+            tag, data = _TAG_PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        out += _UINT8.pack(tag) + _UINT32.pack(len(data))
+        out += data
+
+
+def _decode_column(view: memoryview, offset: int, count: int) -> Tuple[List[Any], int]:
+    kind = view[offset]
+    offset += 1
+    if kind == _COLUMN_STR:
+        lengths = array(chr(view[offset]))
+        offset += 1
+        end = offset + lengths.itemsize * count
+        lengths.frombytes(view[offset:end])
+        (text_length,) = _UINT32.unpack_from(view, end)
+        offset = end + _UINT32.size
+        text = str(view[offset:offset + text_length], "utf-8", "surrogatepass")
+        ends = list(accumulate(lengths))
+        return list(map(text.__getitem__, map(slice, [0] + ends[:-1], ends))), offset + text_length
+    if kind == _COLUMN_INT or kind == _COLUMN_FLOAT:
+        column = array("d")
+        if kind == _COLUMN_INT:
+            column = array(chr(view[offset]))
+            offset += 1
+        end = offset + column.itemsize * count
+        column.frombytes(view[offset:end])
+        return column.tolist(), end
+    if kind != _COLUMN_MIXED:
+        raise ValueError(f"无效的records列类型: {kind}")
+    values = []
+    for _ in range(count):
+        value, offset = _decode_field(view, offset)
+        values.append(value)
+    return values, offset
+
+
+def _decode_field(view: memoryview, offset: int) -> Tuple[Any, int]:
+    tag = view[offset]
+    offset += 1
+    if tag == _TAG_INT:
+        return _INT64.unpack_from(view, offset)[0], offset + _INT64.size
+    if tag == _TAG_FLOAT:
+        return _FLOAT.unpack_from(view, offset)[0], offset + _FLOAT.size
+    if tag == _TAG_NONE:
+        return None, offset
+    if tag == _TAG_FALSE or tag == _TAG_TRUE:
+        return tag == _TAG_TRUE, offset
+    (length,) = _UINT32.unpack_from(view, offset)
+    offset += _UINT32.size
+    end = offset + length
+    if tag == _TAG_STR:
+        return str(view[offset:end], "utf-8", "surrogatepass"), end
+    if tag == _TAG_BYTES:
+        return bytes(view[offset:end]), end
+    if tag == _TAG_PICKLE:
+        return pickle.loads(view[offset:end]), end
+    raise ValueError(f"无效的records字段类型标记: {tag}")
+
+
+class RecordCodec(Codec):
+    """
+    (key, value) 记录列表的紧凑二进制格式
+
+    负载布局: 记录数(uint32) | key列 | value列
+    每列先写1字节列类型：
+        - 全部为str：长度数组（uint8或uint32）+ 拼接后的UTF-8文本（surrogatepass，
+          孤立的代理字符也能往返，如 os.fsdecode 得到的文件名）；
+        - 全部为int：能容纳所有值的最小定长整数数组（1/2/4/8字节）；
+        - 全部为float：8字节浮点数组；
+        - 其它：逐字段编码，类型标记 + 定长数值或长度前缀的数据，非内置类型的字段用pickle。
+    """
+
+    name = "records"
+    supports_objects = False
+
+    def encode(self, obj: Any) -> bytes:
+        if not isinstance(obj, (list, tuple)):
+            raise ValueError(f"records编解码器只能编码 (key, value) 记录列表，收到 {type(obj).__name__}")
+        try:
+            keys, values = zip(*obj) if obj else ((), ())
+        except ValueError:
+            raise ValueError("records编解码器的记录必须是 (key, value) 二元组") from None
+        out = bytearray(_UINT32.pack(len(obj)))
+        if obj:
+            _encode_column(out, list(keys))
+            _encode_column(out, list(values))
+        return bytes(out)
+
+    def decode(self, data: Union[bytes, memoryview]) -> List[Tuple[Any, Any]]:
+        view = memoryview(data)
+        (count,) = _UINT32.unpack_from(view, 0)
+        if count == 0:
+            return []
+        keys, offset = _decode_column(view, _UINT32.size, count)
+        values, _ = _decode_column(view, offset, count)
+        return list(zip(keys, values))
+
+
+class CompressedCodec(Codec):
+    """在另一个编解码器的输出上做压缩"""
+
+    def __init__(self, codec: Codec, compression: str):
+        self.codec = codec
+        self.compression = compression
+        self.name = f"{codec.name}+{compression}"
+        self.supports_objects = codec.supports_objects
+        self._compress, self._decompress = COMPRESSORS[compression]
+
+    def encode(self, obj: Any) -> bytes:
+        return self._compress(self.codec.encode(obj))
+
+    def decode(self, data: Union[bytes, memoryview]) -> Any:
+        return self.codec.decode(self._decompress(data))
+
+
+CODECS: Dict[str, Callable[[], Codec]] = {
+    "pickle": PickleCodec,
+    "pickle5": Pickle5Codec,
+    "marshal": MarshalCodec,
+    "records": RecordCodec,
+}
+
+
+def register_codec(name: str, factory: Callable[[], Codec]):
+    """注册自定义编解码器，factory() 返回 Codec 实例"""
+    CODECS[name] = factory
+
+
+def get_codec(spec: Union[None, str, Codec] = None) -> Codec:
+    """
+    按名称获取编解码器
+
+    Args:
+        spec: Codec实例，或 "名称[+压缩方式]"，None表示默认的pickle
+    """
+    if isinstance(spec, Codec):
+        return spec
+    name, _, compression = (spec or DEFAULT_CODEC).partition("+")
+    if name not in CODECS:
+        raise ValueError(f"未知的编解码器: {name}，可选: {list(CODECS)}")
+    if compression and compression not in COMPRESSORS:
+        raise ValueError(f"不支持的压缩方式: {compression}，可选: {list(COMPRESSORS)}")
+    codec = CODECS[name]()
+    return CompressedCodec(codec, compression) if compression else codec
+
+
 class DataSerializer:
     """数据序列化器"""
 
-    def __init__(self):
+    def __init__(self, codec: Union[None, str, Codec] = None):
+        """
+        Args:
+            codec: serialize/deserialize 使用的编解码器，见 get_codec
+        """
         self.logger = get_logger("DataSerializer")
+        self.codec = get_codec(codec)
+
+    def serialize(self, data: Any) -> bytes:
+        """使用配置的编解码器序列化数据"""
+        try:
+            return self.codec.encode(data)
+        except Exception as e:
+            self.logger.error(f"{self.codec.name}序列化失败: {e}")
+            raise
+
+    def deserialize(self, data: Union[bytes, memoryview]) -> Any:
+        """使用配置的编解码器反序列化数据"""
+        try:
+            return self.codec.decode(data)
+        except Exception as e:
+            self.logger.error(f"{self.codec.name}反序列化失败: {e}")
+            raise
 
     def serialize_pickle(self, data: Any) -> bytes:
         """使用pickle序列化数据"""
@@ -40,4 +415,4 @@ class DataSerializer:
             return json.loads(data)
         except Exception as e:
             self.logger.error(f"JSON反序列化失败: {e}")
-            raise
\ No newline at end of file
+            raise
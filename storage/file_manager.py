@@ -1,15 +1,34 @@
 import os
-import pickle
-from typing import Any
+import shutil
+import uuid
+from typing import Any, Iterable, Iterator, Optional
 from utils.logger import get_logger
+from storage.data_serializer import DataSerializer
+from storage.spill_format import SpillWriter, read_spill, spill_record_count
+from core.tracing import span
 
 
 class FileManager:
     """文件管理器，用于处理中间结果的磁盘存储"""
 
-    def __init__(self, base_dir: str = "./temp_mapreduce"):
+    def __init__(self, base_dir: str = "./temp_mapreduce", compression: Optional[str] = None,
+                 use_mmap: bool = False, codec: Optional[str] = None):
+        """
+        Args:
+            base_dir: 临时文件根目录
+            compression: 溢写文件的压缩方式，None、"zlib"或"lzma"
+            use_mmap: 读取溢写文件时是否使用mmap
+            codec: 编解码器名称（见 storage.data_serializer），用于溢写文件的帧负载和 save_data，
+                默认pickle
+        """
         self.base_dir = base_dir
+        self.compression = compression
+        self.use_mmap = use_mmap
+        self.codec = codec
+        self.serializer = DataSerializer(codec)
         self.logger = get_logger("FileManager")
+        self._jobs = set()
+        self._files = set()
         self._ensure_directory_exists()
 
     def _ensure_directory_exists(self):
@@ -31,8 +50,9 @@ class FileManager:
         """
         filepath = os.path.join(self.base_dir, filename)
         try:
-            with open(filepath, 'wb') as f:
-                pickle.dump(data, f)
+            with span("save_data", "io", file=filename), open(filepath, 'wb') as f:
+                f.writelines(self.serializer.codec.encode_parts(data))
+            self._files.add(filename)
             self.logger.debug(f"数据已保存到: {filepath}")
             return filepath
         except Exception as e:
@@ -51,20 +71,135 @@ class FileManager:
         """
         filepath = os.path.join(self.base_dir, filename)
         try:
-            with open(filepath, 'rb') as f:
-                data = pickle.load(f)
+            with span("load_data", "io", file=filename), open(filepath, 'rb') as f:
+                data = self.serializer.deserialize(f.read())
             self.logger.debug(f"从文件加载数据: {filepath}")
             return data
         except Exception as e:
             self.logger.error(f"加载数据失败: {e}")
             raise
 
-    def cleanup(self):
-        """清理临时文件"""
+    def start_job(self, job_id: Optional[str] = None) -> str:
+        """
+        为一个作业创建独立的临时子目录
+
+        Args:
+            job_id: 作业ID，默认随机生成
+
+        Returns:
+            作业ID
+        """
+        job_id = job_id or uuid.uuid4().hex[:12]
+        os.makedirs(os.path.join(self.base_dir, self.job_dir(job_id)), exist_ok=True)
+        self._jobs.add(job_id)
+        return job_id
+
+    @staticmethod
+    def job_dir(job_id: str) -> str:
+        """作业目录相对于base_dir的路径"""
+        return f"job_{job_id}"
+
+    def job_file(self, job_id: str, filename: str) -> str:
+        """作业内文件的相对路径，可直接传给本类的读写方法"""
+        return os.path.join(self.job_dir(job_id), filename)
+
+    def save_records(self, records: Iterable[Any], filename: str) -> str:
+        """
+        以分帧二进制格式流式保存记录，格式见 storage.spill_format
+
+        Args:
+            records: 记录迭代器
+            filename: 文件名（相对base_dir）
+
+        Returns:
+            文件路径
+        """
+        filepath = os.path.join(self.base_dir, filename)
         try:
-            for filename in os.listdir(self.base_dir):
-                filepath = os.path.join(self.base_dir, filename)
+            with span("spill", "io", file=filename) as spill_span:
+                with SpillWriter(filepath, compression=self.compression, codec=self.codec) as writer:
+                    writer.write_all(records)
+                spill_span.set(records=writer.records_written, bytes=writer.bytes_written)
+            self.logger.debug(f"记录流已保存到: {filepath}")
+            return filepath
+        except Exception as e:
+            self.logger.error(f"保存记录流失败: {e}")
+            raise
+
+    def iter_records(self, filename: str) -> Iterator[Any]:
+        """
+        流式读取 save_records 写入的记录
+
+        Args:
+            filename: 文件名（相对base_dir）
+
+        Yields:
+            记录
+        """
+        filepath = os.path.join(self.base_dir, filename)
+        try:
+            yield from read_spill(filepath, use_mmap=self.use_mmap)
+        except Exception as e:
+            self.logger.error(f"读取记录流失败: {e}")
+            raise
+
+    def record_count(self, filename: str) -> int:
+        """溢写文件中的记录数"""
+        return spill_record_count(os.path.join(self.base_dir, filename))
+
+    def file_size(self, filename: str) -> int:
+        return os.path.getsize(os.path.join(self.base_dir, filename))
+
+    def commit_file(self, src: str, dst: str) -> str:
+        """
+        把临时文件原子地重命名为最终文件名
+
+        同一输出的多个副本可以各自写临时文件后提交，目标文件始终是某个副本的完整内容。
+
+        Returns:
+            目标文件路径
+        """
+        dst_path = os.path.join(self.base_dir, dst)
+        os.replace(os.path.join(self.base_dir, src), dst_path)
+        return dst_path
+
+    def import_file(self, src_path: str, filename: str) -> str:
+        """
+        把外部文件（如缓存中的溢写文件）复制到base_dir下
+
+        Returns:
+            目标文件路径
+        """
+        dst_path = os.path.join(self.base_dir, filename)
+        shutil.copyfile(src_path, dst_path)
+        return dst_path
+
+    def remove(self, filename: str):
+        """删除单个文件"""
+        filepath = os.path.join(self.base_dir, filename)
+        try:
+            if os.path.exists(filepath):
                 os.remove(filepath)
+        except Exception as e:
+            self.logger.error(f"删除文件失败: {e}")
+
+    def cleanup_job(self, job_id: str):
+        """删除一个作业的临时目录及其中所有文件"""
+        try:
+            shutil.rmtree(os.path.join(self.base_dir, self.job_dir(job_id)), ignore_errors=True)
+            self._jobs.discard(job_id)
+            self.logger.debug(f"已清理作业临时文件: {job_id}")
+        except Exception as e:
+            self.logger.error(f"清理作业临时文件失败: {e}")
+
+    def cleanup(self):
+        """清理本文件管理器创建的临时文件和作业目录，不影响base_dir中的其他文件"""
+        try:
+            for job_id in list(self._jobs):
+                self.cleanup_job(job_id)
+            for filename in list(self._files):
+                self.remove(filename)
+            self._files.clear()
             self.logger.info(f"已清理临时目录: {self.base_dir}")
         except Exception as e:
             self.logger.error(f"清理临时文件失败: {e}")
\ No newline at end of file
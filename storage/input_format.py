@@ -0,0 +1,262 @@
+"""
+文件输入格式
+
+FileInput 把文件或目录作为MapReduce的输入，不需要先把数据读进Python列表：
+    - 协调者只按字节范围切分文件（InputSplit），每个切分边界向后对齐到下一个换行符，
+      因此每条记录完整地属于一个切分，协调者只读取边界附近的一行；
+    - 每个map任务只读取自己的字节范围（mmap或带缓冲的顺序读），读取在worker中并行进行；
+    - 每行由输入格式解析为一条记录：文本行、JSON行，或倒排索引使用的 (文档ID, 文本)；
+      无法解析的行与mapper出错的记录一样记录日志后跳过，计入 map_errors。
+"""
+
+import json
+import mmap
+import os
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+from utils.logger import get_logger
+from core.stats import increment_counter, FRAMEWORK_GROUP
+
+
+# 默认切分大小（MB），输入较小时按worker数切分
+DEFAULT_SPLIT_MB = 64
+# 切分的最小字节数，避免小文件被切得过碎
+MIN_SPLIT_BYTES = 64 * 1024
+
+logger = get_logger("mapreduce_framework")
+
+
+class InputFormat:
+    """输入格式：把一行（bytes，不含换行符）解析为一条记录"""
+
+    def parse(self, line: bytes, path: str, offset: int) -> Optional[Any]:
+        """
+        Args:
+            line: 一行内容
+            path: 所在文件
+            offset: 该行在文件中的字节偏移
+
+        Returns:
+            记录；返回None时跳过该行，抛出异常时该行计为map错误后跳过
+        """
+        raise NotImplementedError
+
+
+class TextLineFormat(InputFormat):
+    """每行一条字符串记录"""
+
+    def __init__(self, encoding: str = "utf-8"):
+        self.encoding = encoding
+
+    def parse(self, line: bytes, path: str, offset: int) -> str:
+        return line.decode(self.encoding)
+
+
+class JsonLinesFormat(InputFormat):
+    """每行一个JSON对象，跳过空行"""
+
+    def parse(self, line: bytes, path: str, offset: int) -> Optional[Any]:
+        if not line.strip():
+            return None
+        return json.loads(line)
+
+
+class DocumentFormat(InputFormat):
+    """
+    每行一个文档，解析为 (文档ID, 文本)，可直接用于 inverted_index_mapper
+
+    指定separator时每行为 "文档ID<separator>文本"，数字ID转换为int；
+    separator为None或行中没有分隔符时，以 "文件路径:字节偏移" 作为文档ID
+    （目录输入递归展开，不同子目录中可能有同名文件，因此不能只用文件名）。
+    """
+
+    def __init__(self, separator: Optional[str] = "\t", encoding: str = "utf-8"):
+        self.separator = separator
+        self.encoding = encoding
+
+    def parse(self, line: bytes, path: str, offset: int) -> Optional[Tuple[Any, str]]:
+        text = line.decode(self.encoding)
+        if not text.strip():
+            return None
+        if self.separator is not None and self.separator in text:
+            doc_id, text = text.split(self.separator, 1)
+            return (int(doc_id) if doc_id.isdigit() else doc_id), text
+        return f"{path}:{offset}", text
+
+
+INPUT_FORMATS = {
+    "text": TextLineFormat,
+    "jsonl": JsonLinesFormat,
+    "documents": DocumentFormat,
+}
+
+
+def resolve_input_format(input_format: Union[str, InputFormat]) -> InputFormat:
+    if isinstance(input_format, InputFormat):
+        return input_format
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"未知的输入格式: {input_format}，可选: {list(INPUT_FORMATS)}")
+    return INPUT_FORMATS[input_format]()
+
+
+def _strip_newline(line: bytes) -> bytes:
+    if line.endswith(b"\n"):
+        line = line[:-1]
+        if line.endswith(b"\r"):
+            line = line[:-1]
+    return line
+
+
+class InputSplit:
+    """
+    一个文件的字节范围 [start, end)，起止都在记录边界上
+
+    迭代时读取并解析该范围内的记录。只包含路径、范围和文件的修改时间，
+    可以廉价地pickle发送到进程池；结果缓存以此作为数据块的指纹，文件修改后指纹随之变化。
+    """
+
+    def __init__(self, path: str, start: int, end: int, input_format: InputFormat,
+                 use_mmap: bool = False, mtime_ns: int = 0):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.input_format = input_format
+        self.use_mmap = use_mmap
+        self.mtime_ns = mtime_ns
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return f"InputSplit({self.path!r}, {self.start}, {self.end})"
+
+    def _iter_lines(self) -> Iterator[Tuple[int, bytes]]:
+        """逐行返回 (字节偏移, 行内容)，行内容包含换行符"""
+        with open(self.path, "rb") as f:
+            if self.use_mmap:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    pos = self.start
+                    while pos < self.end:
+                        newline = mm.find(b"\n", pos, self.end)
+                        stop = self.end if newline < 0 else newline + 1
+                        yield pos, mm[pos:stop]
+                        pos = stop
+                return
+            f.seek(self.start)
+            pos = self.start
+            while pos < self.end:
+                line = f.readline()
+                if not line:
+                    return
+                yield pos, line
+                pos += len(line)
+
+    def __iter__(self) -> Iterator[Any]:
+        parse = self.input_format.parse
+        for offset, line in self._iter_lines():
+            try:
+                record = parse(_strip_newline(line), self.path, offset)
+            except Exception as e:
+                # 一行格式错误不应中止整个作业，与mapper出错的记录同样处理
+                logger.error(f"输入解析错误 {self.path}:{offset}: {e}")
+                increment_counter("map_errors", group=FRAMEWORK_GROUP)
+                continue
+            if record is not None:
+                yield record
+
+
+def _list_files(paths: Sequence[str]) -> List[str]:
+    """展开目录（递归，按路径排序），跳过以 . 或 _ 开头的隐藏/标记文件"""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith((".", "_")))
+            files.extend(os.path.join(root, name) for name in sorted(names)
+                         if not name.startswith((".", "_")))
+    return files
+
+
+def _aligned_boundaries(path: str, size: int, split_bytes: int) -> List[int]:
+    """按split_bytes计算切分起点，每个起点向后移动到下一行的开头"""
+    boundaries = [0]
+    with open(path, "rb") as f:
+        pos = split_bytes
+        while pos < size:
+            # 从pos-1读到行尾：pos-1恰好是换行符时边界就是pos
+            f.seek(pos - 1)
+            boundary = pos - 1 + len(f.readline())
+            if boundary >= size:
+                break
+            boundaries.append(boundary)
+            pos = boundary + split_bytes
+    return boundaries
+
+
+class FileInput:
+    """
+    文件/目录输入
+
+    作为 MapReduce.run 的data参数时，每个map任务处理一个InputSplit；
+    也可以直接迭代，按顺序返回所有记录。
+    """
+
+    def __init__(self, paths: Union[str, Sequence[str]], input_format: Union[str, InputFormat] = "text",
+                 split_mb: float = DEFAULT_SPLIT_MB, use_mmap: bool = False):
+        """
+        Args:
+            paths: 文件或目录路径，或它们的列表
+            input_format: "text"、"jsonl"、"documents" 或 InputFormat 实例
+            split_mb: 切分大小上限（MB）
+            use_mmap: map任务是否用mmap读取自己的字节范围，否则使用带缓冲的顺序读
+        """
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.input_format = resolve_input_format(input_format)
+        self.split_bytes = max(1, int(split_mb * 1024 * 1024))
+        self.use_mmap = use_mmap
+
+    def files(self) -> List[str]:
+        return _list_files(self.paths)
+
+    def total_bytes(self) -> int:
+        return sum(os.path.getsize(path) for path in self.files())
+
+    def splits(self, min_splits: int = 1) -> List[InputSplit]:
+        """
+        计算输入切分
+
+        Args:
+            min_splits: 期望的最少切分数（通常为worker数），输入较小时减小切分大小以便并行，
+                但每个切分不小于 MIN_SPLIT_BYTES
+
+        Returns:
+            按文件和偏移排序的切分，空文件不产生切分
+        """
+        files = [(path, os.stat(path)) for path in self.files()]
+        total = sum(stat.st_size for _, stat in files)
+        split_bytes = self.split_bytes
+        if min_splits > 1 and total:
+            split_bytes = min(split_bytes, max(MIN_SPLIT_BYTES, -(-total // min_splits)))
+
+        splits = []
+        for path, stat in files:
+            if stat.st_size == 0:
+                continue
+            boundaries = _aligned_boundaries(path, stat.st_size, split_bytes)
+            for start, end in zip(boundaries, boundaries[1:] + [stat.st_size]):
+                splits.append(InputSplit(path, start, end, self.input_format, self.use_mmap, stat.st_mtime_ns))
+        return splits
+
+    def __iter__(self) -> Iterator[Any]:
+        for split in self.splits():
+            yield from split
+
+    def __repr__(self) -> str:
+        return f"FileInput({self.paths!r})"
+
+
+def is_file_input(data: Any) -> bool:
+    return isinstance(data, FileInput)
@@ -0,0 +1,385 @@
+"""
+内容寻址的作业结果缓存
+
+以 输入数据块指纹 + mapper/reducer等函数指纹 作为key，缓存map数据块输出和最终结果。
+输入没有变化的数据块直接复用缓存的map输出，跳过map计算。
+缓存有大小上限，超过时按最近最少使用（LRU）淘汰。
+"""
+
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import sysconfig
+import threading
+import time
+from types import CodeType, ModuleType
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+from utils.logger import get_logger
+
+
+class _Miss:
+    """缓存未命中标记"""
+
+    def __repr__(self) -> str:
+        return "MISS"
+
+
+MISS = _Miss()
+
+
+# 标准库和第三方包所在的目录；其中的模块只以名称作为身份，不展开其代码
+_LIBRARY_PATHS = tuple(sorted({os.path.abspath(path) for name, path in sysconfig.get_paths().items()
+                               if name in ("stdlib", "platstdlib", "purelib", "platlib")}))
+
+
+def _is_library_module(module_name: Optional[str]) -> bool:
+    """模块是否属于标准库、内置模块或已安装的第三方包（交互式的 __main__ 等没有文件的模块不算）"""
+    if module_name in sys.builtin_module_names:
+        return True
+    module = sys.modules.get(module_name or "")
+    spec = getattr(module, "__spec__", None)
+    if getattr(spec, "origin", None) == "frozen":
+        return True
+    filename = getattr(module, "__file__", None)
+    return filename is not None and os.path.abspath(filename).startswith(_LIBRARY_PATHS)
+
+
+def _code_names(code: CodeType) -> Iterator[str]:
+    """代码对象（包括嵌套的函数、推导式）引用的全局名称和属性名"""
+    yield from code.co_names
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield from _code_names(const)
+
+
+def _update_code(h, code: CodeType):
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            _update_code(h, const)
+        else:
+            h.update(repr(const).encode())
+
+
+def _update_globals(h, func: Any, depth: int, seen: Set[int]):
+    """
+    函数通过全局名称引用的对象：辅助函数（递归展开）、类、常量，
+    以及通过 模块.属性 访问的用户模块中的函数和类
+    """
+    func_globals = getattr(func, "__globals__", None)
+    if not func_globals:
+        return
+    names = sorted(set(_code_names(func.__code__)))
+    for name in names:
+        if name not in func_globals:
+            # 内置函数或属性名
+            continue
+        value = func_globals[name]
+        h.update(f"global {name}".encode())
+        if not isinstance(value, ModuleType):
+            _update_object(h, value, depth + 1, seen)
+            continue
+        h.update(value.__name__.encode())
+        if _is_library_module(value.__name__):
+            # 标准库和已安装的包以名称和版本识别
+            h.update(repr(getattr(value, "__version__", None)).encode())
+            continue
+        for attr in names:
+            member = vars(value).get(attr)
+            if isinstance(member, type) or hasattr(member, "__code__"):
+                h.update(f"{value.__name__}.{attr}".encode())
+                _update_object(h, member, depth + 1, seen)
+
+
+def _update_class(h, cls: type, depth: int, seen: Set[int]):
+    """类：名称，以及用户定义的类（含基类）中各方法和类属性"""
+    h.update(f"class {cls.__module__}.{cls.__qualname__}".encode())
+    for klass in cls.__mro__:
+        if _is_library_module(klass.__module__):
+            continue
+        for name, attr in sorted(vars(klass).items()):
+            if name.startswith("__") and name != "__init__" and name != "__call__":
+                continue
+            if isinstance(attr, (staticmethod, classmethod)):
+                attr = attr.__func__
+            elif isinstance(attr, property):
+                attr = attr.fget
+            h.update(name.encode())
+            _update_object(h, attr, depth + 1, seen)
+
+
+def _update_object(h, obj: Any, depth: int = 0, seen: Optional[Set[int]] = None):
+    """
+    把对象的身份和状态写入哈希
+
+    函数以代码、默认参数、闭包变量和引用的全局对象为身份，对象以类的代码和实例属性为身份，
+    辅助函数或常量修改后指纹随之变化。运行时动态取得的对象（getattr、函数内import、
+    通过参数传入的可变全局状态）无法追踪，这类依赖变化时需要清空缓存目录。
+    """
+    if seen is None:
+        seen = set()
+    if depth > 8:
+        h.update(repr(type(obj)).encode())
+        return
+    if obj is None or isinstance(obj, (str, bytes, int, float, complex)):
+        h.update(repr(obj).encode())
+        return
+    if id(obj) in seen:
+        # 递归引用（如递归函数、互相调用的辅助函数）
+        h.update(b"<seen>")
+        return
+    seen.add(id(obj))
+    if isinstance(obj, functools.partial):
+        h.update(b"partial")
+        _update_object(h, obj.func, depth + 1, seen)
+        for arg in obj.args:
+            _update_object(h, arg, depth + 1, seen)
+        for name, value in sorted(obj.keywords.items()):
+            h.update(name.encode())
+            _update_object(h, value, depth + 1, seen)
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}[{len(obj)}]".encode())
+        for item in obj:
+            _update_object(h, item, depth + 1, seen)
+    elif isinstance(obj, dict):
+        h.update(f"dict[{len(obj)}]".encode())
+        for key, value in obj.items():
+            _update_object(h, key, depth + 1, seen)
+            _update_object(h, value, depth + 1, seen)
+    elif isinstance(obj, (set, frozenset)):
+        # 集合的迭代顺序受PYTHONHASHSEED影响，按元素指纹排序
+        h.update(f"{type(obj).__name__}[{len(obj)}]".encode())
+        for digest in sorted(function_fingerprint(item) for item in obj):
+            h.update(digest.encode())
+    elif isinstance(obj, type):
+        if _is_library_module(obj.__module__):
+            h.update(f"class {obj.__module__}.{obj.__qualname__}".encode())
+        else:
+            _update_class(h, obj, depth, seen)
+    elif hasattr(obj, "__code__"):
+        # 函数：以代码对象、默认参数、闭包变量和引用的全局对象作为身份，代码修改后指纹随之变化
+        module = getattr(obj, "__module__", "")
+        h.update(f"{module}.{getattr(obj, '__qualname__', '')}".encode())
+        _update_code(h, obj.__code__)
+        h.update(repr(getattr(obj, "__defaults__", None)).encode())
+        h.update(repr(getattr(obj, "__kwdefaults__", None)).encode())
+        for cell in getattr(obj, "__closure__", None) or ():
+            try:
+                _update_object(h, cell.cell_contents, depth + 1, seen)
+            except ValueError:
+                h.update(b"<empty cell>")
+        if not _is_library_module(module):
+            _update_globals(h, obj, depth, seen)
+    elif hasattr(obj, "__dict__"):
+        # 对象（Combiner、Partitioner等）：类的代码 + 实例属性
+        _update_object(h, type(obj), depth + 1, seen)
+        for name, value in sorted(vars(obj).items()):
+            if name == "logger":
+                continue
+            h.update(name.encode())
+            _update_object(h, value, depth + 1, seen)
+    else:
+        h.update(repr(obj).encode())
+
+
+def function_fingerprint(*objs: Any) -> str:
+    """
+    计算函数/对象的指纹
+
+    包括函数引用的辅助函数、类和常量（见 _update_object），修改其中任何一个都会使缓存失效。
+    """
+    h = hashlib.sha256()
+    for obj in objs:
+        _update_object(h, obj)
+    return h.hexdigest()
+
+
+def data_fingerprint(data: Any) -> Optional[str]:
+    """
+    计算数据的指纹
+
+    Returns:
+        sha256十六进制摘要，数据无法pickle时返回None（不缓存）
+    """
+    try:
+        return hashlib.sha256(pickle.dumps(data, protocol=4)).hexdigest()
+    except Exception:
+        return None
+
+
+def combine_keys(*parts: Optional[str]) -> Optional[str]:
+    """把多个指纹组合为一个缓存key，任一部分为None时返回None"""
+    if any(part is None for part in parts):
+        return None
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+class JobCache:
+    """带LRU淘汰的磁盘缓存"""
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir: str, max_mb: float = 512):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_mb: 缓存总大小上限（MB）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.logger = get_logger("JobCache")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"缓存索引损坏，重建缓存: {e}")
+            return {}
+
+    def _save_index(self):
+        path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, path)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key: Optional[str]) -> Any:
+        """
+        读取缓存
+
+        Returns:
+            缓存的值，未命中时返回MISS
+        """
+        with self._lock:
+            if key is None or key not in self._index:
+                self.misses += 1
+                return MISS
+            entry = self._index[key]
+            path = self._entry_path(key)
+            try:
+                if entry.get("kind") == "files":
+                    value = {int(partition_id): os.path.join(path, filename)
+                             for partition_id, filename in entry["files"].items()}
+                else:
+                    with open(path, 'rb') as f:
+                        value = pickle.load(f)
+            except Exception as e:
+                self.logger.warning(f"读取缓存失败，按未命中处理: {e}")
+                self._drop(key)
+                self.misses += 1
+                return MISS
+            entry["last_access"] = time.time()
+            self.hits += 1
+            return value
+
+    def put(self, key: Optional[str], value: Any):
+        """写入缓存"""
+        if key is None:
+            return
+        with self._lock:
+            path = self._entry_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                with open(path, 'wb') as f:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                self.logger.warning(f"写入缓存失败: {e}")
+                return
+            self._index[key] = {"size": os.path.getsize(path), "last_access": time.time()}
+            self._evict()
+            self._save_index()
+
+    def put_files(self, key: Optional[str], files: Dict[int, str]):
+        """
+        以文件形式缓存分区溢写文件
+
+        Args:
+            key: 缓存key
+            files: {分区编号: 文件路径}
+        """
+        if key is None:
+            return
+        with self._lock:
+            path = self._entry_path(key)
+            os.makedirs(path, exist_ok=True)
+            size = 0
+            names = {}
+            for partition_id, src in files.items():
+                filename = f"part_{partition_id}.spill"
+                shutil.copyfile(src, os.path.join(path, filename))
+                size += os.path.getsize(src)
+                names[str(partition_id)] = filename
+            self._index[key] = {"size": size, "last_access": time.time(), "kind": "files",
+                                "files": names}
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        """总大小超过上限时按最近访问时间淘汰"""
+        total = sum(entry["size"] for entry in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self._index, key=lambda k: self._index[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index[key]["size"]
+            self._drop(key)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        entry = self._index.pop(key, None)
+        path = self._entry_path(key)
+        if entry is not None and entry.get("kind") == "files":
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def invalidate(self, keys: Optional[Iterable[str]] = None):
+        """
+        使缓存失效
+
+        Args:
+            keys: 要删除的缓存key，None表示清空整个缓存
+        """
+        with self._lock:
+            targets = list(self._index if keys is None else keys)
+            for key in targets:
+                self._drop(key)
+            self._save_index()
+        self.logger.info(f"缓存已失效，删除 {len(targets)} 个缓存项")
+
+    def flush(self):
+        """把访问时间等索引信息写回磁盘"""
+        with self._lock:
+            self._save_index()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中计数和当前占用"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._index),
+            "bytes": sum(entry["size"] for entry in self._index.values()),
+        }
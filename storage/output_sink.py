@@ -0,0 +1,247 @@
+"""
+分片输出
+
+默认情况下作业把所有归约结果合并为一个内存中的dict返回，大词表或索引构建时
+这个dict可能比输入还大。OutputSink 让每个Reduce任务把自己分区的结果直接流式写入
+一个分片文件，主进程只收集每个分片的摘要：
+    - 分片文件名为 part-<编号>.<扩展名>，编号为Reduce任务（分区）的顺序号；
+    - 格式为JSON行（每行 [key, value]）或分帧二进制格式（见 storage.spill_format）；
+    - sort_keys=True 时每个分片按key排序写出，范围分区时按编号拼接各分片即为全局有序；
+    - 每个分片先写入临时文件再原子重命名，推测执行的多个副本不会写出半个文件，
+      被放弃的副本在围栏内发现自己已被取消，删除临时文件而不替换分片；
+    - 可选的清单文件 _manifest.json 记录格式、各分片的文件名、记录数和字节数。
+
+以 . 或 _ 开头的临时文件和清单会被 FileInput 跳过，JSON行输出目录可以直接作为
+下一个作业的输入（input_format="jsonl"）。
+"""
+
+import glob
+import json
+import os
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.shuffle import key_order
+from core.tracing import span
+from storage.spill_format import SpillWriter, read_spill, spill_record_count
+
+
+MANIFEST_NAME = "_manifest.json"
+SHARD_PREFIX = "part-"
+FORMAT_JSONL = "jsonl"
+FORMAT_BINARY = "binary"
+# 输出格式 -> 分片文件扩展名
+OUTPUT_FORMATS = {
+    FORMAT_JSONL: ".jsonl",
+    FORMAT_BINARY: ".mrsp",
+}
+
+
+def _json_default(value: Any) -> Any:
+    """JSON无法直接表示的常见类型：集合按排序后的列表写出"""
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=key_order)
+    raise TypeError(f"无法以JSON格式写出 {type(value).__name__} 类型的结果，请使用 output_format=\"binary\"")
+
+
+def _as_key(key: Any) -> Any:
+    """JSON中的元组key被写成列表，读回时还原为元组以便作为dict的key"""
+    return tuple(_as_key(item) for item in key) if isinstance(key, list) else key
+
+
+class OutputSink:
+    """把各Reduce任务的结果写入输出目录下的分片文件"""
+
+    def __init__(self, output_dir: str, output_format: str = FORMAT_JSONL, sort_keys: bool = False,
+                 compression: Optional[str] = None, write_manifest: bool = True,
+                 codec: Optional[str] = None):
+        """
+        Args:
+            output_dir: 输出目录，作业开始时清除其中已有的分片和清单
+            output_format: "jsonl"（每行 [key, value]）或 "binary"（分帧pickle格式）
+            sort_keys: 每个分片是否按key排序写出（需要在任务内缓存该分片的结果）
+            compression: binary格式的压缩方式，None、"zlib"或"lzma"
+            write_manifest: 作业完成后是否写出 _manifest.json
+            codec: binary格式帧负载的编解码器名称，默认pickle，见 storage.data_serializer
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"未知的输出格式: {output_format}，可选: {list(OUTPUT_FORMATS)}")
+        if (compression is not None or codec is not None) and output_format != FORMAT_BINARY:
+            raise ValueError("只有binary输出格式支持压缩和编解码器")
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.sort_keys = sort_keys
+        self.compression = compression
+        self.write_manifest = write_manifest
+        self.codec = codec
+
+    def __repr__(self) -> str:
+        return f"OutputSink({self.output_dir!r}, {self.output_format!r})"
+
+    def shard_name(self, shard_id: int) -> str:
+        return f"{SHARD_PREFIX}{shard_id:05d}{OUTPUT_FORMATS[self.output_format]}"
+
+    def prepare(self):
+        """创建输出目录，删除上一次作业留下的分片和清单"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stale = glob.glob(os.path.join(self.output_dir, SHARD_PREFIX + "*"))
+        stale.append(os.path.join(self.output_dir, MANIFEST_NAME))
+        for path in stale:
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def write_shard(self, shard_id: int, results: Iterable[Tuple[Any, Any]], fence=None) -> Dict[str, Any]:
+        """
+        把一个分片的结果流式写入文件（在Reduce任务中调用）
+
+        Args:
+            shard_id: 分片编号
+            results: (key, result) 流
+            fence: 推测执行时副本的 AttemptFence（见 core.speculative），在其中替换分片文件
+
+        Returns:
+            分片摘要 {"shard", "file", "records", "bytes"}
+        """
+        if fence is not None:
+            fence.check()
+        if self.sort_keys:
+            results = sorted(results, key=lambda item: key_order(item[0]))
+        name = self.shard_name(shard_id)
+        path = os.path.join(self.output_dir, name)
+        temp_path = os.path.join(self.output_dir, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+        # 结果流是惰性的，span内嵌套着产生结果的reduce批次
+        with span("write_shard", "io", shard=shard_id) as shard_span:
+            try:
+                if self.output_format == FORMAT_BINARY:
+                    with SpillWriter(temp_path, self.compression, codec=self.codec) as writer:
+                        writer.write_all(results)
+                    records = writer.records_written
+                else:
+                    records = 0
+                    with open(temp_path, "w", encoding="utf-8") as f:
+                        for key, value in results:
+                            f.write(json.dumps([key, value], ensure_ascii=False, default=_json_default))
+                            f.write("\n")
+                            records += 1
+                num_bytes = os.path.getsize(temp_path)
+                with fence.commit() if fence is not None else nullcontext():
+                    os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            shard_span.set(records=records, bytes=num_bytes)
+        return {"shard": shard_id, "file": name, "records": records, "bytes": num_bytes}
+
+    def commit(self, shards: Iterable[Dict[str, Any]]) -> "OutputManifest":
+        """
+        所有分片写完后调用，按分片编号汇总并写出清单
+
+        Args:
+            shards: write_shard 返回的分片摘要
+        """
+        manifest = OutputManifest(self.output_dir, self.output_format, sorted(shards, key=lambda s: s["shard"]),
+                                  self.sort_keys, self.compression)
+        if self.write_manifest:
+            path = os.path.join(self.output_dir, MANIFEST_NAME)
+            temp_path = path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest.to_dict(), f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+        return manifest
+
+
+class OutputManifest:
+    """分片输出的结果：各分片的摘要，也可以迭代读取全部 (key, result)"""
+
+    def __init__(self, output_dir: str, output_format: str, shards: List[Dict[str, Any]],
+                 sorted_shards: bool = False, compression: Optional[str] = None,
+                 created_at: Optional[float] = None):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.shards = shards
+        self.sorted_shards = sorted_shards
+        self.compression = compression
+        self.created_at = time.time() if created_at is None else created_at
+
+    @property
+    def total_records(self) -> int:
+        return sum(shard["records"] for shard in self.shards)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(shard["bytes"] for shard in self.shards)
+
+    def __len__(self) -> int:
+        return self.total_records
+
+    def __repr__(self) -> str:
+        return (f"OutputManifest({self.output_dir!r}, shards={len(self.shards)}, "
+                f"records={self.total_records})")
+
+    def files(self) -> List[str]:
+        """按分片编号排列的分片文件路径"""
+        return [os.path.join(self.output_dir, shard["file"]) for shard in self.shards]
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        """按分片编号依次流式读取 (key, result)"""
+        for path in self.files():
+            if self.output_format == FORMAT_BINARY:
+                yield from read_spill(path)
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    key, value = json.loads(line)
+                    yield _as_key(key), value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "format": self.output_format,
+            "compression": self.compression,
+            "sorted_shards": self.sorted_shards,
+            "created_at": self.created_at,
+            "num_shards": len(self.shards),
+            "total_records": self.total_records,
+            "total_bytes": self.total_bytes,
+            "shards": self.shards,
+        }
+
+
+def read_output(output_dir: str) -> OutputManifest:
+    """
+    打开一个输出目录
+
+    有清单时按清单读取；没有清单（write_manifest=False）时按文件名扫描分片并统计记录数。
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        return OutputManifest(output_dir, manifest["format"], manifest["shards"], manifest["sorted_shards"],
+                              manifest["compression"], manifest["created_at"])
+    shards = []
+    extensions = {extension: output_format for output_format, extension in OUTPUT_FORMATS.items()}
+    output_format = FORMAT_JSONL
+    for path in sorted(glob.glob(os.path.join(output_dir, SHARD_PREFIX + "*"))):
+        name = os.path.basename(path)
+        stem, extension = os.path.splitext(name)
+        if extension not in extensions:
+            continue
+        output_format = extensions[extension]
+        if output_format == FORMAT_BINARY:
+            records = spill_record_count(path)
+        else:
+            with open(path, "rb") as f:
+                records = sum(1 for _ in f)
+        shards.append({"shard": int(stem[len(SHARD_PREFIX):]), "file": name, "records": records,
+                       "bytes": os.path.getsize(path)})
+    return OutputManifest(output_dir, output_format, shards)
+
+
+def resolve_output_sink(output: Union[None, str, OutputSink]) -> Optional[OutputSink]:
+    """输出目录路径转换为默认的JSON行OutputSink"""
+    if output is None or isinstance(output, OutputSink):
+        return output
+    return OutputSink(output)
@@ -0,0 +1,214 @@
+"""
+分帧二进制溢写格式
+
+文件结构：
+    文件头:  MAGIC(4字节) | 版本(1字节) | 压缩方式(1字节) | 编解码器名称长度(1字节) | 编解码器名称
+    数据帧:  负载长度(uint32) | 记录数(uint32) | 负载
+
+每帧负载是一批 (key, value) 记录由编解码器（见 storage.data_serializer，默认pickle）
+编码后的结果（可选压缩），读取时逐帧解码，不需要把整个文件载入内存；也可以通过mmap按帧读取，
+此时直接从映射内存解码，不经过read缓冲区。
+"""
+
+import mmap
+import os
+import struct
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+from storage.data_serializer import COMPRESSORS, DEFAULT_CODEC, Codec, get_codec
+from core.tracing import span
+
+
+MAGIC = b"MRSP"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sBB")
+CODEC_NAME_LENGTH = struct.Struct("<B")
+FRAME_HEADER = struct.Struct("<II")
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZMA = 2
+COMPRESSION_CODES = {
+    None: COMPRESSION_NONE,
+    "zlib": COMPRESSION_ZLIB,
+    "lzma": COMPRESSION_LZMA,
+}
+COMPRESSION_NAMES = {code: name for name, code in COMPRESSION_CODES.items()}
+
+DEFAULT_FRAME_RECORDS = 1024
+
+
+class SpillWriter:
+    """分帧溢写文件写入器"""
+
+    def __init__(self, filepath: str, compression: Optional[str] = None,
+                 frame_records: int = DEFAULT_FRAME_RECORDS, codec: Optional[str] = None):
+        """
+        Args:
+            filepath: 文件路径
+            compression: 压缩方式，None、"zlib"或"lzma"
+            frame_records: 每帧记录数
+            codec: 帧负载的编解码器名称，默认pickle；也可以写成 "名称+压缩方式"
+        """
+        codec_name, compression = _split_codec(codec, compression)
+        self.filepath = filepath
+        self.compression = compression
+        self.codec = get_codec(codec_name)
+        self.frame_records = frame_records
+        self.records_written = 0
+        self.bytes_written = 0
+        self._pending: List[Any] = []
+        self._compress = COMPRESSORS[compression][0] if compression else None
+        name = codec_name.encode("ascii")
+        self._file = open(filepath, 'wb')
+        self._write(FILE_HEADER.pack(MAGIC, VERSION, COMPRESSION_CODES[compression])
+                    + CODEC_NAME_LENGTH.pack(len(name)) + name)
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def write(self, record: Any):
+        """写入一条记录"""
+        self._pending.append(record)
+        if len(self._pending) >= self.frame_records:
+            self._flush_frame()
+
+    def write_all(self, records: Iterable[Any]):
+        """写入多条记录"""
+        for record in records:
+            self.write(record)
+
+    def _flush_frame(self):
+        """把缓冲的记录编码为一帧写入文件"""
+        if not self._pending:
+            return
+        payload = self.codec.encode(self._pending)
+        if self._compress is not None:
+            payload = self._compress(payload)
+        self._write(FRAME_HEADER.pack(len(payload), len(self._pending)))
+        self._write(payload)
+        self.records_written += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        """写出剩余记录并关闭文件"""
+        if self._file.closed:
+            return
+        self._flush_frame()
+        self._file.close()
+
+    def __enter__(self) -> "SpillWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _split_codec(codec: Optional[str], compression: Optional[str]) -> Tuple[str, Optional[str]]:
+    """把 "名称+压缩方式" 形式的编解码器拆分为名称和压缩方式"""
+    if isinstance(codec, Codec):
+        raise ValueError("溢写文件按名称记录编解码器，请传入已注册的编解码器名称")
+    codec_name, _, codec_compression = (codec or DEFAULT_CODEC).partition("+")
+    if codec_compression and compression and codec_compression != compression:
+        raise ValueError(f"编解码器 {codec} 与压缩方式 {compression} 冲突")
+    compression = compression or codec_compression or None
+    if compression not in COMPRESSION_CODES:
+        raise ValueError(f"不支持的压缩方式: {compression}，可选: {list(COMPRESSION_CODES)}")
+    return codec_name, compression
+
+
+class _FrameDecoder:
+    """按文件头记录的压缩方式和编解码器解码帧负载"""
+
+    def __init__(self, compression_code: int, codec_name: str):
+        compression = COMPRESSION_NAMES[compression_code]
+        self._decompress = COMPRESSORS[compression][1] if compression else None
+        self._codec = get_codec(codec_name)
+        # 未压缩且解码结果会引用输入缓冲区时，mmap读取需要先复制负载，否则映射无法关闭
+        self.borrows_payload = compression is None and self._codec.decode_borrows_buffer
+
+    def __call__(self, payload: Union[bytes, memoryview]) -> List[Any]:
+        with span("load_frame", "io", bytes=len(payload)) as frame_span:
+            if self._decompress is not None:
+                payload = self._decompress(payload)
+            records = self._codec.decode(payload)
+            frame_span.set(records=len(records))
+        return records
+
+
+def _read_header(f, filepath: str) -> _FrameDecoder:
+    """读取并校验文件头，文件位置移到第一帧"""
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ValueError(f"不是有效的溢写文件: {filepath}")
+    magic, version, compression_code = FILE_HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or compression_code not in COMPRESSION_NAMES:
+        raise ValueError(f"不是有效的溢写文件: {filepath}")
+    (length,) = CODEC_NAME_LENGTH.unpack(f.read(CODEC_NAME_LENGTH.size))
+    codec_name = f.read(length).decode("ascii")
+    return _FrameDecoder(compression_code, codec_name)
+
+
+def read_spill(filepath: str, use_mmap: bool = False) -> Iterator[Any]:
+    """
+    逐帧流式读取溢写文件
+
+    Args:
+        filepath: 文件路径
+        use_mmap: 是否通过mmap读取，帧负载直接从映射内存解码（避免额外的read缓冲区拷贝）
+
+    Yields:
+        记录
+    """
+    if use_mmap:
+        yield from _read_spill_mmap(filepath)
+        return
+
+    with open(filepath, 'rb') as f:
+        decode = _read_header(f, filepath)
+        while True:
+            frame_header = f.read(FRAME_HEADER.size)
+            if not frame_header:
+                break
+            payload_len, _ = FRAME_HEADER.unpack(frame_header)
+            yield from decode(f.read(payload_len))
+
+
+def spill_record_count(filepath: str) -> int:
+    """只读取帧头统计溢写文件的记录数，不解码负载"""
+    count = 0
+    with open(filepath, 'rb') as f:
+        _read_header(f, filepath)
+        while True:
+            frame_header = f.read(FRAME_HEADER.size)
+            if not frame_header:
+                break
+            payload_len, num_records = FRAME_HEADER.unpack(frame_header)
+            count += num_records
+            f.seek(payload_len, os.SEEK_CUR)
+    return count
+
+
+def _read_spill_mmap(filepath: str) -> Iterator[Any]:
+    """通过mmap按帧读取溢写文件"""
+    with open(filepath, 'rb') as f:
+        decode = _read_header(f, filepath)
+        offset = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        if size <= offset:
+            # 没有数据帧的文件不需要mmap
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                while offset < size:
+                    payload_len, _ = FRAME_HEADER.unpack_from(mm, offset)
+                    offset += FRAME_HEADER.size
+                    with view[offset:offset + payload_len] as payload:
+                        records = decode(bytes(payload) if decode.borrows_payload else payload)
+                    offset += payload_len
+                    yield from records
+            finally:
+                # 关闭mmap之前释放视图，否则 mmap.close 报告仍有导出的缓冲区
+                view.release()
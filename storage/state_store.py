@@ -0,0 +1,136 @@
+"""
+持久化的归约状态
+
+增量MapReduce把每个key的归约结果保存在一个sqlite文件中，
+增量作业只按key读取和写回本次变化的部分，不需要加载整个状态。
+
+sqlite的主键是key的规范编码（encode_key）：相等的key总是得到相同的字节串，
+与Python dict对key相等的判断一致（1、1.0、True 是同一个key，内容相同的元组无论其中的
+对象是否共享都是同一个key）。支持的key类型为 None、bool、int、float、str、bytes，
+以及由这些类型组成的 tuple 和 frozenset；其他类型抛出TypeError。
+key本身另外以pickle保存，读取全部状态时原样返回。
+"""
+
+import os
+import pickle
+import sqlite3
+import struct
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from utils.logger import get_logger
+
+
+# 单条IN查询携带的key数量上限（sqlite参数个数有限制）
+QUERY_BATCH_SIZE = 500
+
+_LENGTH = struct.Struct(">I")
+
+
+def _encode(obj: Any) -> bytes:
+    return pickle.dumps(obj, protocol=4)
+
+
+def _encode_items(tag: bytes, items: Iterable[bytes]) -> bytes:
+    """带长度前缀地拼接元素编码"""
+    return tag + b"".join(_LENGTH.pack(len(item)) + item for item in items)
+
+
+def encode_key(key: Any) -> bytes:
+    """
+    key的规范编码：相等的key编码相同，不相等的key编码不同
+
+    Raises:
+        TypeError: 不支持的key类型
+    """
+    if key is None:
+        return b"n"
+    if isinstance(key, float):
+        if key != key:
+            return b"f" + b"nan"
+        if not key.is_integer():
+            return b"f" + repr(key).encode()
+        # 值为整数的浮点数与相等的整数是同一个key
+        key = int(key)
+    if isinstance(key, int):
+        # bool是int的子类，True与1编码相同
+        return b"i" + str(int(key)).encode()
+    if isinstance(key, str):
+        return b"s" + key.encode("utf-8", "surrogatepass")
+    if isinstance(key, bytes):
+        return b"b" + key
+    if isinstance(key, tuple):
+        return _encode_items(b"t", (encode_key(item) for item in key))
+    if isinstance(key, frozenset):
+        return _encode_items(b"z", sorted(encode_key(item) for item in key))
+    raise TypeError(f"状态key不支持 {type(key).__name__} 类型，"
+                    f"支持 None/bool/int/float/str/bytes 及由它们组成的 tuple/frozenset")
+
+
+class StateStore:
+    """基于sqlite的 key -> 归约结果 存储"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 状态文件路径，不存在时创建
+        """
+        self.path = path
+        self.logger = get_logger("StateStore")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (k BLOB PRIMARY KEY, key BLOB NOT NULL, v BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        """
+        读取一批key的当前状态
+
+        Returns:
+            {key: value}，不存在的key不出现在结果中
+        """
+        encoded = {encode_key(key): key for key in keys}
+        blobs = list(encoded)
+        found = {}
+        for start in range(0, len(blobs), QUERY_BATCH_SIZE):
+            batch = blobs[start:start + QUERY_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(f"SELECT k, v FROM state WHERE k IN ({placeholders})", batch)
+            for k, v in rows:
+                found[encoded[k]] = pickle.loads(v)
+        return found
+
+    def apply(self, updates: Dict[Any, Any], deletions: Iterable[Any] = ()):
+        """
+        在一个事务中写入更新并删除key
+
+        Args:
+            updates: {key: 新状态}
+            deletions: 要删除的key
+        """
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO state (k, key, v) VALUES (?, ?, ?)",
+                                   ((encode_key(k), _encode(k), _encode(v)) for k, v in updates.items()))
+            self._conn.executemany("DELETE FROM state WHERE k = ?",
+                                   ((encode_key(k),) for k in deletions))
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        """遍历全部状态"""
+        for key, v in self._conn.execute("SELECT key, v FROM state"):
+            yield pickle.loads(key), pickle.loads(v)
+
+    def to_dict(self) -> Dict[Any, Any]:
+        return dict(self.items())
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM state").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self) -> "StateStore":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,43 @@
+"""storage.data_serializer 的测试：编解码器的往返"""
+
+import pytest
+
+from storage.data_serializer import CODECS, get_codec
+
+
+RECORDS = [(f"k{i % 7}", i) for i in range(100)] + [(("t", 1), 2.5), ("s", "text"), ("n", None), ("b", b"raw")]
+
+
+@pytest.mark.parametrize("codec_name", list(CODECS) + ["pickle+zlib", "records+lzma"])
+def test_codecs_round_trip(codec_name):
+    codec = get_codec(codec_name)
+    assert codec.decode(codec.encode(RECORDS)) == RECORDS
+    assert codec.decode(memoryview(codec.encode(RECORDS))) == RECORDS
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        get_codec("json")
+    with pytest.raises(ValueError):
+        get_codec("pickle+bz3")
+
+
+LONE_SURROGATES = ["\udcff", "name\udc80.txt", "\ud83d", "x😀"]
+
+
+@pytest.mark.parametrize("codec_name", ["records", "records+zlib"])
+def test_lone_surrogates_round_trip(codec_name):
+    codec = get_codec(codec_name)
+    records = [(text, i) for i, text in enumerate(LONE_SURROGATES)]
+    # 全部为str的列和逐字段编码的混合列两条路径
+    records += [(1, LONE_SURROGATES[0]), ("ok", None), (LONE_SURROGATES[1], b"raw")]
+    decoded = codec.decode(codec.encode(records))
+    assert decoded == records
+    assert [len(key) for key, _ in decoded[:4]] == [len(text) for text in LONE_SURROGATES]
+
+
+def test_mixed_records_round_trip():
+    codec = get_codec("records")
+    records = [("a", 1), ("中文", 2.5), ("b", True), ("c", None), ("d", 2 ** 70), ("e", ("t", 1))]
+    assert codec.decode(codec.encode(records)) == records
+    assert codec.decode(codec.encode([])) == []
@@ -0,0 +1,74 @@
+"""storage.input_format 的测试：文件输入与按记录边界切分"""
+
+import json
+
+import pytest
+
+from core.mapreduce import MapReduce
+from core.stats import FRAMEWORK_GROUP
+from storage.input_format import FileInput, MIN_SPLIT_BYTES
+
+
+def write_lines(path, lines):
+    path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_splits_cover_every_record_once(tmp_path, use_mmap):
+    lines = [f"line {i} " + "x" * (i % 50) for i in range(20000)]
+    path = write_lines(tmp_path / "data.txt", lines)
+    assert path.stat().st_size > 4 * MIN_SPLIT_BYTES
+
+    file_input = FileInput(str(path), split_mb=MIN_SPLIT_BYTES / 1024 / 1024, use_mmap=use_mmap)
+    splits = file_input.splits()
+    assert len(splits) > 1
+    assert [s.start for s in splits[1:]] == [s.end for s in splits[:-1]]
+    assert [record for split in splits for record in split] == lines
+    assert list(file_input) == lines
+
+
+def test_directory_input_skips_hidden_files(tmp_path):
+    write_lines(tmp_path / "a.txt", ["a1", "a2"])
+    (tmp_path / "sub").mkdir()
+    write_lines(tmp_path / "sub" / "b.txt", ["b1"])
+    write_lines(tmp_path / "_SUCCESS", ["marker"])
+    write_lines(tmp_path / ".hidden", ["hidden"])
+    (tmp_path / "empty.txt").write_text("")
+    assert list(FileInput(str(tmp_path))) == ["a1", "a2", "b1"]
+
+
+def test_malformed_jsonl_line_is_skipped_and_counted(tmp_path):
+    records = [{"word": f"w{i % 3}"} for i in range(30)]
+    lines = [json.dumps(record) for record in records]
+    lines.insert(10, "{not json")
+    path = write_lines(tmp_path / "data.jsonl", lines + [""])
+
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path / "tmp"))
+    results, stats = mr.run(FileInput(str(path), "jsonl"), lambda record: [(record["word"], 1)],
+                            lambda key, values: sum(values), return_stats=True)
+    assert results == {"w0": 10, "w1": 10, "w2": 10}
+    assert stats.counters.get("map_errors", FRAMEWORK_GROUP) == 1
+
+
+def test_document_ids(tmp_path):
+    write_lines(tmp_path / "ids.txt", ["7\tfirst doc", "abc\tsecond doc"])
+    for name in ("x", "y"):
+        (tmp_path / name).mkdir()
+        write_lines(tmp_path / name / "docs.txt", ["plain text"])
+
+    documents = list(FileInput(str(tmp_path), "documents"))
+    assert documents[:2] == [(7, "first doc"), ("abc", "second doc")]
+    # 不同子目录中的同名文件产生不同的文档ID
+    fallback_ids = [doc_id for doc_id, _ in documents[2:]]
+    assert len(set(fallback_ids)) == 2
+    assert all(doc_id.endswith("docs.txt:0") for doc_id in fallback_ids)
+
+
+def test_file_input_matches_list_input(tmp_path):
+    lines = [f"w{i % 13} w{i % 7}" for i in range(5000)]
+    path = write_lines(tmp_path / "words.txt", lines)
+    mapper = lambda line: [(word, 1) for word in line.split()]
+    reducer = lambda key, values: sum(values)
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path / "tmp"))
+    assert mr.run(FileInput(str(path), split_mb=0.01), mapper, reducer) == mr.run(lines, mapper, reducer)
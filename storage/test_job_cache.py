@@ -0,0 +1,77 @@
+"""storage.job_cache 的测试：函数指纹覆盖其引用的辅助函数、类和常量"""
+
+import os
+import subprocess
+import sys
+
+from core.mapreduce import MapReduce
+from storage.job_cache import function_fingerprint
+
+
+STOPWORDS = {"the", "a", "of"}
+SCALE = 1
+
+
+def normalize(word):
+    return word.lower()
+
+
+class Tokenizer:
+    def split(self, line):
+        return line.split()
+
+
+def helper_mapper(line):
+    for word in Tokenizer().split(line):
+        if normalize(word) not in STOPWORDS:
+            yield normalize(word), SCALE
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+
+def test_fingerprint_changes_with_helper_function(monkeypatch):
+    before = function_fingerprint(helper_mapper)
+    monkeypatch.setitem(globals(), "normalize", lambda word: word.upper())
+    assert function_fingerprint(helper_mapper) != before
+
+
+def test_fingerprint_changes_with_global_constant(monkeypatch):
+    before = function_fingerprint(helper_mapper)
+    monkeypatch.setitem(globals(), "SCALE", 2)
+    assert function_fingerprint(helper_mapper) != before
+    monkeypatch.setitem(globals(), "SCALE", 1)
+    monkeypatch.setitem(globals(), "STOPWORDS", {"the"})
+    assert function_fingerprint(helper_mapper) != before
+
+
+def test_fingerprint_changes_with_class_method(monkeypatch):
+    before = function_fingerprint(helper_mapper)
+    monkeypatch.setattr(Tokenizer, "split", lambda self, line: line.split(","))
+    assert function_fingerprint(helper_mapper) != before
+
+
+def test_recursive_function_fingerprint():
+    assert function_fingerprint(fib) == function_fingerprint(fib)
+
+
+def test_fingerprint_is_stable_across_hash_seeds():
+    code = ("import sys; sys.path.insert(0, '.'); from storage.test_job_cache import helper_mapper; "
+            "from storage.job_cache import function_fingerprint; print(function_fingerprint(helper_mapper))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digests = {subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True,
+                              env={**os.environ, "PYTHONHASHSEED": seed}).stdout for seed in ("1", "2", "3")}
+    assert len(digests) == 1
+
+
+def test_cached_job_reruns_after_helper_change(tmp_path, monkeypatch):
+    data = ["The cat", "a Dog of the cat"]
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path), cache=True)
+    assert mr.run(data, helper_mapper, sum_reducer) == {"cat": 2, "dog": 1}
+    monkeypatch.setitem(globals(), "normalize", lambda word: word.upper())
+    assert mr.run(data, helper_mapper, sum_reducer) == {"CAT": 2, "DOG": 1, "THE": 2, "A": 1, "OF": 1}
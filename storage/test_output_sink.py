@@ -0,0 +1,73 @@
+"""storage.output_sink 的测试：分片输出与清单"""
+
+import json
+import os
+
+import pytest
+
+from core.distributed import DistributedMapReduce
+from core.mapreduce import MapReduce
+from storage.input_format import FileInput
+from storage.output_sink import MANIFEST_NAME, OutputSink, read_output
+
+
+LINES = [f"w{i % 29} w{i % 6}" for i in range(1000)]
+
+
+def word_mapper(line):
+    for word in line.split():
+        yield word, 1
+
+
+def sum_reducer(key, values):
+    return sum(values)
+
+
+@pytest.mark.parametrize("sink_options", [{}, {"output_format": "binary", "compression": "zlib"},
+                                          {"sort_keys": True}])
+def test_mapreduce_output_matches_in_memory_results(tmp_path, sink_options):
+    expected = MapReduce(num_workers=3, temp_dir=str(tmp_path / "tmp")).run(LINES, word_mapper, sum_reducer)
+    output_dir = str(tmp_path / "out")
+    manifest = MapReduce(num_workers=3, temp_dir=str(tmp_path / "tmp")).run(
+        LINES, word_mapper, sum_reducer, output=OutputSink(output_dir, **sink_options))
+
+    assert dict(manifest) == expected
+    assert manifest.total_records == len(expected)
+    assert sorted(os.listdir(output_dir)) == sorted([MANIFEST_NAME] + [shard["file"] for shard in manifest.shards])
+    with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["total_records"] == len(expected)
+    assert sum(shard["bytes"] for shard in saved["shards"]) == manifest.total_bytes
+    assert dict(read_output(output_dir)) == expected
+    if sink_options.get("sort_keys"):
+        for path in manifest.files():
+            keys = [json.loads(line)[0] for line in open(path, encoding="utf-8")]
+            assert keys == sorted(keys)
+
+
+def test_output_without_manifest_and_rerun_replaces_shards(tmp_path):
+    output_dir = str(tmp_path / "out")
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path / "tmp"))
+    mr.run(LINES, word_mapper, sum_reducer, output=output_dir)
+    manifest = mr.run(LINES[:10], word_mapper, sum_reducer, output=OutputSink(output_dir, write_manifest=False))
+    assert not os.path.exists(os.path.join(output_dir, MANIFEST_NAME))
+    assert dict(read_output(output_dir)) == dict(manifest)
+    # JSON行输出目录可以作为下一个作业的输入
+    assert sorted(FileInput(output_dir, "jsonl")) == sorted([key, value] for key, value in manifest)
+
+
+def test_distributed_output_with_split_hot_keys(tmp_path):
+    lines = ["hot hot " + line for line in LINES]
+    expected = DistributedMapReduce(num_mappers=2, num_reducers=3).simulate_distributed_execution(
+        lines, word_mapper, sum_reducer)
+    manifest = DistributedMapReduce(num_mappers=2, num_reducers=3).simulate_distributed_execution(
+        lines, word_mapper, sum_reducer, split_hot_keys=True, output=str(tmp_path / "out"))
+    assert dict(manifest) == expected
+    assert manifest.total_records == len(expected)
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        OutputSink("out", output_format="csv")
+    with pytest.raises(ValueError):
+        OutputSink("out", compression="zlib")
@@ -0,0 +1,70 @@
+"""storage.spill_format 的测试：分帧溢写文件的往返"""
+
+import pytest
+
+from core.mapreduce import MapReduce
+from storage.spill_format import SpillWriter, read_spill, spill_record_count
+
+
+RECORDS = [(f"key{i % 17}", i) for i in range(2500)] + [(("tuple", 1), None), (3.5, b"bytes")]
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_spill_round_trip(tmp_path, compression, use_mmap):
+    path = str(tmp_path / "part.spill")
+    with SpillWriter(path, compression=compression, frame_records=100) as writer:
+        writer.write_all(RECORDS)
+    assert writer.records_written == len(RECORDS)
+    assert spill_record_count(path) == len(RECORDS)
+    assert list(read_spill(path, use_mmap=use_mmap)) == RECORDS
+
+
+@pytest.mark.parametrize("codec", ["pickle", "pickle5", "marshal", "records"])
+@pytest.mark.parametrize("compression", [None, "lzma"])
+def test_spill_codecs(tmp_path, codec, compression):
+    path = str(tmp_path / "part.spill")
+    with SpillWriter(path, compression=compression, frame_records=100, codec=codec) as writer:
+        writer.write_all(RECORDS)
+    for use_mmap in (False, True):
+        assert list(read_spill(path, use_mmap=use_mmap)) == RECORDS
+
+
+def test_pickle5_arrays_read_via_mmap(tmp_path):
+    np = pytest.importorskip("numpy")
+    path = str(tmp_path / "arrays.spill")
+    records = [(f"k{i}", np.arange(i, i + 1000)) for i in range(10)]
+    with SpillWriter(path, frame_records=3, codec="pickle5") as writer:
+        writer.write_all(records)
+    # 结果数组不能引用映射内存，读取结束后映射可以正常关闭
+    loaded = list(read_spill(path, use_mmap=True))
+    assert [key for key, _ in loaded] == [key for key, _ in records]
+    assert all((array == expected).all() for (_, array), (_, expected) in zip(loaded, records))
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_empty_spill_file(tmp_path, use_mmap):
+    path = str(tmp_path / "empty.spill")
+    SpillWriter(path).close()
+    assert spill_record_count(path) == 0
+    assert list(read_spill(path, use_mmap=use_mmap)) == []
+
+
+def test_invalid_file_is_rejected(tmp_path):
+    path = tmp_path / "not_a_spill"
+    path.write_bytes(b"garbage data")
+    with pytest.raises(ValueError):
+        list(read_spill(str(path)))
+
+
+@pytest.mark.parametrize("spill_mmap", [False, True])
+def test_disk_mode_matches_memory_mode(tmp_path, spill_mmap):
+    lines = [f"w{i % 11} w{i % 4}" for i in range(500)]
+    mapper = lambda line: [(word, 1) for word in line.split()]
+    reducer = lambda key, values: sum(values)
+    memory = MapReduce(num_workers=2, temp_dir=str(tmp_path)).run(lines, mapper, reducer)
+    disk = MapReduce(num_workers=2, temp_dir=str(tmp_path), use_disk_storage=True, spill_compression="zlib",
+                     spill_mmap=spill_mmap).run(lines, mapper, reducer)
+    assert disk == memory
+    # 作业结束后作业目录被清理
+    assert not [path for path in tmp_path.iterdir() if path.name.startswith("job_")]
@@ -0,0 +1,49 @@
+"""storage.state_store 的测试：相等的key对应同一行状态"""
+
+import pytest
+
+from core.mapreduce import MapReduce
+from storage.state_store import StateStore, encode_key
+
+
+def test_equal_keys_built_from_distinct_objects_round_trip(tmp_path):
+    shared = "ab"
+    with StateStore(str(tmp_path / "state.db")) as store:
+        store.apply({(shared, shared): 1})
+        key = ("a" + "b", "".join(["a", "b"]))
+        assert key[0] is not key[1]
+        assert store.get_many([key]) == {key: 1}
+        store.apply({key: 2})
+        assert len(store) == 1
+        assert store.to_dict() == {("ab", "ab"): 2}
+
+
+def test_numerically_equal_keys_share_a_row(tmp_path):
+    with StateStore(str(tmp_path / "state.db")) as store:
+        store.apply({1: "int"})
+        store.apply({1.0: "float"})
+        store.apply({True: "bool"})
+        assert len(store) == 1
+        assert store.get_many([1]) == {1: "bool"}
+        store.apply({}, deletions=[1.0])
+        assert len(store) == 0
+
+
+def test_key_encoding_is_canonical():
+    assert encode_key(frozenset(["x", "y", 3])) == encode_key(frozenset([3, "y", "x"]))
+    assert encode_key((1, "a")) != encode_key(("1", "a"))
+    assert encode_key(("ab", "c")) != encode_key(("a", "bc"))
+    assert encode_key(2.5) != encode_key(2)
+    with pytest.raises(TypeError):
+        encode_key(["unhashable"])
+
+
+def test_incremental_counts_merge_equal_keys(tmp_path):
+    path = str(tmp_path / "state.db")
+    mr = MapReduce(num_workers=2, temp_dir=str(tmp_path))
+    mapper = lambda record: [(("a" + record, record), 1)]
+    reducer = lambda key, values: sum(values)
+    merge = lambda old, new: old + new
+    mr.run_incremental(["b"], mapper, reducer, merge, path)
+    assert mr.run_incremental(["b"], mapper, reducer, merge, path) == {("ab", "b"): 2}
+    assert MapReduce.load_state(path) == {("ab", "b"): 2}
@@ -0,0 +1,85 @@
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def has_length(data: Iterable[Any]) -> bool:
+    """判断输入是否为已知长度的集合（list/tuple等）"""
+    try:
+        len(data)
+        return True
+    except TypeError:
+        return False
+
+
+def resolve_chunk_size(data: Iterable[Any], num_chunks: int, chunk_size: Optional[int] = None) -> int:
+    """
+    计算数据块大小
+
+    显式指定chunk_size时直接使用；已知长度的输入按 len(data) // num_chunks 切分；
+    迭代器/生成器无法预知长度，使用默认块大小。
+    """
+    if chunk_size is not None:
+        return max(1, chunk_size)
+    if has_length(data):
+        return max(1, len(data) // num_chunks)
+    return DEFAULT_CHUNK_SIZE
+
+
+def iter_chunks(data: Iterable[Any], chunk_size: int) -> Iterator[List[Any]]:
+    """
+    把任意可迭代对象按块惰性切分
+
+    每次只从输入中消费一个块，输入不需要整体载入内存。
+
+    Args:
+        data: 输入数据，可以是list、迭代器或生成器
+        chunk_size: 每块的记录数
+
+    Yields:
+        数据块
+    """
+    iterator = iter(data)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_even_chunks(data: Iterable[Any], num_chunks: int) -> Iterator[List[Any]]:
+    """
+    把已知长度的输入切分为num_chunks个大小最多相差1的块
+
+    与按 len(data) // num_chunks 的固定块大小切分不同，末尾不会多出一个零头块。
+    """
+    total = len(data)
+    iterator = iter(data)
+    for i in range(num_chunks):
+        size = (i + 1) * total // num_chunks - i * total // num_chunks
+        if size:
+            yield list(islice(iterator, size))
+
+
+def iter_input_chunks(data: Iterable[Any], num_chunks: int, chunk_size: Optional[int] = None) -> Iterator[Any]:
+    """
+    把输入切分为任务
+
+    文件输入（提供 splits 方法，见 storage.input_format.FileInput）按字节范围切分，
+    每个任务自己读取数据；未指定chunk_size的已知长度输入均匀切分为num_chunks块；
+    其余输入按记录数切块，见 resolve_chunk_size。
+    """
+    if hasattr(data, "splits"):
+        return iter(data.splits(num_chunks))
+    if chunk_size is None and has_length(data):
+        return iter_even_chunks(data, num_chunks)
+    return iter_chunks(data, resolve_chunk_size(data, num_chunks, chunk_size))
+
+
+def describe_input(data: Iterable[Any]) -> str:
+    """输入规模的日志描述"""
+    if has_length(data):
+        return str(len(data))
+    return repr(data) if hasattr(data, "splits") else "流式输入"